@@ -7,3 +7,8 @@ class AuthenticationConfig(AppConfig):
 
     def ready(self):
         import authentication.signals 
+        import authentication.tasks
+
+        # read the signing keys now, so a missing or unreadable key stops the app from starting
+        from .keys import get_token_backend
+        get_token_backend()
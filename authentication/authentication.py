@@ -0,0 +1,116 @@
+import copy
+import time
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+User = get_user_model()
+
+
+# in-process cache of user rows
+class UserCache:
+	"""
+		keeps up to JWT_USER_CACHE_SIZE users for JWT_USER_CACHE_TTL seconds, least recently used first out.
+		rows saved or deleted in this process are dropped straight away (see signals.py), changes made by other
+		processes show up once the entry expires. callers get a copy, so changing it never touches the cached row.
+	"""
+
+	def __init__(self):
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+
+	def get(self, user_id):
+		with self.lock:
+			entry = self.entries.get(user_id)
+
+			if entry is None:
+				return None
+
+			user, expires = entry
+			if expires <= time.monotonic():
+				del self.entries[user_id]
+				return None
+
+			self.entries.move_to_end(user_id)
+			return copy.copy(user)
+
+	def set(self, user):
+		if settings.JWT_USER_CACHE_TTL <= 0:
+			return
+
+		with self.lock:
+			self.entries[user.pk] = (copy.copy(user), time.monotonic() + settings.JWT_USER_CACHE_TTL)
+			self.entries.move_to_end(user.pk)
+
+			while len(self.entries) > settings.JWT_USER_CACHE_SIZE:
+				self.entries.popitem(last=False)
+
+	def invalidate(self, user_id):
+		with self.lock:
+			self.entries.pop(user_id, None)
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+
+	async def aget(self, user_id):
+		user = self.get(user_id)
+
+		if user is None:
+			user = await User.objects.aget(pk=user_id)
+			self.set(user)
+
+		return user
+
+
+user_cache = UserCache()
+
+
+# user built from the claims of an access token
+class ClaimsUser(TokenUser):
+	"""
+		carries the id, username, is_staff and is_superuser claims added by custom_jwt_payload_handler,
+		which is all most views look at. views that read or change other fields load the row with aget_user.
+	"""
+
+	def __str__(self) -> str:
+		return self.username
+
+	async def aget_user(self):
+		return await user_cache.aget(self.id)
+
+
+# load the full user model behind request.user
+async def aget_full_user(user):
+	if isinstance(user, ClaimsUser):
+		return await user.aget_user()
+	return user
+
+
+# jwt authentication that doesn't fetch the user row
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+	"""
+		turned on with JWT_STATELESS_AUTH. request.user is a ClaimsUser, so authenticating a request costs no query.
+		tokens issued before the claims were added are authenticated against the database as before.
+		claims are only as fresh as the access token, a user deactivated or demoted keeps their access token until it expires
+		unless this process has seen the change in its user cache. refreshing reads the roles from the user row again,
+		so the change reaches the new access token at the latest after ACCESS_TOKEN_LIFETIME.
+	"""
+
+	def get_user(self, validated_token):
+		if any(claim not in validated_token for claim in (api_settings.USER_ID_CLAIM, 'username', 'is_staff')):
+			return JWTAuthentication.get_user(self, validated_token)
+
+		user = ClaimsUser(validated_token)
+
+		# a cached row is at most JWT_USER_CACHE_TTL seconds old, trust it over the token
+		cached = user_cache.get(user.id)
+		if cached is not None and not cached.is_active:
+			raise AuthenticationFailed("User is inactive", code="user_inactive")
+
+		return user
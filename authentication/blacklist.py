@@ -0,0 +1,130 @@
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.db.models import Max
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+# bloom filter over strings
+class BloomFilter:
+	"""
+		sized for `capacity` entries at a false positive rate of `error_rate`.
+		a miss is certain, a hit only means the entry may have been added.
+	"""
+
+	def __init__(self, capacity, error_rate):
+		self.capacity = capacity
+		self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+		self.hashes = max(1, round(self.size / capacity * math.log(2)))
+		self.bits = bytearray((self.size + 7) // 8)
+		self.count = 0
+
+	def positions(self, value):
+		# double hashing, two 64 bit halves of one digest give every position
+		digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+		first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big')
+		return [(first + i * second) % self.size for i in range(self.hashes)]
+
+	def add(self, value):
+		for position in self.positions(value):
+			self.bits[position // 8] |= 1 << (position % 8)
+		self.count += 1
+
+	def __contains__(self, value) -> bool:
+		return all(self.bits[position // 8] & (1 << (position % 8)) for position in self.positions(value))
+
+
+# in-memory view of the token_blacklist tables
+class TokenBlacklist:
+	"""
+		answers "is this jti revoked" for the refresh tokens of this process.
+		a bloom filter of every unexpired blacklisted jti is built from the database on first use, and the rows added since
+		are read every TOKEN_BLACKLIST_SYNC_INTERVAL seconds, which is how revocations made by other workers reach this one.
+		ids are taken before their transaction commits, so a row can appear after rows with higher ids were read,
+		each sync reads again the TOKEN_BLACKLIST_SYNC_OVERLAP ids below the highest one it has seen.
+		a bloom miss means the token isn't revoked and costs no query, a hit is confirmed against the database unless the
+		jti is one of the TOKEN_BLACKLIST_RECENT_SIZE most recently revoked. the filter is sized for twice the unexpired rows,
+		at least TOKEN_BLACKLIST_CAPACITY, and rebuilt once it holds more than that, which also drops the expired ones.
+	"""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.clear()
+
+	def clear(self):
+		self.bloom = None
+		self.recent = OrderedDict()
+		self.last_id = 0
+		self.synced_at = 0
+
+	def remember(self, jti):
+		# called with the lock held
+		self.bloom.add(jti)
+		self.recent[jti] = True
+		self.recent.move_to_end(jti)
+
+		while len(self.recent) > settings.TOKEN_BLACKLIST_RECENT_SIZE:
+			self.recent.popitem(last=False)
+
+	# rebuild the filter from the database
+	def load(self):
+		last_id = BlacklistedToken.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+		rows = BlacklistedToken.objects.filter(id__lte=last_id, token__expires_at__gt=aware_utcnow()).values_list('token__jti', flat=True)
+
+		# room to grow, or the next sync would find it full and rebuild it again
+		bloom = BloomFilter(max(settings.TOKEN_BLACKLIST_CAPACITY, 2 * rows.count()), settings.TOKEN_BLACKLIST_ERROR_RATE)
+		for jti in rows.iterator(chunk_size=2000):
+			bloom.add(jti)
+
+		with self.lock:
+			self.bloom = bloom
+			self.last_id = last_id
+			self.synced_at = time.monotonic()
+
+	# add the rows blacklisted since the last load or sync
+	def sync(self):
+		since = self.last_id - settings.TOKEN_BLACKLIST_SYNC_OVERLAP
+		rows = list(BlacklistedToken.objects.filter(id__gt=since).order_by('id').values_list('id', 'token__jti'))
+
+		with self.lock:
+			for pk, jti in rows:
+				# rows of the overlap are usually in the filter already, adding them again would only grow its count
+				if jti not in self.bloom:
+					self.remember(jti)
+				self.last_id = max(self.last_id, pk)
+			self.synced_at = time.monotonic()
+			full = self.bloom.count > self.bloom.capacity
+
+		if full:
+			self.load()
+
+	def update(self):
+		if self.bloom is None:
+			self.load()
+		elif time.monotonic() - self.synced_at >= settings.TOKEN_BLACKLIST_SYNC_INTERVAL:
+			self.sync()
+
+	# record a jti this process just blacklisted
+	def add(self, jti):
+		self.update()
+		with self.lock:
+			self.remember(jti)
+
+	def __contains__(self, jti) -> bool:
+		self.update()
+
+		with self.lock:
+			if jti in self.recent:
+				return True
+			if jti not in self.bloom:
+				return False
+
+		# either a false positive or a token revoked a while ago
+		return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+token_blacklist = TokenBlacklist()
@@ -0,0 +1,194 @@
+import csv
+import json
+import math
+from collections import Counter
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password, identify_hasher
+from django.db import transaction, DatabaseError
+
+from fileshare.executor import get_import_executor
+from users.models import Profile
+from users.tasks import enqueue
+from .serializers import username_errors, email_errors, password_errors
+
+User = get_user_model()
+
+# columns read from an import, others are ignored
+FIELDS = ('username', 'email', 'password', 'password_hash', 'fullname')
+
+# rows per IN query of the availability checks
+LOOKUP_CHUNK_SIZE = 1000
+
+
+# keep the known columns of a row, blank where missing
+def clean_row(row) -> dict:
+	if not isinstance(row, dict):
+		raise ValueError("Each user must be an object")
+
+	row = {field: str(row.get(field) or '') for field in FIELDS}
+	row['username'] = row['username'].strip()
+	row['email'] = row['email'].strip()
+	row['fullname'] = row['fullname'].strip()
+	return row
+
+
+# read the rows of a csv file with a header line, or of a file with one json object per line
+def read_rows(lines, format) -> list:
+	if format == 'csv':
+		return [clean_row(row) for row in csv.DictReader(lines)]
+
+	if format == 'jsonl':
+		return [clean_row(json.loads(line)) for line in lines if line.strip()]
+
+	raise ValueError(f"Unknown import format {format}, expected csv or jsonl")
+
+
+# hash a list of passwords, runs in the import process pool
+def hash_passwords(passwords) -> list:
+	return [make_password(password) for password in passwords]
+
+
+# hash passwords across every process of the import pool, which sign-ins don't use
+def hash_in_pool(passwords) -> list:
+	if not passwords:
+		return []
+
+	size = math.ceil(len(passwords) / settings.USER_IMPORT_HASH_WORKERS)
+	chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+	return [hashed for chunk in get_import_executor().map(hash_passwords, chunks) for hashed in chunk]
+
+
+# lowercased values of `field` already taken by users
+def taken_values(field, values) -> set:
+	lookup = User.objects.filter_usernames if field == 'username' else User.objects.filter_emails
+	values = list(values)
+	taken = set()
+
+	for i in range(0, len(values), LOOKUP_CHUNK_SIZE):
+		taken.update(value.lower() for value in lookup(values[i:i + LOOKUP_CHUNK_SIZE]).order_by().values_list(field, flat=True))
+
+	return taken
+
+
+# errors of a row on its own, availability is checked for all rows at once
+def row_errors(row) -> dict:
+	errors = {**username_errors(row['username']), **email_errors(row['email'])}
+
+	# postgres refuses a value longer than the column instead of cutting it 
+	max_length = Profile._meta.get_field('fullname').max_length
+	if len(row['fullname']) > max_length:
+		errors["fullname_length"] = f"Full name must be at most {max_length} characters"
+
+	# hashes moved over from another django app are kept as they are
+	if row['password_hash']:
+		try:
+			identify_hasher(row['password_hash'])
+		except ValueError:
+			errors["password_hash"] = "Password hash was not made by a configured hasher"
+
+	# users imported without a password set one with a password reset
+	elif row['password']:
+		errors.update(password_errors(row['password'], row['password']))
+
+	return errors
+
+
+# create the users and profiles of a batch of valid rows, returns how many were created
+def create_batch(rows) -> int:
+	hashed = iter(hash_in_pool([row['password'] for row in rows if row['password'] and not row['password_hash']]))
+	users = []
+
+	for row in rows:
+		user = User(username=row['username'], email=User.objects.normalize_email(row['email']))
+
+		if row['password_hash']:
+			user.password = row['password_hash']
+		elif row['password']:
+			user.password = next(hashed)
+		else:
+			user.set_unusable_password()
+
+		users.append(user)
+
+	with transaction.atomic():
+		users = User.objects.bulk_create(users)
+		Profile.objects.bulk_create([Profile(user=user, fullname=row['fullname'] or None) for user, row in zip(users, rows)])
+
+	return len(users)
+
+
+# errors of every row by row number, counted from 1
+def check_rows(rows) -> dict:
+	"""
+		rows are checked with the signup rules, then usernames and emails are checked for availability with one
+		IN query per LOOKUP_CHUNK_SIZE rows on the lower() indexes, and for repeats within the import.
+	"""
+	errors = {number: row_errors(row) for number, row in enumerate(rows, 1)}
+
+	for field, label in (('username', 'Username'), ('email', 'Email')):
+		counts = Counter(row[field].lower() for row in rows if row[field])
+		taken = taken_values(field, counts)
+
+		for number, row in enumerate(rows, 1):
+			value = row[field].lower()
+
+			if value in taken:
+				errors[number][f"{field}_exists"] = f"{label} {row[field]} is not available"
+			elif value and counts[value] > 1:
+				errors[number][f"{field}_repeated"] = f"{label} {row[field]} appears more than once in the import"
+
+	return errors
+
+
+# failed rows in the shape returned by import_users and queue_import
+def error_list(errors) -> list:
+	return [{'row': number, 'errors': errors[number]} for number in sorted(errors) if errors[number]]
+
+
+# create users and their profiles from import rows
+def import_users(rows, batch_size=None, dry_run=False) -> dict:
+	"""
+		rows are checked with check_rows, then the valid ones are created `batch_size` at a time: the passwords of a batch
+		are hashed in the import process pool, then its users and profiles are inserted with two bulk_creates in one transaction.
+		bulk_create doesn't send post_save, so the profile signal doesn't run and the profiles are created here.
+		returns {'created': count, 'errors': [{'row': number, 'errors': {...}}]}, rows are numbered from 1.
+	"""
+	batch_size = batch_size or settings.USER_IMPORT_BATCH_SIZE
+	errors = check_rows(rows)
+	valid = [(number, row) for number, row in enumerate(rows, 1) if not errors[number]]
+	created = 0
+
+	if not dry_run:
+		for i in range(0, len(valid), batch_size):
+			batch = valid[i:i + batch_size]
+
+			try:
+				created += create_batch([row for _, row in batch])
+
+			# someone signed up with one of the names after the checks ran, or a value the checks let through was refused,
+			# the rest of the batch isn't created either and the next batches still are
+			except DatabaseError as e:
+				for number, _ in batch:
+					errors[number]["integrity"] = f"Batch was not created: {e}"
+
+	return {'created': created, 'errors': error_list(errors)}
+
+
+# check import rows now and leave creating the valid ones to the task workers
+def queue_import(rows, batch_size=None) -> dict:
+	"""
+		the valid rows are queued as one import_user_batch job per `batch_size` rows, so hashing a large import runs on
+		the task workers and each job finishes well within the visibility timeout. the rows are checked again when a job
+		runs, and rows taken in the meantime are logged. passwords stay in the job payload until the job has run.
+		returns {'queued': count, 'errors': [...]} with the errors of the rows that were not queued.
+	"""
+	batch_size = batch_size or settings.USER_IMPORT_BATCH_SIZE
+	errors = check_rows(rows)
+	valid = [row for number, row in enumerate(rows, 1) if not errors[number]]
+
+	with transaction.atomic():
+		for i in range(0, len(valid), batch_size):
+			enqueue('import_user_batch', rows=valid[i:i + batch_size])
+
+	return {'queued': len(valid), 'errors': error_list(errors)}
@@ -0,0 +1,128 @@
+import os
+import functools
+import jwt
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from jwt.algorithms import has_crypto
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError
+from rest_framework_simplejwt.settings import api_settings
+
+
+# load the pem keys of a directory by kid
+def load_keys(directory) -> dict:
+	"""
+		returns {kid: (private key or None, public key)}, the kid of a key is its file name without `.pem`.
+		a file holding only a public key belongs to a retired key, it still verifies the tokens signed with it.
+	"""
+	if not has_crypto:
+		raise ImproperlyConfigured("The cryptography package is required to sign tokens with an asymmetric JWT_ALGORITHM")
+
+	from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+
+	if not directory or not os.path.isdir(directory):
+		raise ImproperlyConfigured(f"JWT_KEY_DIR {directory} is not a directory")
+
+	keys = {}
+	for filename in sorted(os.listdir(directory)):
+		kid, extension = os.path.splitext(filename)
+		if extension != '.pem':
+			continue
+
+		with open(os.path.join(directory, filename), 'rb') as f:
+			data = f.read()
+
+		try:
+			private_key = load_pem_private_key(data, password=None)
+			keys[kid] = (private_key, private_key.public_key())
+
+		except ValueError:
+			keys[kid] = (None, load_pem_public_key(data))
+
+	return keys
+
+
+# token backend signing with keypairs picked by kid
+class KeyRingTokenBackend(TokenBackend):
+	"""
+		signs with the private key of `signing_kid` and puts the kid in the token header,
+		verifies with the public key named by the header, so tokens signed before a key rotation stay valid
+		for as long as their key is in the directory. the public keys are published by jwks() for other services.
+	"""
+
+	def __init__(self, algorithm, keys, signing_kid, **kwargs):
+		super().__init__(algorithm, **kwargs)
+
+		if keys.get(signing_kid, (None, None))[0] is None:
+			raise ImproperlyConfigured(f"No private key found for JWT_SIGNING_KID {signing_kid}")
+
+		self.keys = keys
+		self.signing_kid = signing_kid
+		self.signing_key = keys[signing_kid][0]
+
+	def _validate_algorithm(self, algorithm):
+		# simplejwt 5.3 doesn't list EdDSA, PyJWT signs with it once cryptography is installed
+		if algorithm != 'EdDSA':
+			super()._validate_algorithm(algorithm)
+
+	def get_verifying_key(self, token):
+		try:
+			kid = jwt.get_unverified_header(token).get('kid')
+
+		except jwt.InvalidTokenError as ex:
+			raise TokenBackendError("Token is invalid or expired") from ex
+
+		if kid not in self.keys:
+			raise TokenBackendError("Token is invalid or expired")
+
+		return self.keys[kid][1]
+
+	def encode(self, payload):
+		jwt_payload = payload.copy()
+		if self.audience is not None:
+			jwt_payload['aud'] = self.audience
+		if self.issuer is not None:
+			jwt_payload['iss'] = self.issuer
+
+		return jwt.encode(
+			jwt_payload,
+			self.signing_key,
+			algorithm=self.algorithm,
+			headers={'kid': self.signing_kid},
+			json_encoder=self.json_encoder,
+		)
+
+	# public keys as a JSON Web Key Set
+	def jwks(self) -> dict:
+		algorithm = jwt.get_algorithm_by_name(self.algorithm)
+		keys = []
+
+		for kid, (_, public_key) in self.keys.items():
+			jwk = algorithm.to_jwk(public_key, as_dict=True)
+			jwk.update(kid=kid, alg=self.algorithm, use='sig')
+			keys.append(jwk)
+
+		return {'keys': keys}
+
+
+# whether an algorithm signs with a keypair
+def is_asymmetric(algorithm) -> bool:
+	return not algorithm.startswith('HS')
+
+
+# token backend of this process, the keys are read from disk once
+@functools.cache
+def get_token_backend():
+	if not is_asymmetric(api_settings.ALGORITHM):
+		return import_string("rest_framework_simplejwt.state.token_backend")
+
+	return KeyRingTokenBackend(
+		api_settings.ALGORITHM,
+		load_keys(settings.JWT_KEY_DIR),
+		settings.JWT_SIGNING_KID,
+		audience=api_settings.AUDIENCE,
+		issuer=api_settings.ISSUER,
+		leeway=api_settings.LEEWAY,
+		json_encoder=api_settings.JSON_ENCODER,
+	)
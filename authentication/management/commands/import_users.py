@@ -0,0 +1,35 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.imports import read_rows, import_users
+
+
+class Command(BaseCommand):
+	help = "Create users from a csv (with a header line) or jsonl file with username, email and password or password_hash columns."
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help="file to import")
+		parser.add_argument('--format', choices=['csv', 'jsonl'], help="file format, taken from the file extension by default")
+		parser.add_argument('--batch-size', type=int, default=settings.USER_IMPORT_BATCH_SIZE, help="users hashed and inserted per transaction")
+		parser.add_argument('--dry-run', action='store_true', help="check the rows without creating any user")
+
+	def handle(self, *args, **options):
+		format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+
+		try:
+			with open(options['path'], newline='', encoding='utf-8') as f:
+				rows = read_rows(f, format)
+
+		except (OSError, ValueError) as e:
+			raise CommandError(f"Unable to read {options['path']}: {e}")
+
+		result = import_users(rows, batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+		for error in result['errors']:
+			self.stderr.write(f"Row {error['row']}: {error['errors']}")
+
+		if options['dry_run']:
+			self.stdout.write(f"{len(rows) - len(result['errors'])} of {len(rows)} users can be imported.")
+		else:
+			self.stdout.write(f"Imported {result['created']} of {len(rows)} users.")
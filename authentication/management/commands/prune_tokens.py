@@ -0,0 +1,48 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+# delete one batch of expired tokens, returns how many outstanding tokens went
+def prune_batch(expired_before, batch_size) -> int:
+	pks = list(
+		OutstandingToken.objects.filter(expires_at__lte=expired_before).order_by('pk').values_list('pk', flat=True)[:batch_size]
+	)
+
+	if not pks:
+		return 0
+
+	# deleting the blacklist rows first leaves the outstanding rows without anything to cascade to
+	with transaction.atomic():
+		BlacklistedToken.objects.filter(token_id__in=pks).delete()
+		OutstandingToken.objects.filter(pk__in=pks).delete()
+
+	return len(pks)
+
+
+class Command(BaseCommand):
+	help = "Delete expired outstanding and blacklisted tokens in batches."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=settings.TOKEN_PRUNE_BATCH_SIZE, help="tokens deleted per transaction")
+		parser.add_argument('--sleep', type=float, default=0, help="seconds to wait between batches")
+
+	def handle(self, *args, **options):
+		# an expired token is rejected whether it was blacklisted or not, so its rows can go
+		expired_before = aware_utcnow()
+		total = 0
+
+		while True:
+			deleted = prune_batch(expired_before, options['batch_size'])
+			total += deleted
+
+			if deleted < options['batch_size']:
+				break
+
+			if options['sleep']:
+				time.sleep(options['sleep'])
+
+		self.stdout.write(f"Pruned {total} expired tokens.")
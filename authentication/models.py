@@ -1,4 +1,9 @@
+from datetime import timedelta
+from django.conf import settings
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact
 from django.contrib.auth.models import AbstractUser, UserManager, Group, Permission
 from django.utils import timezone 
 
@@ -28,6 +33,33 @@ class CustomUserManager(UserManager):
 		return self.create_user(username, email, password, **extra_fields)
 
 
+	# case-insensitive match on username, served by the lower(username) index 
+	def filter_username(self, username):
+		return self.filter(Exact(Lower('username'), username.lower()))
+
+	# case-insensitive match on email, served by the lower(email) index 
+	def filter_email(self, email):
+		return self.filter(Exact(Lower('email'), email.lower()))
+
+	# case-insensitive match on any of several usernames, for checking a batch at once 
+	def filter_usernames(self, usernames):
+		return self.alias(username_lower=Lower('username')).filter(username_lower__in=[username.lower() for username in usernames])
+
+	# case-insensitive match on any of several emails 
+	def filter_emails(self, emails):
+		return self.alias(email_lower=Lower('email')).filter(email_lower__in=[email.lower() for email in emails])
+
+	# users whose username or email matches a login id, each side is a probe of its lower() index 
+	def filter_login_id(self, login_id):
+		return self.filter(Exact(Lower('username'), login_id.lower()) | Exact(Lower('email'), login_id.lower()))
+
+	# lock out the account matching a login id with a single update, without loading it 
+	async def alock_out(self, login_id):
+		return await self.filter_login_id(login_id).aupdate(
+			login_trials=F('max_login_trials'), last_failed_login=timezone.now()
+		)
+
+
 # custom user model 
 class CustomUser(AbstractUser):
 	username = models.CharField(max_length=20, unique=True)
@@ -62,9 +94,26 @@ class CustomUser(AbstractUser):
 		self.last_failed_login = None
 		self.save()
 
+	# async version of reset_login_trials for async views
+	async def areset_login_trials(self):
+		self.login_trials = 0
+		self.last_failed_login = None
+		await self.asave(update_fields=['login_trials', 'last_failed_login'])
+
+	# check if the account is locked out after too many failed logins 
+	@property
+	def is_locked_out(self):
+		if self.login_trials < self.max_login_trials or self.last_failed_login is None:
+			return False
+		return timezone.now() - self.last_failed_login < timedelta(seconds=settings.SIGNIN_LOCKOUT_PERIOD)
+
 
 	class Meta:
 		ordering = ['-time']
+		indexes = [
+			models.Index(Lower('username'), name='user_username_lower_idx'), # case-insensitive sign-in and availability lookups
+			models.Index(Lower('email'), name='user_email_lower_idx'),
+		]
 		verbose_name = 'CustomUser'
 		verbose_name_plural = 'CustomUsers'
 
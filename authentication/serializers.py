@@ -2,10 +2,75 @@ import re
 from django.contrib.auth.password_validation import validate_password 
 from django.contrib.auth import get_user_model
 from rest_framework import serializers 
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import RefreshToken
+from .utils import custom_jwt_payload_handler
 
 User = get_user_model()
 
 
+# username rules, the availability check is left to the caller 
+def username_errors(value) -> dict:
+	errors = {}
+
+	if value is None or not value.strip():
+		errors["username_value"] = "Username cannot be empty or filled with white space"
+
+	if len(value) < 4 or len(value) > 20:
+		errors["username_length"] = "Username must be between 4 to 20 characters"
+
+	pattern = r'[!@#$%^&*()+\-={}\[\]:;"\'<>,.?/\\|`~]'
+
+	if re.search(pattern, value):
+		errors["username_character"] = "Username cannot contain any special character except '_'"
+
+	return errors
+
+
+# email rules, the availability check is left to the caller 
+def email_errors(value) -> dict:
+	errors = {}
+
+	if value is None or not value.strip():
+		errors["email_value"] = "Email cannot be empty or filled with white space only"
+
+	if len(value) < 6 or len(value) > 40:
+		errors["email_length"] = "Email must be between 6 to 40 characters"
+
+	return errors
+
+
+# password rules 
+def password_errors(password, password_again) -> dict:
+	errors = {}
+
+	if password is None or not password.strip():
+		errors["password_value"] = "Passwords cannot be empty or filled with white space only"
+
+	if len(password) < 8:
+		errors["password_length"] = "Passwords must be at least 8 characters"
+
+	if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
+		errors["password_character"] = "Passwords must contain at least one special character"
+
+	if not any(p.isupper() for p in password):
+		errors["password_uppercase"] = "Passwords must contain at least one uppercase letter"
+
+	if not any(p.islower() for p in password):
+		errors["password_lowercase"] = "Passwords must contain at least one lowercase letter"
+
+	if not any(p.isdigit() for p in password):
+		errors["password_digit"] = "Passwords must contain at least one number"
+
+	if password != password_again:
+		errors["password_match"] = "Both passwords must match"
+
+	return errors
+
+
 # registration serializer
 class SignUpSerializer(serializers.ModelSerializer):
 	username = serializers.CharField(required=True)
@@ -19,24 +84,13 @@ class SignUpSerializer(serializers.ModelSerializer):
 
 	# validate username 
 	def validate_username(self, value):
-		errors = {}
-
-		if value is None or not value.strip():
-			errors["username_value"] = "Username cannot be empty or filled with white space"
+		errors = username_errors(value)
 
-		if len(value) < 4 or len(value) > 20:
-			errors["username_length"] = "Username must be between 4 to 20 characters"
-
-		check_username = User.objects.filter(username__iexact=value)
+		check_username = User.objects.filter_username(value)
 
 		if check_username.exists():
 			errors["username_exists"] = f"Username {value} is not available"
 
-		pattern = r'[!@#$%^&*()+\-={}\[\]:;"\'<>,.?/\\|`~]'
-
-		if re.search(pattern, value):
-			errors["username_character"] = "Username cannot contain any special character except '_'"
-
 		value.replace(" ", "_") # replace white space with underscore if there is whitespace in username
 
 		if errors:
@@ -47,15 +101,9 @@ class SignUpSerializer(serializers.ModelSerializer):
 
 	# validate email 
 	def validate_email(self, value):
-		errors = {}
+		errors = email_errors(value)
 
-		if value is None or not value.strip():
-			errors["email_value"] = "Email cannot be empty or filled with white space only"
-
-		if len(value) < 6 or len(value) > 40:
-			errors["email_length"] = "Email must be between 6 to 40 characters"
-
-		check_email = User.objects.filter(email__iexact=value)
+		check_email = User.objects.filter_email(value)
 
 		if check_email.exists():
 			errors["email_exists"] = f"Email {value} is not available"
@@ -67,30 +115,7 @@ class SignUpSerializer(serializers.ModelSerializer):
 
 	# validate passwords 
 	def validate(self, data):
-		errors = {}
-		password = data.get("password")
-		password_again = data.get("password_again")
-
-		if password is None or not password.strip():
-			errors["password_value"] = "Passwords cannot be empty or filled with white space only"
-
-		if len(password) < 8:
-			errors["password_length"] = "Passwords must be at least 8 characters"
-
-		if not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
-			errors["password_character"] = "Passwords must contain at least one special character"
-
-		if not any(p.isupper() for p in password):
-			errors["password_uppercase"] = "Passwords must contain at least one uppercase letter"
-
-		if not any(p.islower() for p in password):
-			errors["password_lowercase"] = "Passwords must contain at least one lowercase letter"
-
-		if not any(p.isdigit() for p in password):
-			errors["password_digit"] = "Passwords must contain at least one number"
-
-		if password != password_again:
-			errors["password_match"] = "Both passwords must match"
+		errors = password_errors(data.get("password"), data.get("password_again"))
 
 		if errors:
 			password_error = {"password": [errors]}
@@ -99,17 +124,20 @@ class SignUpSerializer(serializers.ModelSerializer):
 		return data 
 
 
+	# build user with a hashed password, without saving it 
+	def build_user(self):
+		user = User(
+			username=self.validated_data["username"],
+			email=self.validated_data["email"],
+		)
+		user.set_password(self.validated_data["password"])
+
+		return user 
+
+
 	# create user 
 	def create(self, validated_data):
-		username = validated_data["username"]
-		email = validated_data["email"]
-		password = validated_data["password"]
-
-		user = User.objects.create(
-			username=username,
-			email=email,
-		)
-		user.set_password(password)
+		user = self.build_user()
 		user.save()
 
 		return user 
@@ -167,10 +195,41 @@ class ChangePasswordSerializer(serializers.Serializer):
 		return data 
 
 
-		# save data 
-		def save(self):
-			user = self.context['request'].user 
-			user.set_password(self.validated_data["new_password"])
-			user.save()
-			
-			return user 
\ No newline at end of file
+	# save data 
+	def save(self):
+		user = self.context['request'].user 
+		user.set_password(self.validated_data["new_password"])
+		user.save()
+		
+		return user 
+
+
+# token refresh serializer, set as SIMPLE_JWT's TOKEN_REFRESH_SERIALIZER
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+	token_class = RefreshToken
+
+	def validate(self, attrs):
+		refresh = self.token_class(attrs["refresh"])
+
+		# roles are read from the user row again, so a demoted user's new tokens lose the roles they had at sign in 
+		user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM], is_active=True).first()
+		if user is None:
+			raise TokenError("User is inactive or deleted")
+
+		custom_jwt_payload_handler(refresh, user)
+		data = {"access": str(refresh.access_token)}
+
+		if api_settings.ROTATE_REFRESH_TOKENS:
+			if api_settings.BLACKLIST_AFTER_ROTATION:
+				# another worker's blacklist can be a sync behind, the insert is what stops a token being rotated twice
+				_, created = refresh.blacklist()
+				if not created:
+					raise TokenError("Token is blacklisted")
+
+			refresh.set_jti()
+			refresh.set_exp()
+			refresh.set_iat()
+
+			data["refresh"] = str(refresh)
+
+		return data
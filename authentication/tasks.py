@@ -0,0 +1,20 @@
+import logging
+
+from users.tasks import task
+from .imports import import_users
+
+# initialize logger
+logger = logging.getLogger('authentication')
+
+
+# create a queued batch of imported users
+@task
+def import_user_batch(rows):
+	result = import_users(rows)
+
+	# rows can be taken by a signup between queueing and running, they are logged instead of retried
+	for failed in result['errors']:
+		username = rows[failed['row'] - 1]['username']
+		logger.warning(f"Imported user {username} was not created: {failed['errors']}")
+
+	logger.info(f"{result['created']} of {len(rows)} imported users created")
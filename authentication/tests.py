@@ -1,15 +1,42 @@
+from asgiref.sync import async_to_sync
+import io
+import os
+import json
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, DataError
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase, RequestFactory, override_settings
 from django.urls import reverse 
 from django.contrib.auth import get_user_model
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITransactionTestCase
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError, TokenBackendError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
 
-from users.models import Profile
+from users.models import Profile, Job
+from users.tasks import claim_job, run_job
+from users.tests import DatabaseTestMixin
+from .utils import CustomAuthBackend, aauthenticate_login, verify_password, custom_jwt_payload_handler
+from .authentication import StatelessJWTAuthentication, ClaimsUser, user_cache, aget_full_user
+from .blacklist import BloomFilter, token_blacklist
+from .tokens import RefreshToken as BlacklistRefreshToken, AccessToken as KeyRingAccessToken
+from .keys import KeyRingTokenBackend, load_keys
+from .imports import clean_row, import_users, queue_import, hash_in_pool
+from .serializers import TokenRefreshSerializer
+from .throttle import get_client_ip, signin_allowed, signin_failed, signin_succeeded
 
 User = get_user_model()
 
 
-class AuthenticationTests(APITestCase):
+class AuthenticationTests(DatabaseTestMixin, APITransactionTestCase):
 	"""
 	Authentication TestCase
 
@@ -50,7 +77,7 @@ class AuthenticationTests(APITestCase):
 
 		"""
 		response = self.client.post(self.signup_url, self.user_signup_data, format='json')
-		response_status = response.data["status"] # get status from response data(this approach is optional)
+		response_status = response.data["status_code"] # get status from response data(this approach is optional)
 		self.assertEqual(response_status, status.HTTP_201_CREATED)
 		self.assertEqual(User.objects.count(), 1) # confirm user count in database is the newly created user
 		self.assertEqual(User.objects.get().username, 'testuser') # confirm the username of the counted user is our testuser
@@ -88,6 +115,759 @@ class AuthenticationTests(APITestCase):
 		self.client.post(self.signup_url, self.user_signup_data, format='json') # firstly, register the user
 		user_signin = self.client.post(self.signin_url, self.user_signin_data_1, format='json') # secondly, signin the user
 		refresh_token = user_signin.data['refresh'] # get refresh token from user signin response data
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + user_signin.data['access']) # signout needs an authenticated user
 		response = self.client.post(self.signout_url, data={"refresh":refresh_token}, format='json') # signout post request
 		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data["status"], "success")
 
+
+
+@override_settings(SIGNIN_LOGIN_ATTEMPTS=3, SIGNIN_LOGIN_REFILL=60, SIGNIN_IP_ATTEMPTS=5, SIGNIN_IP_REFILL=60, SIGNIN_CLIENT_IP_HEADER=None)
+class SignInThrottleTest(TestCase):
+	"""
+	test sign-in throttling
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		cache.clear()
+		self.user = User.objects.create_user(username="testuser", email="testuser@email.com", password="testUSER23##")
+
+
+	def test_login_id_locked_out(self):
+		"""
+		test the failure that empties the login id bucket locks the login id out, whatever its case
+
+		"""
+		self.assertFalse(signin_failed("testuser", "10.0.0.1"))
+		self.assertFalse(signin_failed("TestUser", "10.0.0.2"))
+		self.assertTrue(signin_allowed("testuser", "10.0.0.3"))
+
+		self.assertTrue(signin_failed("testuser", "10.0.0.3"))
+		self.assertFalse(signin_allowed("TESTUSER", "10.0.0.4"))
+		self.assertTrue(signin_allowed("otheruser", "10.0.0.4"))
+
+
+	def test_ip_throttled(self):
+		"""
+		test one client trying many login ids is turned away
+
+		"""
+		for i in range(5):
+			signin_failed(f"user{i}", "10.0.0.1")
+
+		self.assertFalse(signin_allowed("testuser", "10.0.0.1"))
+		self.assertTrue(signin_allowed("testuser", "10.0.0.2"))
+
+
+	def test_success_resets_login_bucket(self):
+		"""
+		test a successful sign-in forgets earlier failures of the login id
+
+		"""
+		signin_failed("testuser", "10.0.0.1")
+		signin_failed("testuser", "10.0.0.1")
+		signin_succeeded("testuser")
+
+		self.assertFalse(signin_failed("testuser", "10.0.0.1"))
+
+
+	def test_lockout_persisted(self):
+		"""
+		test a lockout is written to the user row with a single update
+
+		"""
+		self.assertFalse(self.user.is_locked_out)
+
+		with self.assertNumQueries(1):
+			async_to_sync(User.objects.alock_out)("TESTUSER@email.com")
+
+		self.user.refresh_from_db()
+		self.assertTrue(self.user.is_locked_out)
+
+
+	@override_settings(SIGNIN_CLIENT_IP_HEADER='HTTP_X_FORWARDED_FOR', SIGNIN_TRUSTED_PROXIES=2)
+	def test_client_ip(self):
+		"""
+		test the client address is the one appended by the outermost trusted proxy
+
+		"""
+		request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR='1.2.3.4, 10.0.0.1', REMOTE_ADDR='10.0.0.2')
+		self.assertEqual(get_client_ip(request), '1.2.3.4')
+		self.assertEqual(get_client_ip(RequestFactory().get('/', HTTP_X_FORWARDED_FOR='10.0.0.1', REMOTE_ADDR='10.0.0.2')), '10.0.0.2')
+		self.assertEqual(get_client_ip(RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')), '10.0.0.1')
+
+
+	@override_settings(SIGNIN_CLIENT_IP_HEADER='HTTP_X_FORWARDED_FOR', SIGNIN_TRUSTED_PROXIES=1)
+	def test_spoofed_forwarded_for(self):
+		"""
+		test addresses the client puts in X-Forwarded-For don't give it a fresh ip bucket
+
+		"""
+		for i in range(5):
+			request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR=f'203.0.113.{i}, 1.2.3.4', REMOTE_ADDR='10.0.0.1')
+			self.assertEqual(get_client_ip(request), '1.2.3.4')
+			signin_failed(f"user{i}", get_client_ip(request))
+
+		self.assertFalse(signin_allowed("other", '1.2.3.4'))
+
+
+
+class LoginLookupTest(TestCase):
+	"""
+	test case-insensitive sign-in lookups and password checks
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.user = User.objects.create_user(username="TestUser", email="TestUser@Email.com", password="testUSER23##")
+
+
+	def test_filter_login_id(self):
+		"""
+		test a login id matches the username or email whatever its case
+
+		"""
+		self.assertEqual(list(User.objects.filter_login_id("testuser")), [self.user])
+		self.assertEqual(list(User.objects.filter_login_id("TESTUSER@EMAIL.COM")), [self.user])
+		self.assertFalse(User.objects.filter_login_id("other").exists())
+
+
+	def test_authenticate(self):
+		"""
+		test the sync backend and the async sign-in accept only the right password
+
+		"""
+		self.assertEqual(CustomAuthBackend().authenticate(None, username="testuser", password="testUSER23##"), self.user)
+		self.assertIsNone(CustomAuthBackend().authenticate(None, username="testuser", password="wrong"))
+
+		self.assertEqual(async_to_sync(aauthenticate_login)("testuser@email.com", "testUSER23##"), self.user)
+		self.assertIsNone(async_to_sync(aauthenticate_login)("testuser", "wrong"))
+		self.assertIsNone(async_to_sync(aauthenticate_login)("nobody", "testUSER23##"))
+
+
+	def test_verify_password(self):
+		"""
+		test outdated hashes are reported so they can be replaced
+
+		"""
+		self.assertEqual(verify_password("testUSER23##", self.user.password), (True, False))
+		self.assertEqual(verify_password("wrong", self.user.password), (False, False))
+
+		with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher', 'django.contrib.auth.hashers.PBKDF2PasswordHasher']):
+			self.assertEqual(verify_password("testUSER23##", self.user.password), (True, True))
+
+
+class StatelessAuthenticationTest(TestCase):
+	"""
+	test authenticating from the token claims without fetching the user
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		user_cache.clear()
+		self.user = User.objects.create_user(username="testuser", email="testuser@email.com", password="testUSER23##", is_staff=True)
+		self.access = custom_jwt_payload_handler(RefreshToken.for_user(self.user), self.user).access_token
+		self.auth = StatelessJWTAuthentication()
+
+
+	def test_claims_user(self):
+		"""
+		test the user is built from the claims with no query
+
+		"""
+		validated_token = self.auth.get_validated_token(str(self.access))
+
+		with self.assertNumQueries(0):
+			user = self.auth.get_user(validated_token)
+
+		self.assertIsInstance(user, ClaimsUser)
+		self.assertEqual(user.pk, self.user.pk)
+		self.assertEqual(user.username, "testuser")
+		self.assertTrue(user.is_staff)
+		self.assertFalse(user.is_superuser)
+
+
+	def test_token_without_claims(self):
+		"""
+		test tokens issued without the claims still authenticate against the database
+
+		"""
+		validated_token = self.auth.get_validated_token(str(RefreshToken.for_user(self.user).access_token))
+		self.assertEqual(self.auth.get_user(validated_token), self.user)
+
+
+	def test_full_user_cache(self):
+		"""
+		test the full user is fetched once and dropped when it changes
+
+		"""
+		user = self.auth.get_user(self.auth.get_validated_token(str(self.access)))
+
+		with self.assertNumQueries(1):
+			self.assertEqual(async_to_sync(aget_full_user)(user).email, "testuser@email.com")
+			self.assertEqual(async_to_sync(aget_full_user)(user).email, "testuser@email.com")
+
+		self.user.email = "changed@email.com"
+		self.user.save()
+
+		with self.assertNumQueries(1):
+			self.assertEqual(async_to_sync(aget_full_user)(user).email, "changed@email.com")
+
+		with override_settings(JWT_USER_CACHE_TTL=0):
+			user_cache.clear()
+			with self.assertNumQueries(2):
+				async_to_sync(aget_full_user)(user)
+				async_to_sync(aget_full_user)(user)
+
+
+	def test_inactive_cached_user(self):
+		"""
+		test a user this process knows to be inactive is rejected
+
+		"""
+		validated_token = self.auth.get_validated_token(str(self.access))
+		self.user.is_active = False
+		self.user.save()
+		user_cache.set(self.user)
+
+		with self.assertRaises(AuthenticationFailed):
+			self.auth.get_user(validated_token)
+
+
+	def test_refresh_reads_roles(self):
+		"""
+		test the stored outstanding token has the claims and refreshing picks up a demotion
+
+		"""
+		token_blacklist.clear()
+		refresh = BlacklistRefreshToken.for_user(self.user)
+		stored = BlacklistRefreshToken(OutstandingToken.objects.get(jti=refresh['jti']).token)
+		self.assertTrue(stored['is_staff'])
+		self.assertEqual(stored['username'], "testuser")
+
+		self.user.is_staff = False
+		self.user.save()
+		data = TokenRefreshSerializer().validate({"refresh": str(refresh)})
+
+		self.assertFalse(self.auth.get_user(self.auth.get_validated_token(data["access"])).is_staff)
+		self.assertFalse(BlacklistRefreshToken(data["refresh"])['is_staff'])
+
+		self.user.is_active = False
+		self.user.save()
+		with self.assertRaises(TokenError):
+			TokenRefreshSerializer().validate({"refresh": data["refresh"]})
+
+
+class TokenBlacklistTest(TestCase):
+	"""
+	test the in-memory token blacklist and pruning expired tokens
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		token_blacklist.clear()
+		self.user = User.objects.create_user(username="testuser", email="testuser@email.com", password="testUSER23##")
+
+
+	def test_bloom_filter(self):
+		"""
+		test added values are always found and few others are
+
+		"""
+		bloom = BloomFilter(1000, 0.01)
+		for i in range(1000):
+			bloom.add(f"added-{i}")
+
+		self.assertTrue(all(f"added-{i}" in bloom for i in range(1000)))
+		self.assertLess(sum(f"other-{i}" in bloom for i in range(1000)), 50)
+
+
+	def test_check_without_query(self):
+		"""
+		test a token that isn't revoked is checked in memory once the blacklist is loaded
+
+		"""
+		token = BlacklistRefreshToken.for_user(self.user)
+		token_blacklist.update()
+
+		with self.assertNumQueries(0):
+			BlacklistRefreshToken(str(token))
+
+		token.blacklist()
+		with self.assertNumQueries(0):
+			with self.assertRaises(TokenError):
+				BlacklistRefreshToken(str(token))
+
+
+	def test_sync(self):
+		"""
+		test tokens revoked by other processes are found after a sync
+
+		"""
+		token = BlacklistRefreshToken.for_user(self.user)
+		token_blacklist.update()
+
+		# revoked through the tables, as another worker would 
+		BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+		token_blacklist.synced_at = 0
+
+		with self.assertRaises(TokenError):
+			BlacklistRefreshToken(str(token))
+
+		# a fresh process loads it from the database
+		token_blacklist.clear()
+		with self.assertRaises(TokenError):
+			BlacklistRefreshToken(str(token))
+
+
+	def test_sync_late_commit(self):
+		"""
+		test a row committed after rows with higher ids were read is found on the next sync
+
+		"""
+		tokens = [BlacklistRefreshToken.for_user(self.user) for _ in range(2)]
+		token_blacklist.update()
+		last_id = token_blacklist.last_id
+
+		# the second row got its id first but commits after the first row was synced
+		BlacklistedToken.objects.create(id=last_id + 2, token=OutstandingToken.objects.get(jti=tokens[0]['jti']))
+		token_blacklist.sync()
+		self.assertEqual(token_blacklist.last_id, last_id + 2)
+
+		BlacklistedToken.objects.create(id=last_id + 1, token=OutstandingToken.objects.get(jti=tokens[1]['jti']))
+		token_blacklist.sync()
+
+		with self.assertNumQueries(0):
+			self.assertIn(tokens[1]['jti'], token_blacklist)
+		self.assertEqual(token_blacklist.bloom.count, 2)
+
+
+	@override_settings(TOKEN_BLACKLIST_CAPACITY=2)
+	def test_rebuild_sized_from_rows(self):
+		"""
+		test a filter rebuilt with more revoked tokens than the capacity isn't rebuilt again on every sync
+
+		"""
+		for _ in range(3):
+			BlacklistRefreshToken.for_user(self.user).blacklist()
+
+		token_blacklist.clear()
+		token_blacklist.update()
+		self.assertEqual(token_blacklist.bloom.capacity, 6)
+
+		bloom = token_blacklist.bloom
+		token_blacklist.sync()
+		self.assertIs(token_blacklist.bloom, bloom)
+
+
+	def test_rotation(self):
+		"""
+		test a refresh token can only be rotated once
+
+		"""
+		token = str(BlacklistRefreshToken.for_user(self.user))
+		data = TokenRefreshSerializer().validate({"refresh": token})
+		self.assertIn("refresh", data)
+
+		# a worker that hasn't synced yet still refuses the second rotation
+		token_blacklist.clear()
+		token_blacklist.update()
+		token_blacklist.recent.clear()
+		token_blacklist.bloom = BloomFilter(10, 0.01)
+
+		with self.assertRaises(TokenError):
+			TokenRefreshSerializer().validate({"refresh": token})
+
+
+	def test_prune_tokens(self):
+		"""
+		test expired tokens are deleted in batches and unexpired ones kept
+
+		"""
+		tokens = [BlacklistRefreshToken.for_user(self.user) for _ in range(5)]
+		tokens[0].blacklist()
+		OutstandingToken.objects.filter(jti__in=[token['jti'] for token in tokens[:3]]).update(expires_at=aware_utcnow() - timedelta(days=1))
+
+		call_command('prune_tokens', batch_size=2, stdout=open('/dev/null', 'w'))
+
+		self.assertEqual(OutstandingToken.objects.count(), 2)
+		self.assertEqual(BlacklistedToken.objects.count(), 0)
+
+
+class KeyRingTest(TestCase):
+	"""
+	test signing tokens with keypairs chosen by kid
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		from cryptography.hazmat.primitives import serialization
+		from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+		self.directory = tempfile.TemporaryDirectory()
+		self.addCleanup(self.directory.cleanup)
+
+		def write(kid, key, private=True):
+			if private:
+				data = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+			else:
+				data = key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+			with open(os.path.join(self.directory.name, f"{kid}.pem"), 'wb') as f:
+				f.write(data)
+
+		self.old_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+		write("old", self.old_key, private=False)
+		write("new", rsa.generate_private_key(public_exponent=65537, key_size=2048))
+
+		self.ed_directory = tempfile.TemporaryDirectory()
+		self.addCleanup(self.ed_directory.cleanup)
+		with open(os.path.join(self.ed_directory.name, "ed.pem"), 'wb') as f:
+			f.write(ed25519.Ed25519PrivateKey.generate().private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+
+		self.backend = KeyRingTokenBackend("RS256", load_keys(self.directory.name), "new")
+		self.user = User.objects.create_user(username="testuser", email="testuser@email.com", password="testUSER23##")
+
+
+	def test_load_keys(self):
+		"""
+		test private keys and public-only retired keys are loaded by kid
+
+		"""
+		keys = load_keys(self.directory.name)
+		self.assertEqual(sorted(keys), ["new", "old"])
+		self.assertIsNone(keys["old"][0])
+		self.assertIsNotNone(keys["new"][0])
+
+
+	def test_sign_and_verify(self):
+		"""
+		test tokens carry the signing kid and verify with its public key
+
+		"""
+		import jwt
+
+		token = self.backend.encode({"user_id": 1})
+		self.assertEqual(jwt.get_unverified_header(token)["kid"], "new")
+		self.assertEqual(self.backend.decode(token)["user_id"], 1)
+
+		# signed before the rotation
+		old_token = jwt.encode({"user_id": 2}, self.old_key, algorithm="RS256", headers={"kid": "old"})
+		self.assertEqual(self.backend.decode(old_token)["user_id"], 2)
+
+		for token in [
+			jwt.encode({"user_id": 3}, self.old_key, algorithm="RS256", headers={"kid": "unknown"}),
+			jwt.encode({"user_id": 3}, self.old_key, algorithm="RS256", headers={"kid": "new"}),
+		]:
+			with self.assertRaises(TokenBackendError):
+				self.backend.decode(token)
+
+
+	def test_eddsa(self):
+		"""
+		test EdDSA keys sign and verify
+
+		"""
+		backend = KeyRingTokenBackend("EdDSA", load_keys(self.ed_directory.name), "ed")
+		self.assertEqual(backend.decode(backend.encode({"user_id": 1}))["user_id"], 1)
+		self.assertEqual(backend.jwks()["keys"][0]["kty"], "OKP")
+
+
+	def test_token_classes(self):
+		"""
+		test refresh and access tokens use the key ring backend
+
+		"""
+		with mock.patch('authentication.tokens.get_token_backend', return_value=self.backend):
+			token = str(BlacklistRefreshToken.for_user(self.user).access_token)
+			self.assertEqual(KeyRingAccessToken(token)["user_id"], self.user.pk)
+
+		# the symmetric backend can't read it
+		with self.assertRaises(TokenError):
+			KeyRingAccessToken(token)
+
+
+	def test_jwks(self):
+		"""
+		test the public keys are published with their kid
+
+		"""
+		with mock.patch('authentication.views.get_token_backend', return_value=self.backend):
+			response = self.client.get(reverse('jwks'))
+
+		self.assertEqual(response.status_code, 200)
+		self.assertIn("public", response['Cache-Control'])
+		keys = response.json()["keys"]
+		self.assertEqual(sorted(key["kid"] for key in keys), ["new", "old"])
+		self.assertTrue(all(key["kty"] == "RSA" and "d" not in key for key in keys))
+
+		self.assertEqual(self.client.get(reverse('jwks')).status_code, 404)
+
+
+class UserImportTest(TestCase):
+	"""
+	test importing users in bulk
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		User.objects.create_user(username="existing", email="existing@email.com", password="testUSER23##")
+		self.password_hash = make_password("testUSER23##")
+
+
+	def rows(self, count, prefix="user"):
+		return [
+			clean_row({"username": f"{prefix}{i}", "email": f"{prefix}{i}@email.com", "password_hash": self.password_hash, "fullname": f"User {i}"})
+			for i in range(count)
+		]
+
+
+	def test_import(self):
+		"""
+		test users are created with their profile and password
+
+		"""
+		rows = self.rows(3) + [
+			clean_row({"username": "hashed", "email": "hashed@email.com", "password": "testUSER23##"}),
+			clean_row({"username": "invited", "email": "invited@email.com"}),
+		]
+		result = import_users(rows, batch_size=2)
+
+		self.assertEqual(result, {"created": 5, "errors": []})
+		self.assertEqual(Profile.objects.filter(user__username__in=[row["username"] for row in rows]).count(), 5)
+		self.assertEqual(Profile.objects.get(user__username="user1").fullname, "User 1")
+		self.assertTrue(User.objects.get(username="user0").check_password("testUSER23##"))
+		self.assertTrue(User.objects.get(username="hashed").check_password("testUSER23##"))
+		self.assertFalse(User.objects.get(username="invited").has_usable_password())
+
+
+	def test_errors(self):
+		"""
+		test taken, repeated and invalid rows are reported and the rest created
+
+		"""
+		rows = self.rows(1) + [
+			clean_row({"username": "EXISTING", "email": "new@email.com", "password_hash": self.password_hash}),
+			clean_row({"username": "twice", "email": "twice1@email.com", "password_hash": self.password_hash}),
+			clean_row({"username": "Twice", "email": "twice2@email.com", "password_hash": self.password_hash}),
+			clean_row({"username": "weakpass", "email": "weak@email.com", "password": "weak"}),
+			clean_row({"username": "badhash", "email": "badhash@email.com", "password_hash": "plain"}),
+		]
+		result = import_users(rows)
+
+		self.assertEqual(result["created"], 1)
+		errors = {error["row"]: error["errors"] for error in result["errors"]}
+		self.assertEqual(sorted(errors), [2, 3, 4, 5, 6])
+		self.assertIn("username_exists", errors[2])
+		self.assertIn("username_repeated", errors[3])
+		self.assertIn("password_length", errors[5])
+		self.assertIn("password_hash", errors[6])
+		self.assertEqual(User.objects.count(), 2)
+
+
+	def test_fullname_length(self):
+		"""
+		test a full name longer than the profile column is reported instead of failing the import
+
+		"""
+		rows = self.rows(2)
+		rows[1]["fullname"] = "x" * 51
+		result = import_users(rows)
+
+		self.assertEqual(result["created"], 1)
+		self.assertEqual([error["row"] for error in result["errors"]], [2])
+		self.assertIn("fullname_length", result["errors"][0]["errors"])
+
+
+	def test_batch_database_error(self):
+		"""
+		test a batch the database refuses is reported and the other batches are created
+
+		"""
+		bulk_create = Profile.objects.bulk_create
+		calls = []
+
+		def fail_first(*args, **kwargs):
+			calls.append(1)
+			if len(calls) == 1:
+				raise DataError("value too long for type character varying(50)")
+			return bulk_create(*args, **kwargs)
+
+		with mock.patch.object(Profile.objects, 'bulk_create', side_effect=fail_first):
+			result = import_users(self.rows(4), batch_size=2)
+
+		self.assertEqual(result["created"], 2)
+		self.assertEqual([error["row"] for error in result["errors"]], [1, 2])
+		self.assertIn("integrity", result["errors"][0]["errors"])
+		self.assertEqual(User.objects.filter(username__in=["user0", "user1"]).count(), 0)
+		self.assertEqual(User.objects.filter(username__in=["user2", "user3"]).count(), 2)
+
+
+	def test_set_based_queries(self):
+		"""
+		test the number of queries doesn't grow with the number of rows in a batch
+
+		"""
+		with CaptureQueriesContext(connection) as few:
+			import_users(self.rows(5, "few"))
+
+		with CaptureQueriesContext(connection) as many:
+			import_users(self.rows(50, "many"))
+
+		self.assertEqual(len(few), len(many))
+
+
+	def test_dry_run(self):
+		"""
+		test a dry run checks rows without creating users
+
+		"""
+		result = import_users(self.rows(3), dry_run=True)
+		self.assertEqual(result, {"created": 0, "errors": []})
+		self.assertEqual(User.objects.count(), 1)
+
+
+	def test_command(self):
+		"""
+		test the command imports csv and jsonl files
+
+		"""
+		directory = tempfile.TemporaryDirectory()
+		self.addCleanup(directory.cleanup)
+
+		with open(os.path.join(directory.name, "users.csv"), "w") as f:
+			f.write("username,email,password_hash\n")
+			f.write(f"csvuser,csvuser@email.com,{self.password_hash}\n")
+
+		with open(os.path.join(directory.name, "users.jsonl"), "w") as f:
+			f.write(json.dumps({"username": "jsonuser", "email": "jsonuser@email.com", "password_hash": self.password_hash}) + "\n")
+
+		output = io.StringIO()
+		call_command("import_users", os.path.join(directory.name, "users.csv"), stdout=output)
+		call_command("import_users", os.path.join(directory.name, "users.jsonl"), stdout=output)
+
+		self.assertIn("Imported 1 of 1 users.", output.getvalue())
+		self.assertTrue(User.objects.filter(username__in=["csvuser", "jsonuser"]).count() == 2)
+
+
+class UserImportEndpointTest(DatabaseTestMixin, APITransactionTestCase):
+	"""
+	test importing users through the admin endpoint
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.admin = User.objects.create_user(username="admin", email="admin@email.com", password="testUSER23##", is_staff=True)
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(self.admin).access_token))
+		self.url = reverse('user_import')
+
+
+	def test_import_json(self):
+		"""
+		test a json list of users is queued, failed rows are returned with their errors and a task worker creates the rest
+
+		"""
+		response = self.client.post(self.url, {"users": [
+			{"username": "imported", "email": "imported@email.com", "password": "testUSER23##"},
+			{"username": "admin", "email": "other@email.com"},
+		]}, format='json')
+
+		self.assertEqual(response.data["status_code"], status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(response.data["queued"], 1)
+		self.assertEqual(response.data["details"][0]["row"], 2)
+		self.assertFalse(User.objects.filter(username="imported").exists())
+
+		job = claim_job()
+		self.assertEqual(job.name, "import_user_batch")
+		self.assertTrue(run_job(job))
+		self.assertTrue(User.objects.get(username="imported").check_password("testUSER23##"))
+
+
+	def test_import_csv(self):
+		"""
+		test a csv upload is queued for import
+
+		"""
+		upload = io.BytesIO(b"username,email\ncsvuser,csvuser@email.com\n")
+		upload.name = "users.csv"
+		response = self.client.post(self.url, {"file": upload}, format='multipart')
+
+		self.assertEqual(response.data["status_code"], status.HTTP_202_ACCEPTED)
+		self.assertEqual(Job.objects.filter(name="import_user_batch").count(), 1)
+
+		run_job(claim_job())
+		self.assertTrue(User.objects.filter(username="csvuser").exists())
+
+
+	def test_dry_run(self):
+		"""
+		test a dry run checks the rows without queueing them
+
+		"""
+		response = self.client.post(self.url, {"users": [{"username": "checked", "email": "checked@email.com"}], "dry_run": True}, format='json')
+
+		self.assertEqual(response.data["status_code"], status.HTTP_201_CREATED)
+		self.assertFalse(Job.objects.exists())
+
+
+	def test_queue_batches(self):
+		"""
+		test valid rows are queued as one job per batch
+
+		"""
+		rows = [clean_row({"username": f"batch{i}", "email": f"batch{i}@email.com"}) for i in range(5)]
+		result = queue_import(rows, batch_size=2)
+
+		self.assertEqual(result, {'queued': 5, 'errors': []})
+		self.assertEqual(Job.objects.filter(name="import_user_batch").count(), 3)
+
+
+	def test_import_pool(self):
+		"""
+		test import passwords are hashed on the import pool and not the sign-in pool
+
+		"""
+		with mock.patch('authentication.imports.get_import_executor') as executor:
+			executor.return_value.map.return_value = [["hashed"]]
+			self.assertEqual(hash_in_pool(["testUSER23##"]), ["hashed"])
+			executor.return_value.map.assert_called_once()
+
+
+	def test_admin_only(self):
+		"""
+		test users who aren't staff can't import
+
+		"""
+		user = User.objects.create_user(username="member", email="member@email.com", password="testUSER23##")
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(user).access_token))
+
+		response = self.client.post(self.url, {"users": []}, format='json')
+		self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,112 @@
+import time
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+
+
+# token bucket held in the django cache
+class TokenBucket:
+	"""
+		each identity starts with `capacity` tokens and gets one back every `refill` seconds.
+		only (tokens, timestamp) is stored, the refill is worked out when the bucket is read.
+		capacity and refill are the names of the settings holding them, so they can be changed per deployment.
+	"""
+
+	def __init__(self, name, capacity, refill):
+		self.name = name
+		self.capacity_setting = capacity
+		self.refill_setting = refill
+
+	@property
+	def capacity(self):
+		return getattr(settings, self.capacity_setting)
+
+	@property
+	def refill(self):
+		return getattr(settings, self.refill_setting)
+
+	def key(self, identity) -> str:
+		# login ids are user input, hashing keeps the key short and valid for every cache backend
+		return f"signin:{self.name}:{hashlib.md5(identity.encode()).hexdigest()}"
+
+	def tokens(self, identity, now=None) -> float:
+		now = now or time.time()
+		state = cache.get(self.key(identity))
+
+		if state is None:
+			return self.capacity
+
+		tokens, updated = state
+		return min(self.capacity, tokens + (now - updated) / self.refill)
+
+	def take(self, identity) -> float:
+		"""
+			removes one token and returns how many are left.
+			the read and write aren't atomic, concurrent failures may each take the same token, which only makes the limit slightly looser.
+		"""
+		now = time.time()
+		tokens = max(self.tokens(identity, now) - 1, 0)
+		# a full bucket is the same as no entry, so the entry can expire once it would have refilled
+		cache.set(self.key(identity), (tokens, now), int((self.capacity - tokens) * self.refill) + 1)
+		return tokens
+
+	def reset(self, identity):
+		cache.delete(self.key(identity))
+
+
+login_bucket = TokenBucket('login', 'SIGNIN_LOGIN_ATTEMPTS', 'SIGNIN_LOGIN_REFILL')
+ip_bucket = TokenBucket('ip', 'SIGNIN_IP_ATTEMPTS', 'SIGNIN_IP_REFILL')
+
+
+# cache key marking a login id as locked out
+def lockout_key(login_id) -> str:
+	return f"signin:lockout:{hashlib.md5(login_id.encode()).hexdigest()}"
+
+
+# address of the client making the request
+def get_client_ip(request) -> str:
+	"""
+		each proxy appends the address it got the request from to X-Forwarded-For, and the client can send the header
+		with any addresses it likes. only the right-most SIGNIN_TRUSTED_PROXIES entries were written by our proxies,
+		so the client is the left-most of those, and a faked header only adds entries further left.
+	"""
+	header = settings.SIGNIN_CLIENT_IP_HEADER
+	value = request.META.get(header) if header else None
+	addresses = [address.strip() for address in value.split(',') if address.strip()] if value else []
+
+	if settings.SIGNIN_TRUSTED_PROXIES > 0 and len(addresses) >= settings.SIGNIN_TRUSTED_PROXIES:
+		return addresses[-settings.SIGNIN_TRUSTED_PROXIES]
+
+	return request.META.get('REMOTE_ADDR', '')
+
+
+# check a sign-in may go ahead, this runs before the user is looked up or the password hashed
+def signin_allowed(login_id, ip) -> bool:
+	login_id = login_id.lower()
+
+	if cache.get(lockout_key(login_id)):
+		return False
+
+	return login_bucket.tokens(login_id) >= 1 and ip_bucket.tokens(ip) >= 1
+
+
+# record a failed sign-in
+def signin_failed(login_id, ip) -> bool:
+	"""
+		takes a token from both buckets and returns True when this failure emptied the login id bucket,
+		in which case the login id is locked out for SIGNIN_LOCKOUT_PERIOD and the caller persists the lockout.
+		signin_allowed needs a full token, so an empty bucket is only reached once per lockout.
+	"""
+	login_id = login_id.lower()
+	ip_bucket.take(ip)
+
+	if login_bucket.take(login_id) >= 1:
+		return False
+
+	cache.set(lockout_key(login_id), True, settings.SIGNIN_LOCKOUT_PERIOD)
+	return True
+
+
+# forget the failures of a login id after a successful sign-in
+def signin_succeeded(login_id):
+	login_bucket.reset(login_id.lower())
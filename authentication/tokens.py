@@ -0,0 +1,48 @@
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token, AccessToken as BaseAccessToken, RefreshToken as BaseRefreshToken
+
+from .blacklist import token_blacklist
+from .keys import get_token_backend
+from .utils import custom_jwt_payload_handler
+
+
+# tokens signed and verified with the backend of keys.py
+class KeyRingMixin:
+
+	@property
+	def token_backend(self):
+		return get_token_backend()
+
+
+# access token, set as SIMPLE_JWT's AUTH_TOKEN_CLASSES
+class AccessToken(KeyRingMixin, BaseAccessToken):
+	pass
+
+
+# token made for a user with their username and roles
+class UserClaimsToken(Token):
+
+	@classmethod
+	def for_user(cls, user):
+		return custom_jwt_payload_handler(super().for_user(user), user)
+
+
+# refresh token checked against the in-memory blacklist
+class RefreshToken(KeyRingMixin, BaseRefreshToken, UserClaimsToken):
+	"""
+		same as simplejwt's refresh token except that the blacklist check reads token_blacklist,
+		so refreshing or signing out with a token that isn't revoked doesn't query the blacklist tables.
+		blacklisting still writes the rows, the other workers pick them up on their next sync.
+		UserClaimsToken comes after simplejwt's BlacklistMixin, so the outstanding token it stores has the claims.
+	"""
+	access_token_class = AccessToken
+
+	def check_blacklist(self):
+		if self.payload[api_settings.JTI_CLAIM] in token_blacklist:
+			raise TokenError("Token is blacklisted")
+
+	def blacklist(self):
+		blacklisted = super().blacklist()
+		token_blacklist.add(self.payload[api_settings.JTI_CLAIM])
+		return blacklisted
@@ -5,7 +5,7 @@ from rest_framework_simplejwt.views import TokenRefreshView
 
 from .views import (
     SignUpRequest,SignInRequest,SignOutRequest,
-    ChangePasswordRequest
+    ChangePasswordRequest, JWKSRequest, UserImportRequest
 )
 
 urlpatterns = [
@@ -14,6 +14,8 @@ urlpatterns = [
     path('signout/', SignOutRequest.as_view(), name='signout'),
     path('change_password/', ChangePasswordRequest.as_view(), name='change_password'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('jwks/', JWKSRequest.as_view(), name='jwks'),
+    path('users/import/', UserImportRequest.as_view(), name='user_import'),
 ]
 
 if settings.DEBUG:
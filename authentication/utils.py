@@ -1,29 +1,75 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend 
-from django.db.models import Q
-from rest_framework_simplejwt.utils import jwt_payload_handler 
+from django.contrib.auth.hashers import check_password, make_password
+
+from fileshare.executor import run_in_process, run_sync
 
 
 User = get_user_model()
 
-# add username to jwt payload 
-def custom_jwt_payload_handler(user):
-	payload = jwt_payload_handler(user)
-	payload['username'] = user.username
-	return payload 
+# add username and roles to a jwt, access tokens made from a refresh token copy its claims 
+def custom_jwt_payload_handler(token, user):
+	token['username'] = user.username
+	token['is_staff'] = user.is_staff
+	token['is_superuser'] = user.is_superuser
+	return token 
 
 
 # custom auth backend  to login with either username or email 
 class CustomAuthBackend(ModelBackend):
 	def authenticate(self, request, username=None, password=None, **kwargs) -> None:
-		try:
-			# fetch user by username or email 
-			user = User.objects.get(Q(username__iexact=username) | Q(email__iexact=username))
+		if username is None or password is None:
+			return None
+
+		# fetch user by username or email 
+		user = User.objects.filter_login_id(username).first()
 
-		except User.DoesNotExist:
+		if user is None:
+			# hash anyway, so a missing user takes as long to reject as a wrong password
+			make_password(password)
 			return None 
 
 		if user.check_password(password):
 			return user 
 
-		return None 
\ No newline at end of file
+		return None
+
+
+# check a password against its hash, runs in the password process pool
+def verify_password(password, encoded) -> tuple:
+	"""
+		returns (is_correct, must_update), `must_update` is True when the hash was made with old hasher settings
+		and should be replaced. the hash isn't updated here since the pool has no database connection.
+	"""
+	outdated = []
+	is_correct = check_password(password, encoded, setter=lambda raw_password: outdated.append(True))
+	return is_correct, bool(outdated)
+
+
+# hash a password nobody has, used to spend the same time on unknown login ids 
+def hash_dummy_password(password):
+	make_password(password)
+
+
+# async sign-in by username or email
+async def aauthenticate_login(login_id, password):
+	"""
+		looks the user up with one query on the lower() indexes and checks the password in the process pool,
+		so hashing bursts don't hold the event loop or the shared sync executor. returns the user or None.
+	"""
+	user = await User.objects.filter_login_id(login_id).afirst()
+
+	if user is None:
+		await run_in_process(hash_dummy_password, password)
+		return None
+
+	is_correct, must_update = await run_in_process(verify_password, password, user.password)
+
+	if not is_correct:
+		return None
+
+	if must_update:
+		await run_sync(user.set_password, password)
+		await user.asave(update_fields=['password'])
+
+	return user
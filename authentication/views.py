@@ -1,18 +1,27 @@
-import asyncio 
+import io
+import os
 import logging 
-from datetime import timedelta
-from django.utils import timezone 
-from django.contrib.auth import authenticate, get_user_model  
-from django.db.models import Q 
+from django.conf import settings
+from django.contrib.auth import get_user_model  
+from django.db import transaction
+from django.http import JsonResponse
+from django.views import View
 from rest_framework import status, permissions
-from rest_framework.views import APIView 
+from fileshare.views import APIView
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response 
-from rest_framework_simplejwt.tokens import RefreshToken 
 
 from .serializers import (
 	SignUpSerializer, SignInSerializer,ChangePasswordSerializer
 )
-from fileshare.database import database 
+from fileshare.executor import run_sync 
+from users.cache import cache_call
+from .utils import aauthenticate_login
+from .tokens import RefreshToken
+from .keys import get_token_backend, is_asymmetric
+from .imports import read_rows, clean_row, import_users, queue_import
+from .authentication import aget_full_user
+from .throttle import get_client_ip, signin_allowed, signin_failed, signin_succeeded
 
 # define user 
 User = get_user_model()
@@ -32,10 +41,10 @@ class SignUpRequest(APIView):
 		try:
 			serializer = self.serializer_class(data=request.data)
 
-			if serializer.is_valid(raise_exception=True):
-				# use async context manager to handle database connection 
-				async with database.transaction():
-					await asyncio.to_thread(serializer.save)
+			# validation checks username and email availability, so it runs on the sync executor 
+			if await run_sync(serializer.is_valid, raise_exception=True):
+				# hashing the password is cpu heavy, the user and the profile made by its post_save go in one transaction 
+				await run_sync(transaction.atomic()(serializer.save))
 
 				# return success response 
 				return Response({
@@ -78,66 +87,62 @@ class SignInRequest(APIView):
 			loginId = serializer.validated_data["login_id"]
 			password = serializer.validated_data["password"]
 
-			user = await asyncio.to_thread(authenticate, request, username=loginId, password=password)
+			ip = get_client_ip(request)
 
-			if user is not None:
-				if user.is_active:
-					refresh = RefreshToken.for_user(user) # generate refresh token for user
-					await asyncio.to_thread(user.reset_login_trials()) # reset login trials 
-
-					# return success response 
-					return Response({
-						"status": "success",
-						"status_code": status.HTTP_200_OK,
-						"access": str(refresh.access_token),
-						"refresh": str(refresh),
-						"details": "Login successful."
-					})
-
-				# if user is not active 
+			# abusive attempts are turned away before the user is looked up or the password is hashed 
+			if not await cache_call(signin_allowed, loginId, ip):
 				return Response({
 					"status": "error",
-					"status_code": status.HTTP_401_UNAUTHORIZED,
-					"details": "Account not active. Please contact our support team."
+					"status_code": status.HTTP_429_TOO_MANY_REQUESTS,
+					"details": "You've tried too many times. Please try again later."
 				})
 
-			# if user is None (failed authentication)
 			try:
-				# try to find user with the provided login id (username or email) 
-				user = await asyncio.to_thread(User.objects.get, (Q(username__iexact=loginId) | Q(email__iexact=loginId)))
-				if user:
-					# get user last failed login time
-					if user.last_failed_login:
-						time_since_last_failed_login = timezone.now() - user.last_failed_login
-						# if time_since_last_failed_login is > 24 (24 hours), reset user login_trials
-						if time_since_last_failed_login > timedelta(hours=24):
-							await asyncio.to_thread(user.reset_login_trials())
-
-					# if user hasn't exceeded the login trials 
-					if user.login_trials < user.max_login_trials:
-						await asyncio.to_thread(user.increment_login_trials()) # add 1 to the current login trial count
-						# return invalid username or password response 
+				user = await aauthenticate_login(loginId, password)
+
+				if user is not None:
+					# a lockout persisted in the database outlives the throttle's cache entries 
+					if user.is_locked_out:
 						return Response({
 							"status": "error",
 							"status_code": status.HTTP_401_UNAUTHORIZED,
-							"details": "Invalid login credentials."
+							"details": "You've tried too many times. Please try again after 24 hours"
 						})
 
-					# if login_trials is > max_login_trials
+					if user.is_active:
+						refresh = await run_sync(RefreshToken.for_user, user) # generate refresh token for user, with the username and roles as claims
+						await cache_call(signin_succeeded, loginId)
+
+						# reset login trials, the row is only written when there is something to reset 
+						if user.login_trials or user.last_failed_login:
+							await user.areset_login_trials()
+
+						# return success response 
+						return Response({
+							"status": "success",
+							"status_code": status.HTTP_200_OK,
+							"access": str(refresh.access_token),
+							"refresh": str(refresh),
+							"details": "Login successful."
+						})
+
+					# if user is not active 
 					return Response({
 						"status": "error",
 						"status_code": status.HTTP_401_UNAUTHORIZED,
-						"details": "You've tried too many times. Please try again after 24 hours"
+						"details": "Account not active. Please contact our support team."
 					})
 
-				# if no user is found 
-				return Response({
-					"status": "error",
-					"status_code": status.HTTP_401_UNAUTHORIZED,
-					"details": "Invalid login credentials."
-				})
+				# if user is None (failed authentication), the failure is only counted in the throttle 
+				# and the account row is written once, when the failure locks it out 
+				if await cache_call(signin_failed, loginId, ip):
+					await User.objects.alock_out(loginId)
+					return Response({
+						"status": "error",
+						"status_code": status.HTTP_401_UNAUTHORIZED,
+						"details": "You've tried too many times. Please try again after 24 hours"
+					})
 
-			except User.DoesNotExist:
 				return Response({
 					"status": "error",
 					"status_code": status.HTTP_401_UNAUTHORIZED,
@@ -168,12 +173,12 @@ class SignOutRequest(APIView):
 	permission_classes = [permissions.IsAuthenticated]
 
 	async def post(self, request):
-		# try to get token from http header 
 		try:
+			# the authorization header carries the access token the request is authenticated with, so the refresh token in the body comes first 
+			token = request.data.get("refresh")
 			authorization_header = request.headers.get('Authorization')
-			token = None
 
-			if authorization_header:
+			if not token and authorization_header:
 				# split authorization header into part (token should be in Bearer <token>)
 				parts = authorization_header.split()
 
@@ -183,8 +188,8 @@ class SignOutRequest(APIView):
 
 			if token:
 				# blacklist refresh token 
-				refresh_token = RefreshToken(token)
-				refresh_token.blacklist()
+				refresh_token = await run_sync(RefreshToken, token)
+				await run_sync(refresh_token.blacklist)
 
 				# return success response
 				return Response({
@@ -193,25 +198,9 @@ class SignOutRequest(APIView):
 					"details": "Logout successful."
 				})
 
-	
-			# get refresh token from form data if token is not provided in authentication header
-			refresh_token = request.data["refresh"]
-
-			if refresh_token:
-				# blacklist token 
-				token = RefreshToken(refresh_token)
-				token.blacklist()
-				
-				# return success response 
-				return Response({
-					"status": "success",
-					"status_code": status.HTTP_204_NO_CONTENT,
-					"details": "Logout successful"
-				})
-
 			return Response({
 				"status": "error",
-				"status": status.HTTP_401_UNAUTHORIZED,
+				"status_code": status.HTTP_401_UNAUTHORIZED,
 				"details": "Unable to log you out. Please provide a valid token"
 			})
 
@@ -231,11 +220,12 @@ class ChangePasswordRequest(APIView):
 	serializer_class = ChangePasswordSerializer
 
 	async def post(self, request):
+		# checking and setting the password needs the full user model 
+		request.user = await aget_full_user(request.user)
 		serializer = self.serializer_class(data=request.data, context={'request': request})
 
-		if serializer.is_valid(raise_exception=True):
-			async with database.transaction():
-				await asyncio.to_thread(serializer.save)
+		if await run_sync(serializer.is_valid, raise_exception=True):
+			await run_sync(serializer.save)
 
 			return Response({
 				"status": "success",
@@ -252,3 +242,88 @@ class ChangePasswordRequest(APIView):
 		})
 
 
+# bulk user import view, for staff onboarding many accounts at once 
+class UserImportRequest(APIView):
+	"""
+		takes a csv or jsonl `file` upload, or a json body with a `users` list of objects.
+		valid rows are queued for the task workers to create and the rows that failed are returned with their errors,
+		`dry_run` only checks them.
+	"""
+
+	permission_classes = [permissions.IsAdminUser, ]
+	parser_classes = [MultiPartParser, FormParser, JSONParser]
+
+	async def post(self, request):
+		try:
+			upload = request.FILES.get('file')
+
+			if upload is not None:
+				format = request.data.get('format') or os.path.splitext(upload.name)[1].lstrip('.').lower()
+				rows = await run_sync(read_rows, io.TextIOWrapper(upload.file, encoding='utf-8', newline=''), format)
+			else:
+				rows = [clean_row(row) for row in request.data.get('users', [])]
+
+		except (ValueError, UnicodeDecodeError) as e:
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_400_BAD_REQUEST,
+				"details": str(e),
+				"error_message": "Request failed. Invalid data format."
+			})
+
+		try:
+			dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+
+			if dry_run:
+				result = await run_sync(import_users, rows, dry_run=True)
+			else:
+				# hashing a large import would hold the request, so the valid rows are created by the task workers 
+				result = await run_sync(queue_import, rows)
+
+			count = result['created'] if dry_run else result['queued']
+
+			if result['errors']:
+				return Response({
+					"status": "error",
+					"status_code": status.HTTP_400_BAD_REQUEST,
+					"details": result['errors'],
+					"error_message": f"{len(result['errors'])} of {len(rows)} users could not be imported.",
+					"created" if dry_run else "queued": count
+				})
+
+			return Response({
+				"status": "success",
+				"status_code": status.HTTP_201_CREATED if dry_run else status.HTTP_202_ACCEPTED,
+				"details": f"{len(rows)} users checked." if dry_run else f"{count} users queued for import.",
+				"created" if dry_run else "queued": count
+			})
+
+		except Exception as e:
+			logger.error(f"An error occurred in user import request: {e}", exc_info=True)
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+				"details": "An error occurred. Please try again later."
+			})
+
+
+# json web key set view, publishes the public keys tokens are verified with 
+class JWKSRequest(View):
+	"""
+		a plain django view, the key set is public and the same for every client, so CDNs and other services can cache it.
+		symmetric algorithms have no public key to publish.
+	"""
+
+	async def get(self, request):
+		backend = get_token_backend()
+
+		if not is_asymmetric(backend.algorithm):
+			return JsonResponse({
+				"status": "error",
+				"status_code": 404,
+				"details": "Tokens are not signed with a public key."
+			}, status=404)
+
+		response = JsonResponse(backend.jwks())
+		response['Cache-Control'] = f"public, max-age={settings.JWT_JWKS_MAX_AGE}"
+		return response
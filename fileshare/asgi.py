@@ -1,11 +1,14 @@
 import os
 from django.core.asgi import get_asgi_application
-from .middlewares import DatabaseMiddleware # DatabaseMiddleware from middleware.py
 
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fileshare.settings')
 
 application = get_asgi_application()
+
+# the middleware reads django settings when it is imported, so it comes after the settings module is set 
+from .middlewares import DatabaseMiddleware # DatabaseMiddleware from middleware.py
+
 # connect application with DatabaseMiddleware
 application = DatabaseMiddleware(application)
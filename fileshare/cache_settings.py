@@ -0,0 +1,33 @@
+""" this file contains cache config """
+
+import os 
+from dotenv import load_dotenv
+
+# load env variables
+load_dotenv()
+
+
+# cache backends that can be picked with CACHE_BACKEND 
+# 'locmem' is an in-process LRU, each worker process has its own copy and only sees the invalidations it made itself,
+# so deployments with several worker processes should use 'file' or 'db' (run `manage.py createcachetable` first)
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'fileshare'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', '/var/tmp/fileshare_cache'),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'fileshare_cache'),
+}
+CACHE_BACKEND, CACHE_LOCATION = CACHE_BACKENDS[os.getenv('CACHE_BACKEND', 'locmem')]
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', CACHE_LOCATION),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)), # least recently used entries are evicted past this
+        },
+    }
+}
+
+
+# seconds a cached inbox or outbox page, or a listing version behind an etag, is used before it is rebuilt, even without a change 
+LISTING_CACHE_TIMEOUT = int(os.getenv('LISTING_CACHE_TIMEOUT', 300))
@@ -1,5 +1,5 @@
-import os 
-from databases import Database  
+import os
+from databases import Database
 from dotenv import load_dotenv
 
 # load env variables
@@ -7,4 +7,20 @@ load_dotenv()
 
 # define and connect async database
 DATABASE_URL = os.getenv('DATABASE_URL')
-database = Database(DATABASE_URL)
\ No newline at end of file
+
+# connection pool config
+DATABASE_POOL_MIN_SIZE = int(os.getenv('DATABASE_POOL_MIN_SIZE', 2)) # connections opened when the pool starts
+DATABASE_POOL_MAX_SIZE = int(os.getenv('DATABASE_POOL_MAX_SIZE', 10))
+DATABASE_CONNECT_TIMEOUT = float(os.getenv('DATABASE_CONNECT_TIMEOUT', 10)) # seconds to wait for a new connection
+DATABASE_COMMAND_TIMEOUT = float(os.getenv('DATABASE_COMMAND_TIMEOUT', 30)) # seconds a single statement may run
+DATABASE_MAX_IDLE_TIME = float(os.getenv('DATABASE_MAX_IDLE_TIME', 300)) # seconds before an idle connection is closed
+
+database = Database(
+	DATABASE_URL,
+	min_size=DATABASE_POOL_MIN_SIZE,
+	max_size=DATABASE_POOL_MAX_SIZE,
+	timeout=DATABASE_CONNECT_TIMEOUT,
+	command_timeout=DATABASE_COMMAND_TIMEOUT,
+	max_inactive_connection_lifetime=DATABASE_MAX_IDLE_TIME,
+)
+
@@ -14,10 +14,32 @@ DATABASES = {
         'PASSWORD': os.getenv('DATABASE_PASSWORD'),
         'HOST': os.getenv('DATABASE_HOST'),
         'PORT': os.getenv('DATABASE_PORT'),
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', 0)), # seconds connections opened outside the sync executor stay open, 0 closes them after each request
+        'CONN_HEALTH_CHECKS': os.getenv('DATABASE_CONN_HEALTH_CHECKS', 'True').lower() == 'true', # check a reused connection still works before using it
     }
 }
 
 
+# number of threads used to run sync code (serializer saves, file I/O) from async views
+SYNC_EXECUTOR_WORKERS = int(os.getenv('SYNC_EXECUTOR_WORKERS', 16))
+
+# seconds the threads above keep their django connections open for reuse, the async ORM calls of a request run on
+# a thread that only lives as long as the request, so their connections follow CONN_MAX_AGE instead
+SYNC_CONN_MAX_AGE = int(os.getenv('DATABASE_SYNC_CONN_MAX_AGE', 600))
+
+# number of processes used to check password hashes, so sign-in bursts don't take the threads above
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+
+# django connections opened on executor threads at startup, so the first requests after a deploy don't pay for them
+DATABASE_WARM_CONNECTIONS = int(os.getenv('DATABASE_WARM_CONNECTIONS', 4))
+
+# seconds the lifespan shutdown waits for requests in flight before closing the database pool
+LIFESPAN_DRAIN_TIMEOUT = float(os.getenv('LIFESPAN_DRAIN_TIMEOUT', 30))
+
+# seconds closing the executor connections waits for busy threads, the connections of a thread still busy are left open
+SYNC_CLOSE_TIMEOUT = float(os.getenv('SYNC_CLOSE_TIMEOUT', 10))
+
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -19,16 +19,21 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 # rest_framework auth and permissions 
+# JWT_STATELESS_AUTH builds request.user from the token claims instead of fetching the user row on every request,
+# views that need the full user load it through a per-process cache kept for JWT_USER_CACHE_TTL seconds
+JWT_STATELESS_AUTH = os.getenv('JWT_STATELESS_AUTH', 'False').lower() == 'true'
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', 30))
+JWT_USER_CACHE_SIZE = int(os.getenv('JWT_USER_CACHE_SIZE', 10000))
+
 REST_FRAMEWORK = {
 	"DEFAULT_AUTHENTICATION_CLASSES": (
-		"rest_framework_simplejwt.authentication.JWTAuthentication", # JWT authentication 
+		"authentication.authentication.StatelessJWTAuthentication" if JWT_STATELESS_AUTH # JWT authentication from token claims 
+		else "rest_framework_simplejwt.authentication.JWTAuthentication", # JWT authentication 
 	)
 }
 
-# JWT configuration
-JWT_AUTH = {
-	"JWT_PAYLOAD_HANDLER": "authentication.utils.custom_jwt_payload_handler", # this handler includes the username of the user in the jwt payload
-}
+# default page size of listing endpoints 
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', 50))
 
 SIMPLE_JWT = {
 	"ACCESS_TOKEN_LIFETIME": timedelta(days=int(os.getenv('ACCESS_TOKEN_LIFETIME'))),
@@ -51,7 +56,7 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'USER_AUTHENTICATION_RULE': 'rest_framework_simplejwt.authentication.default_user_authentication_rule',
 
-    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    'AUTH_TOKEN_CLASSES': ('authentication.tokens.AccessToken',), # signed with the keys of JWT_KEY_DIR for asymmetric algorithms
     'TOKEN_TYPE_CLAIM': 'token_type',
     'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
 
@@ -61,8 +66,45 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=int(os.getenv('SLIDING_TOKEN_LIFETIME'))),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=int(os.getenv('SLIDING_TOKEN_REFRESH_LIFETIME'))),
 
+    "TOKEN_REFRESH_SERIALIZER": "authentication.serializers.TokenRefreshSerializer", # checks the in-memory token blacklist
+
 }
 
 
+# asymmetric JWT signing config 
+# with an RS*, ES* or EdDSA JWT_ALGORITHM, tokens are signed with the JWT_SIGNING_KID key of JWT_KEY_DIR, which holds one <kid>.pem per key.
+# a retired key can be left in the directory as a public key, it keeps verifying the tokens signed with it, and every public key is published at the JWKS endpoint
+JWT_KEY_DIR = os.getenv('JWT_KEY_DIR')
+JWT_SIGNING_KID = os.getenv('JWT_SIGNING_KID')
+JWT_JWKS_MAX_AGE = int(os.getenv('JWT_JWKS_MAX_AGE', 60 * 60)) # seconds other services may cache the key set
+
+
+# in-memory token blacklist config 
+# each process keeps a bloom filter of the revoked refresh tokens and reads new revocations every TOKEN_BLACKLIST_SYNC_INTERVAL seconds
+TOKEN_BLACKLIST_CAPACITY = int(os.getenv('TOKEN_BLACKLIST_CAPACITY', 100000)) # smallest filter size, it grows to twice the revoked tokens when rebuilt
+TOKEN_BLACKLIST_ERROR_RATE = float(os.getenv('TOKEN_BLACKLIST_ERROR_RATE', 0.001)) # share of unrevoked tokens that are checked in the database
+TOKEN_BLACKLIST_RECENT_SIZE = int(os.getenv('TOKEN_BLACKLIST_RECENT_SIZE', 10000)) # recently revoked tokens answered without the database
+TOKEN_BLACKLIST_SYNC_INTERVAL = float(os.getenv('TOKEN_BLACKLIST_SYNC_INTERVAL', 5))
+TOKEN_BLACKLIST_SYNC_OVERLAP = int(os.getenv('TOKEN_BLACKLIST_SYNC_OVERLAP', 100)) # ids below the last one read that are read again, rows can commit out of id order
+TOKEN_PRUNE_BATCH_SIZE = int(os.getenv('TOKEN_PRUNE_BATCH_SIZE', 1000)) # rows deleted per batch by prune_tokens
+
+
+# bulk user import config 
+USER_IMPORT_BATCH_SIZE = int(os.getenv('USER_IMPORT_BATCH_SIZE', 1000)) # users hashed and inserted per transaction
+USER_IMPORT_HASH_WORKERS = int(os.getenv('USER_IMPORT_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2))) # processes hashing import passwords, apart from the sign-in pool
+
+
+# sign-in throttling config 
+# failed sign-ins use up tokens of a bucket per login id and per client ip, one token comes back every *_REFILL seconds.
+# an empty bucket rejects sign-ins before the password is checked, and an empty login id bucket locks the account out
+SIGNIN_LOGIN_ATTEMPTS = int(os.getenv('SIGNIN_LOGIN_ATTEMPTS', 5))
+SIGNIN_LOGIN_REFILL = int(os.getenv('SIGNIN_LOGIN_REFILL', 5 * 60))
+SIGNIN_IP_ATTEMPTS = int(os.getenv('SIGNIN_IP_ATTEMPTS', 30))
+SIGNIN_IP_REFILL = int(os.getenv('SIGNIN_IP_REFILL', 10))
+SIGNIN_LOCKOUT_PERIOD = int(os.getenv('SIGNIN_LOCKOUT_PERIOD', 24 * 60 * 60)) # seconds an account stays locked out
+SIGNIN_CLIENT_IP_HEADER = os.getenv('SIGNIN_CLIENT_IP_HEADER') # e.g. HTTP_X_FORWARDED_FOR when behind a trusted proxy, REMOTE_ADDR is used otherwise
+SIGNIN_TRUSTED_PROXIES = int(os.getenv('SIGNIN_TRUSTED_PROXIES', 1)) # proxies in front of the app that append to SIGNIN_CLIENT_IP_HEADER, anything left of them is sent by the client
+
+
 # corsheaders config 
 CORS_ALLOW_ALL_ORIGIN = True  # allows http requests from any server 
\ No newline at end of file
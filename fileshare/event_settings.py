@@ -0,0 +1,18 @@
+""" this file contains server-sent events config """
+
+import os 
+from dotenv import load_dotenv
+
+# load env variables
+load_dotenv()
+
+
+# events config 
+# 'local' only reaches clients connected to the same worker process,
+# 'postgres' fans events out to every worker process with LISTEN/NOTIFY and needs DATABASE_URL to point at postgres
+EVENT_BACKEND = os.getenv('EVENT_BACKEND', 'local')
+EVENT_KEEPALIVE = float(os.getenv('EVENT_KEEPALIVE', 15)) # seconds between keepalive comments on an idle stream
+EVENT_QUEUE_SIZE = int(os.getenv('EVENT_QUEUE_SIZE', 100)) # events buffered per client, the oldest are dropped past this
+EVENT_REPLAY_LIMIT = int(os.getenv('EVENT_REPLAY_LIMIT', 100)) # missed shares sent to a client that reconnects with Last-Event-ID
+EVENT_TICKET_LIFETIME = int(os.getenv('EVENT_TICKET_LIFETIME', 30)) # seconds a stream ticket can be used to open the stream
+EVENT_RECONNECT_DELAY = float(os.getenv('EVENT_RECONNECT_DELAY', 1)) # seconds before a dropped postgres listener is reopened, doubled on each failure up to a minute
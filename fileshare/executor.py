@@ -0,0 +1,122 @@
+import asyncio 
+import logging
+import threading
+import multiprocessing
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+import django
+from django.conf import settings
+from django.db import connections, close_old_connections
+from django.db.backends.signals import connection_created
+
+from .metrics import pool_metrics
+
+# initialize logger
+logger = logging.getLogger('fileshare')
+
+
+# bounded thread pool for sync work that has no async API (serializer saves, file I/O, transactions)
+# the size caps how many threads, and so how many django database connections, the sync work can hold at once
+SYNC_THREAD_PREFIX = 'fileshare-sync'
+executor = ThreadPoolExecutor(max_workers=settings.SYNC_EXECUTOR_WORKERS, thread_name_prefix=SYNC_THREAD_PREFIX)
+
+
+# executor threads live as long as the process and close_sync_connections closes their connections, so only
+# their connections are kept for SYNC_CONN_MAX_AGE. connections of other threads keep the CONN_MAX_AGE deadline
+def persist_sync_connection(sender, connection, **kwargs):
+	if threading.current_thread().name.startswith(SYNC_THREAD_PREFIX):
+		connection.close_at = time.monotonic() + settings.SYNC_CONN_MAX_AGE
+
+connection_created.connect(persist_sync_connection)
+
+
+# run the work on an executor thread and record how long it waited for the thread
+def run_measured(func, submitted_at):
+	pool_metrics.started(submitted_at)
+
+	try:
+		# executor threads don't see request_started/request_finished, so expired or broken
+		# persistent connections are dropped here before they are reused
+		close_old_connections()
+		return func()
+
+	finally:
+		pool_metrics.finished()
+
+
+# run a sync function on the bounded executor and wait for its result 
+async def run_sync(func, *args, **kwargs):
+	loop = asyncio.get_running_loop()
+	submitted_at = pool_metrics.submitted()
+	return await loop.run_in_executor(executor, run_measured, partial(func, *args, **kwargs), submitted_at)
+
+
+# close the django connections the executor threads keep open for SYNC_CONN_MAX_AGE
+def close_sync_connections(timeout=None):
+	"""
+		the barrier holds every call until all threads have one, so each thread closes its own connections.
+		when a thread is still busy after `timeout` seconds the barrier breaks and the free threads close theirs,
+		the connections of the busy thread are left to expire or to close with the process.
+	"""
+	timeout = timeout or settings.SYNC_CLOSE_TIMEOUT
+	barrier = threading.Barrier(settings.SYNC_EXECUTOR_WORKERS, timeout=timeout)
+
+	def close():
+		try:
+			barrier.wait()
+		except threading.BrokenBarrierError:
+			pass
+
+		connections.close_all()
+
+	# the barrier's wait, and as long again for the closes
+	futures = [executor.submit(close) for _ in range(settings.SYNC_EXECUTOR_WORKERS)]
+	wait(futures, timeout * 2)
+
+	if barrier.broken:
+		logger.warning(f"Executor threads were still busy after {timeout}s, their connections were left open")
+
+
+# bounded process pool for cpu bound work (password hashing) that would hold the GIL on executor threads
+# it is started on first use, so processes that never check a password (task workers, management commands) don't fork it
+process_executor = None
+process_executor_lock = threading.Lock()
+
+
+# separate pool for bulk user imports, so the hashes of an import don't queue the sign-ins behind them
+import_executor = None
+
+
+def start_process_executor(max_workers):
+	# forking a process that runs executor and event loop threads can copy a lock another thread held, so the workers
+	# start from a clean forkserver process, and django.setup loads the settings in each of them
+	return ProcessPoolExecutor(
+		max_workers=max_workers, mp_context=multiprocessing.get_context('forkserver'), initializer=django.setup
+	)
+
+
+def get_process_executor():
+	global process_executor
+
+	with process_executor_lock:
+		if process_executor is None:
+			process_executor = start_process_executor(settings.PASSWORD_HASH_WORKERS)
+
+	return process_executor
+
+
+def get_import_executor():
+	global import_executor
+
+	with process_executor_lock:
+		if import_executor is None:
+			import_executor = start_process_executor(settings.USER_IMPORT_HASH_WORKERS)
+
+	return import_executor
+
+
+# run a picklable cpu bound function in the process pool and wait for its result 
+async def run_in_process(func, *args):
+	loop = asyncio.get_running_loop()
+	return await loop.run_in_executor(get_process_executor(), func, *args)
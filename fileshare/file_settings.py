@@ -0,0 +1,45 @@
+""" this file contains file upload and download config """
+
+import os 
+from dotenv import load_dotenv
+
+# load env variables
+load_dotenv()
+
+
+# chunked upload config 
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)) # size of each upload chunk in bytes (8MB by default)
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 10 * 1024 * 1024 * 1024)) # largest file a client can upload in bytes (10GB by default)
+UPLOAD_PARTIAL_DIR = 'documents/partial/' # unfinished uploads are appended here (relative to MEDIA_ROOT) until they are finalized
+
+# content-addressed storage config 
+# when enabled, uploads are stored once per sha256 digest under BLOB_DIR and shared by every File with the same content
+FILE_DEDUPLICATION = os.getenv('FILE_DEDUPLICATION', 'False').lower() == 'true'
+BLOB_DIR = 'blobs/'
+# a client probing for content it doesn't upload must hash a range of it picked by the server, within the challenge lifetime
+PROBE_CHALLENGE_SIZE = int(os.getenv('PROBE_CHALLENGE_SIZE', 64 * 1024)) # bytes of content hashed to answer a challenge
+PROBE_CHALLENGE_LIFETIME = int(os.getenv('PROBE_CHALLENGE_LIFETIME', 5 * 60)) # seconds a challenge can be answered in
+
+# preview config 
+# image uploads get jpeg thumbnails of these sizes (longest side in pixels), written to a 'previews' directory next to the original
+PREVIEW_SIZES = [int(size) for size in os.getenv('PREVIEW_SIZES', '128,512').split(',')]
+PREVIEW_QUALITY = int(os.getenv('PREVIEW_QUALITY', 80)) # jpeg quality of the previews
+
+# public link config 
+# signed download links are checked from the url alone, they stop working when they expire or SECRET_KEY changes
+FILE_LINK_LIFETIME = int(os.getenv('FILE_LINK_LIFETIME', 60 * 60)) # default lifetime of a link in seconds
+FILE_LINK_MAX_LIFETIME = int(os.getenv('FILE_LINK_MAX_LIFETIME', 7 * 24 * 60 * 60)) # longest lifetime a user can ask for
+
+# block size used when copying file bytes between streams 
+FILE_BLOCK_SIZE = int(os.getenv('FILE_BLOCK_SIZE', 64 * 1024))
+
+
+# download delivery config 
+# 'stream' sends the file through the app, 'x-accel-redirect' (nginx) and 'x-sendfile' (apache, lighttpd) only check permissions and let the front proxy send the file
+FILE_DELIVERY_MODE = os.getenv('FILE_DELIVERY_MODE', 'stream')
+FILE_ACCEL_REDIRECT_PREFIX = os.getenv('FILE_ACCEL_REDIRECT_PREFIX', '/protected/') # internal nginx location that is an alias of MEDIA_ROOT
+
+
+# bulk share config 
+BULK_SHARE_MAX_FILES = int(os.getenv('BULK_SHARE_MAX_FILES', 100)) # most files one bulk share request can send
+BULK_SHARE_MAX_RECEIVERS = int(os.getenv('BULK_SHARE_MAX_RECEIVERS', 1000)) # most receivers one bulk share request can send to
@@ -64,5 +64,10 @@ LOGGING = {
 			'level': 'DEBUG',
 			'propergate': True,
 		},
+		'fileshare': { # project level (asgi lifespan) logging type
+			'handlers': ['console'],
+			'level': 'DEBUG',
+			'propergate': True,
+		},
 	},
 }
\ No newline at end of file
@@ -0,0 +1,65 @@
+import time 
+import threading 
+from django.db.backends.signals import connection_created
+
+
+# counters for the sync executor and the database connections it holds 
+class PoolMetrics:
+	"""
+		tracks how busy the sync executor is, how long work waits for a free thread,
+		and how many django database connections have been opened. the counters are shared by all threads.
+	"""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.waiting = 0 # work submitted but not started yet
+		self.busy = 0 # work running on an executor thread
+		self.completed = 0
+		self.total_wait = 0.0 # seconds
+		self.max_wait = 0.0 # seconds
+		self.connections_opened = 0
+
+	# work was handed to the executor 
+	def submitted(self):
+		with self.lock:
+			self.waiting += 1
+		return time.monotonic()
+
+	# an executor thread picked up work that was submitted at `submitted_at`
+	def started(self, submitted_at):
+		wait = time.monotonic() - submitted_at
+		with self.lock:
+			self.waiting -= 1
+			self.busy += 1
+			self.total_wait += wait
+			self.max_wait = max(self.max_wait, wait)
+
+	def finished(self):
+		with self.lock:
+			self.busy -= 1
+			self.completed += 1
+
+	def connection_opened(self):
+		with self.lock:
+			self.connections_opened += 1
+
+	def snapshot(self):
+		with self.lock:
+			return {
+				"executor_waiting": self.waiting,
+				"executor_busy": self.busy,
+				"executor_completed": self.completed,
+				"executor_average_wait_ms": round(self.total_wait / self.completed * 1000, 3) if self.completed else 0.0,
+				"executor_max_wait_ms": round(self.max_wait * 1000, 3),
+				"db_connections_opened": self.connections_opened,
+			}
+
+
+pool_metrics = PoolMetrics()
+
+
+# count new django connections, with persistent connections this should stay close to the number of executor threads
+def count_connection(sender, connection, **kwargs):
+	pool_metrics.connection_opened()
+
+connection_created.connect(count_connection)
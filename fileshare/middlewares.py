@@ -1,40 +1,128 @@
-import asyncio 
-from .database import database  
+import asyncio
+import logging
+import threading
+from django.conf import settings
+from django.db import connection
 
+from .database import database, DATABASE_CONNECT_TIMEOUT
+from .executor import executor, close_sync_connections
 
-# database middleware class 
+# initialize logger
+logger = logging.getLogger('fileshare')
+
+
+# open a django connection on an executor thread, the barrier keeps each call on a different thread
+def warm_sync_connection(barrier):
+	connection.ensure_connection()
+	barrier.wait()
+
+
+# database middleware class
 class DatabaseMiddleware:
 	"""
 		database middleware to manage the connection and disconnection of the database within the lifecycle of an ASGI application.
-		Scope parameter is a dictionary that contains details about the current request. 
+		Scope parameter is a dictionary that contains details about the current request.
 		Receive is an async callable provided by the ASGI framework that you call to receive an event from the client (or in this case, from the ASGI server).
-		Send is an async callable provided by the ASGI framework that you call to send a response or event back to the client (or in this case, to the ASGI server).			
+		Send is an async callable provided by the ASGI framework that you call to send a response or event back to the client (or in this case, to the ASGI server).
+
+		every worker process runs its own lifespan, so each one connects its own pool once and warms it before it reports
+		that startup is complete, which keeps connection setup out of the first requests after a deploy.
 	"""
 
 	def __init__(self, app):
-		self.app = app 
+		self.app = app
+		self.started = False
+		self.startup_lock = asyncio.Lock()
+		self.in_flight = 0
+		self.idle = asyncio.Event()
+		self.idle.set()
 
 	async def __call__(self, scope, receive, send):
-		
+
 		if scope['type'] == 'lifespan':
-			while True:
-				message = await receive()
-				
-				if message['type'] == 'lifespan.startup':
-					await database.connect()
-					await send({'type': 'lifespan.startup.complete'})
-
-				elif message['type'] == 'lifespan.shutdown':
-					await database.disconnect()
-					await send({'type': 'lifespan.shutdown.complete'})
-
-				else:
-					break
+			await self.lifespan(receive, send)
+
 		else:
+			# servers run without lifespan support (or with it turned off) never send startup, connect on the first request instead
+			if not self.started:
+				await self.startup()
+
 			# For any scope type other than lifespan, the middleware simply passes control to the next application or middleware in the stack.
-			await self.app(scope, receive, send)
+			self.in_flight += 1
+			self.idle.clear()
+
+			try:
+				await self.app(scope, receive, send)
+
+			finally:
+				self.in_flight -= 1
+				if self.in_flight == 0:
+					self.idle.set()
+
+	async def lifespan(self, receive, send):
+		while True:
+			message = await receive()
+
+			if message['type'] == 'lifespan.startup':
+				try:
+					await self.startup()
+
+				# the server logs the message and exits instead of serving requests it can't handle
+				except Exception as e:
+					logger.error(f"An error occurred during application startup: {e}", exc_info=True)
+					await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+					return
+
+				await send({'type': 'lifespan.startup.complete'})
+
+			elif message['type'] == 'lifespan.shutdown':
+				try:
+					await self.shutdown()
+
+				except Exception as e:
+					logger.error(f"An error occurred during application shutdown: {e}", exc_info=True)
+					await send({'type': 'lifespan.shutdown.failed', 'message': str(e)})
+					return
+
+				await send({'type': 'lifespan.shutdown.complete'})
+				return
+
+			# messages added by later versions of the spec are not for us
+
+	# connect and warm the pools once per worker process
+	async def startup(self):
+		async with self.startup_lock:
+			if self.started:
+				return
+
+			await database.connect()
+
+			# the async pool opens DATABASE_POOL_MIN_SIZE connections when it connects, check one of them works
+			await database.fetch_val(query="SELECT 1")
+
+			# django connections belong to the executor threads that open them and stay open for SYNC_CONN_MAX_AGE
+			count = min(settings.DATABASE_WARM_CONNECTIONS, settings.SYNC_EXECUTOR_WORKERS)
+			if count > 0:
+				barrier = threading.Barrier(count, timeout=DATABASE_CONNECT_TIMEOUT)
+				loop = asyncio.get_running_loop()
+				await asyncio.gather(*[loop.run_in_executor(executor, warm_sync_connection, barrier) for _ in range(count)])
+
+			self.started = True
+
+	# let requests in flight finish, then close the pool
+	async def shutdown(self):
+		try:
+			await asyncio.wait_for(self.idle.wait(), settings.LIFESPAN_DRAIN_TIMEOUT)
+
+		# long lived streams such as server-sent events are cut off
+		except asyncio.TimeoutError:
+			logger.warning(f"{self.in_flight} requests still running after {settings.LIFESPAN_DRAIN_TIMEOUT}s, shutting down")
+
+		await database.disconnect()
+		await asyncio.to_thread(close_sync_connections)
+		self.started = False
 
 
 """
 	this middleware is applied directly in the asgi.py file, so there's no need to include it in settings.py
-"""
\ No newline at end of file
+"""
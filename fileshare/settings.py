@@ -4,6 +4,10 @@ from pathlib import Path
 from .drf_settings import * 
 from .db_settings import *
 from .log_settings import * 
+from .file_settings import * 
+from .task_settings import * 
+from .cache_settings import * 
+from .event_settings import * 
 
 
 
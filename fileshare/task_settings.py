@@ -0,0 +1,16 @@
+""" this file contains background task queue config """
+
+import os 
+from dotenv import load_dotenv
+
+# load env variables
+load_dotenv()
+
+
+# task queue config 
+# jobs are stored in the database and run by `python manage.py run_tasks`
+TASK_WORKERS = int(os.getenv('TASK_WORKERS', 2)) # worker processes started by run_tasks
+TASK_VISIBILITY_TIMEOUT = int(os.getenv('TASK_VISIBILITY_TIMEOUT', 300)) # seconds a claimed job stays hidden from other workers
+TASK_POLL_INTERVAL = float(os.getenv('TASK_POLL_INTERVAL', 1)) # seconds an idle worker waits before looking for jobs again
+TASK_MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS', 5)) # a job that failed this many times is marked as failed
+TASK_RETRY_DELAY = int(os.getenv('TASK_RETRY_DELAY', 10)) # seconds before the first retry, doubled after every failure
@@ -5,6 +5,7 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path('api/auth/', include('authentication.urls')), # include auth app urls
+    path('api/users/', include('users.urls')), # include users app urls
     path('admin/', admin.site.urls),
 ]
 
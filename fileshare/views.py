@@ -0,0 +1,42 @@
+import asyncio
+from rest_framework.views import APIView as BaseAPIView
+
+from .executor import run_sync
+
+
+# DRF api view whose handlers are coroutines
+class APIView(BaseAPIView):
+	"""
+		DRF 3.15 calls handlers without awaiting them, so an `async def get` hands a coroutine to finalize_response.
+		django marks a view whose handlers are all async as a coroutine function and awaits what dispatch returns,
+		so dispatch is a coroutine here and awaits the handler.
+		authentication, permissions and throttles may read the database and have no async API, they run on the sync executor.
+	"""
+
+	async def dispatch(self, request, *args, **kwargs):
+		self.args = args
+		self.kwargs = kwargs
+		request = self.initialize_request(request, *args, **kwargs)
+		self.request = request
+		self.headers = self.default_response_headers
+
+		try:
+			await run_sync(self.initial, request, *args, **kwargs)
+
+			# get the appropriate handler method
+			if request.method.lower() in self.http_method_names:
+				handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+			else:
+				handler = self.http_method_not_allowed
+
+			response = handler(request, *args, **kwargs)
+
+			# options and method not allowed are sync
+			if asyncio.iscoroutine(response):
+				response = await response
+
+		except Exception as exc:
+			response = self.handle_exception(exc)
+
+		self.response = self.finalize_response(request, response, *args, **kwargs)
+		return self.response
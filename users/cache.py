@@ -0,0 +1,84 @@
+import uuid
+import hashlib
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from fileshare.executor import run_sync
+
+# listings, versioned per user whose rows they show
+FILES = 'files'
+INBOX = 'inbox'
+OUTBOX = 'outbox'
+
+# version of the staff listings, which show every user's rows
+STAFF = 'staff'
+
+
+# run a cache call from async code
+async def cache_call(func, *args, **kwargs):
+	"""
+		locmem lookups are dict operations in this process and run straight on the event loop,
+		backends that do file or database I/O run on the sync executor.
+	"""
+	if isinstance(caches['default'], LocMemCache):
+		return func(*args, **kwargs)
+	return await run_sync(func, *args, **kwargs)
+
+
+# key of the current version of a user's listing
+def version_key(box, user_id) -> str:
+	return f"listing:{box}:{user_id}"
+
+
+# current version of the listing a user sees
+async def listing_version(box, user) -> str:
+	"""
+		a new version is made whenever a row the listing shows is added, removed or edited, see invalidate_listings.
+		staff see every user's rows and share one version that any change replaces.
+		versions expire with the cached pages, so with a per-process cache, which doesn't see the invalidations of
+		other workers, a listing and its etag are stale for at most LISTING_CACHE_TIMEOUT.
+	"""
+	owner = STAFF if user.is_staff or user.is_superuser else user.pk
+	return await cache_call(cache.get_or_set, version_key(box, owner), uuid.uuid4().hex, settings.LISTING_CACHE_TIMEOUT)
+
+
+# get a cached listing page
+async def get_cached_listing(box, request) -> tuple:
+	"""
+		returns the (cache key, cached (etag, body) or None) of the listing page asked for by `request`.
+		the key contains the current version of the user's listing, so invalidating the version drops every cached page
+		at once. staff listings show every user's rows and are not cached, both values are None for them.
+	"""
+	user = request.user
+	if user.is_staff or user.is_superuser:
+		return None, None
+
+	version = await listing_version(box, user)
+	key = f"{version_key(box, user.pk)}:{version}:{hashlib.md5(request.get_full_path().encode()).hexdigest()}"
+	return key, await cache_call(cache.get, key)
+
+
+# cache a listing page
+async def set_cached_listing(key, etag, body):
+	if key is not None:
+		await cache_call(cache.set, key, (etag, body), settings.LISTING_CACHE_TIMEOUT)
+
+
+# drop the cached listings of some users, and the staff listing that shows their rows
+def invalidate_listings(box, user_ids):
+	cache.delete_many([version_key(box, user_id) for user_id in {*user_ids, STAFF}])
+
+
+async def ainvalidate_listings(box, user_ids):
+	await cache_call(invalidate_listings, box, user_ids)
+
+
+# drop the cached inbox of the receivers and outbox of the senders of some file operations
+def invalidate_file_operations(operations):
+	invalidate_listings(INBOX, [operation.receiver_id for operation in operations])
+	invalidate_listings(OUTBOX, [operation.sender_id for operation in operations])
+
+
+async def ainvalidate_file_operations(operations):
+	await cache_call(invalidate_file_operations, operations)
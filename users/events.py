@@ -0,0 +1,228 @@
+import json
+import asyncio
+import logging
+import threading
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+
+from fileshare.database import database, DATABASE_URL
+
+# initialize logger
+logger = logging.getLogger('users')
+
+# postgres channel events are sent on by the postgres backend
+CHANNEL = 'fileshare_events'
+
+# namespace of stream ticket signatures, so no other signed value opens a stream
+EVENT_TICKET_SALT = 'users.event_ticket'
+
+# longest wait between attempts to reopen a dropped listener
+MAX_RECONNECT_DELAY = 60
+
+
+# hand a message to a subscriber queue, runs on the queue's event loop
+def deliver(queue, message):
+	# a client that stopped reading loses its oldest messages instead of growing the queue
+	if queue.full():
+		queue.get_nowait()
+	queue.put_nowait(message)
+
+
+# in-process pub/sub
+class Broker:
+	"""
+		keeps the queues of the clients connected to this process by user id.
+		publish can be called from any thread, each queue is fed on the event loop that owns it.
+	"""
+
+	def __init__(self):
+		self.subscribers = {}
+		self.lock = threading.Lock()
+
+	def subscribe(self, user_id) -> asyncio.Queue:
+		queue = asyncio.Queue(maxsize=settings.EVENT_QUEUE_SIZE)
+		with self.lock:
+			self.subscribers.setdefault(user_id, set()).add((asyncio.get_running_loop(), queue))
+		return queue
+
+	def unsubscribe(self, user_id, queue):
+		with self.lock:
+			subscribers = self.subscribers.get(user_id, set())
+			subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+			if not subscribers:
+				self.subscribers.pop(user_id, None)
+
+	def publish(self, user_id, message):
+		with self.lock:
+			subscribers = list(self.subscribers.get(user_id, ()))
+
+		for loop, queue in subscribers:
+			try:
+				loop.call_soon_threadsafe(deliver, queue, message)
+
+			# the loop of a client that is going away is already closed
+			except RuntimeError:
+				continue
+
+
+broker = Broker()
+
+
+# events only reach clients connected to this process
+class LocalBackend:
+
+	async def start(self):
+		pass
+
+	def publish(self, user_id, message):
+		broker.publish(user_id, message)
+
+	async def apublish(self, user_id, message):
+		broker.publish(user_id, message)
+
+	async def apublish_many(self, events):
+		for user_id, message in events:
+			broker.publish(user_id, message)
+
+
+# events reach clients connected to any worker process
+class PostgresBackend:
+	"""
+		publishes with NOTIFY, so an event sent inside a transaction is only delivered once it commits.
+		each process keeps one connection that LISTENs on the channel and hands what it receives to its broker.
+		when that connection drops, for a server restart or a network error, it is reopened right away for the clients
+		still connected, retrying with a growing delay, instead of waiting for the next client to subscribe.
+	"""
+
+	def __init__(self):
+		self.listener = None
+		self.starting = None
+
+	async def start(self):
+		if self.listener is not None and not self.listener.is_closed():
+			return
+
+		# concurrent first subscribers share a single listening connection
+		if self.starting is None:
+			self.starting = asyncio.ensure_future(self.listen())
+
+		try:
+			await asyncio.shield(self.starting)
+		finally:
+			self.starting = None
+
+	async def listen(self):
+		import asyncpg
+
+		listener = await asyncpg.connect(DATABASE_URL)
+		await listener.add_listener(CHANNEL, self.notified)
+		listener.add_termination_listener(self.terminated)
+		self.listener = listener
+
+	# called by asyncpg on the event loop once the listening connection is closed
+	async def terminated(self, listener):
+		delay = settings.EVENT_RECONNECT_DELAY
+
+		# a listener that was already replaced, or nobody left to receive events, the next subscriber starts one
+		while listener is self.listener and broker.subscribers:
+			try:
+				await self.start()
+				logger.info("Event listener reconnected")
+				return
+
+			except Exception as e:
+				logger.error(f"Unable to reconnect the event listener, retrying in {delay}s: {e}", exc_info=True)
+				await asyncio.sleep(delay)
+				delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+	def notified(self, listener, pid, channel, payload):
+		data = json.loads(payload)
+		broker.publish(data['user'], data['message'])
+
+	def payload(self, user_id, message) -> str:
+		return json.dumps({'user': user_id, 'message': message})
+
+	def publish(self, user_id, message):
+		with connection.cursor() as cursor:
+			cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, self.payload(user_id, message)])
+
+	async def apublish(self, user_id, message):
+		await database.execute(
+			query="SELECT pg_notify(:channel, :payload)",
+			values={'channel': CHANNEL, 'payload': self.payload(user_id, message)}
+		)
+
+	# one NOTIFY per event, sent in a single round trip. execute only reads the first row of a result,
+	# so the notifies are counted into one row to make postgres run all of them
+	async def apublish_many(self, events):
+		await database.execute(
+			query="SELECT count(pg_notify(:channel, payload)) FROM unnest(CAST(:payloads AS text[])) AS payload",
+			values={'channel': CHANNEL, 'payloads': [self.payload(user_id, message) for user_id, message in events]}
+		)
+
+
+BACKENDS = {
+	'local': LocalBackend,
+	'postgres': PostgresBackend,
+}
+backend = BACKENDS[settings.EVENT_BACKEND]()
+
+
+# build the event sent to the receiver of a file operation
+def file_shared_event(operation) -> dict:
+	return {
+		'id': operation.pk,
+		'event': 'file_shared',
+		'data': {
+			'id': operation.pk,
+			'file': operation.file_id,
+			'sender': operation.sender_id,
+			'date': operation.date.isoformat(),
+		},
+	}
+
+
+# publish an event to a user's connected clients from sync code, inside an atomic block call it from on_commit
+def publish(user_id, message):
+	backend.publish(user_id, message)
+
+
+# publish an event to a user's connected clients from async code
+async def apublish(user_id, message):
+	await backend.apublish(user_id, message)
+
+
+# publish a list of (user id, event) pairs from async code
+async def apublish_many(events):
+	if events:
+		await backend.apublish_many(events)
+
+
+# start receiving the events of a user, the queue must be passed to unsubscribe when the client goes away
+async def subscribe(user_id) -> asyncio.Queue:
+	await backend.start()
+	return broker.subscribe(user_id)
+
+
+def unsubscribe(user_id, queue):
+	broker.unsubscribe(user_id, queue)
+
+
+# sign a ticket that opens the event stream of a user
+def sign_event_ticket(user_id) -> str:
+	return signing.dumps(user_id, salt=EVENT_TICKET_SALT)
+
+
+# user id of a stream ticket, None when it was tampered with or is older than EVENT_TICKET_LIFETIME
+def unsign_event_ticket(ticket):
+	try:
+		return signing.loads(ticket, salt=EVENT_TICKET_SALT, max_age=settings.EVENT_TICKET_LIFETIME)
+
+	except signing.BadSignature:
+		return None
+
+
+# format an event for a text/event-stream response
+def format_event(message) -> str:
+	return f"id: {message['id']}\nevent: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
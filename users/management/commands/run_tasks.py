@@ -0,0 +1,81 @@
+import signal
+import multiprocessing
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, close_old_connections
+
+from users.tasks import claim_job, run_job
+
+
+# worker loop, runs jobs until stopped
+def work(stop, visibility_timeout, poll_interval, once):
+	"""
+		claims and runs one job at a time. with `once` the worker returns as soon as no job is due,
+		otherwise it waits `poll_interval` seconds and looks again until `stop` is set.
+	"""
+	while not stop.is_set():
+		close_old_connections()
+		job = claim_job(visibility_timeout)
+
+		if job is None:
+			if once:
+				break
+			stop.wait(poll_interval)
+			continue
+
+		run_job(job)
+
+	connections.close_all()
+
+
+# entry point of a forked worker process
+def worker_process(*args):
+	# the parent handles ctrl-c and SIGTERM sent to the whole process group, and sets `stop` so the workers
+	# finish their running job instead of being interrupted half way
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	signal.signal(signal.SIGTERM, signal.SIG_IGN)
+	work(*args)
+
+
+class Command(BaseCommand):
+	help = "Run queued background tasks in one or more worker processes."
+
+	def add_arguments(self, parser):
+		parser.add_argument('--workers', type=int, default=settings.TASK_WORKERS, help="number of worker processes")
+		parser.add_argument('--visibility-timeout', type=int, default=settings.TASK_VISIBILITY_TIMEOUT, help="seconds a claimed job is hidden from other workers")
+		parser.add_argument('--poll-interval', type=float, default=settings.TASK_POLL_INTERVAL, help="seconds to wait when there is nothing to do")
+		parser.add_argument('--once', action='store_true', help="exit once no job is due instead of waiting for new ones")
+
+	def handle(self, *args, **options):
+		context = multiprocessing.get_context('fork')
+		stop = context.Event()
+		worker_args = (stop, options['visibility_timeout'], options['poll_interval'], options['once'])
+
+		# a single worker runs in this process and stops after its current job
+		if options['workers'] <= 1:
+			signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+			signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+			work(*worker_args)
+			return
+
+		# forked workers must not share the parent's database connections
+		connections.close_all()
+		workers = [context.Process(target=worker_process, args=worker_args, daemon=True) for _ in range(options['workers'])]
+
+		for worker in workers:
+			worker.start()
+
+		signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+		self.stdout.write(f"Started {len(workers)} task workers.")
+
+		try:
+			for worker in workers:
+				worker.join()
+
+		# finish the running jobs before exiting
+		except KeyboardInterrupt:
+			stop.set()
+			for worker in workers:
+				worker.join()
+
+		self.stdout.write("Task workers stopped.")
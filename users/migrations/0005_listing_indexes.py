@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 07:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_blob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['date_uploaded', 'id'], name='file_date_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fileoperation',
+            index=models.Index(fields=['date', 'id'], name='fileoperation_date_idx'),
+        ),
+    ]
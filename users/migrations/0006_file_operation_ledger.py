@@ -0,0 +1,44 @@
+# Generated by Django 5.0.6 on 2026-10-18 07:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_listing_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='recipients',
+            field=models.ManyToManyField(related_name='shared_files', through='users.FileOperation', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='fileoperation',
+            name='file',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_operations', to='users.file'),
+        ),
+        migrations.AlterField(
+            model_name='fileoperation',
+            name='receiver',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='received_file_operations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='fileoperation',
+            name='sender',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sent_file_operations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='fileoperation',
+            index=models.Index(fields=['receiver', 'date', 'id'], name='fileoperation_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fileoperation',
+            index=models.Index(fields=['sender', 'date', 'id'], name='fileoperation_outbox_idx'),
+        ),
+    ]
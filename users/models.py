@@ -1,4 +1,8 @@
+import os 
+import uuid 
+from django.conf import settings 
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model 
 
 User = get_user_model()
@@ -12,7 +16,22 @@ class Profile(models.Model):
 	date_created = models.DateTimeField(auto_now_add=True)
 
 	def __str__(self):
-		return self.User
+		return str(self.user)
+
+	class Meta:
+		ordering = ['-date_created']
+
+
+# blob model, a single stored copy of file content shared by every File with the same digest 
+class Blob(models.Model):
+	digest = models.CharField(max_length=64, unique=True) # sha256 hex digest of the content
+	file = models.FileField(upload_to='blobs/')
+	size = models.BigIntegerField()
+	references = models.PositiveIntegerField(default=0) # number of File rows using this blob
+	date_created = models.DateTimeField(auto_now_add=True)
+
+	def __str__(self):
+		return self.digest
 
 	class Meta:
 		ordering = ['-date_created']
@@ -21,29 +40,94 @@ class Profile(models.Model):
 # file model 
 class File(models.Model):
 	file = models.FileField(upload_to='documents/', null=False, blank=False)
-	user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='user_file')
+	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='files', db_index=False) # user lookups use the library index below
+	blob = models.ForeignKey(Blob, on_delete=models.PROTECT, related_name='files', null=True, blank=True) # set when content-addressed storage is enabled
+	filename = models.CharField(max_length=255, blank=True) # original name of the upload, blobs are stored under their digest
+	recipients = models.ManyToManyField(User, through='FileOperation', through_fields=('file', 'receiver'), related_name='shared_files')
 	date_uploaded = models.DateTimeField(auto_now_add=True)
 
 	def __str__(self):
-		return self.file
+		return self.file.name
+
+	# name the file is downloaded as 
+	@property
+	def download_name(self):
+		return self.filename or os.path.basename(self.file.name)
 
 	class Meta:
 		ordering = ['-date_uploaded']
+		indexes = [
+			models.Index(fields=['date_uploaded', 'id'], name='file_date_uploaded_idx'), # keyset pagination of file listings
+			models.Index(fields=['user', 'date_uploaded', 'id'], name='file_library_idx'), # keyset pagination of a user's library
+		]
 
 
-# file operation model
+# file operation model, a ledger of shares: a file can be sent many times and a user can send and receive many files
 class FileOperation(models.Model):
-	file = models.OneToOneField(File, on_delete=models.CASCADE, related_name='file_operation')
-	sender = models.OneToOneField(User, on_delete=models.CASCADE, related_name='file_sender')
-	receiver = models.OneToOneField(User, on_delete=models.CASCADE, related_name='file_reciever')
+	file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='file_operations')
+	# sender and receiver lookups are served by the composite indexes below, so no single column index is needed
+	sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_file_operations', db_index=False)
+	receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_file_operations', db_index=False)
 	date = models.DateTimeField(auto_now_add=True)
 
 	def __str__(self):
-		return self.file
+		return str(self.file)
 
 	class Meta:
 		ordering = ['-date']
+		indexes = [
+			models.Index(fields=['date', 'id'], name='fileoperation_date_idx'), # keyset pagination of file operation listings
+			models.Index(fields=['receiver', 'date', 'id'], name='fileoperation_inbox_idx'), # keyset pagination of a user's received files
+			models.Index(fields=['sender', 'date', 'id'], name='fileoperation_outbox_idx'), # keyset pagination of a user's sent files
+		]
+
+
+# upload session model, tracks a resumable chunked upload until it is finalized into a File 
+class UploadSession(models.Model):
+	id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+	filename = models.CharField(max_length=255)
+	size = models.BigIntegerField() # total size of the file in bytes
+	offset = models.BigIntegerField(default=0) # number of bytes received so far
+	date_created = models.DateTimeField(auto_now_add=True)
 
+	def __str__(self):
+		return self.filename
+
+	# storage name of the partial file the chunks are appended to 
+	@property
+	def partial_name(self):
+		return os.path.join(settings.UPLOAD_PARTIAL_DIR, f"{self.id}.part")
+
+	@property
+	def is_complete(self):
+		return self.offset >= self.size
+
+	class Meta:
+		ordering = ['-date_created']
 
 
+# job model, a unit of background work picked up by the `run_tasks` worker 
+class Job(models.Model):
+	PENDING = 'pending'
+	FAILED = 'failed'
+	STATUS_CHOICES = [(PENDING, 'Pending'), (FAILED, 'Failed')]
+
+	name = models.CharField(max_length=100) # name of the registered task to run
+	payload = models.TextField(default='{}') # json encoded keyword arguments of the task
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+	attempts = models.PositiveIntegerField(default=0)
+	max_attempts = models.PositiveIntegerField(default=5)
+	run_at = models.DateTimeField(default=timezone.now) # the job isn't picked up before this time
+	locked_until = models.DateTimeField(null=True, blank=True) # set while a worker runs the job, the job is retried once it passes
+	last_error = models.TextField(blank=True)
+	date_created = models.DateTimeField(auto_now_add=True)
 
+	def __str__(self):
+		return self.name
+
+	class Meta:
+		ordering = ['run_at', 'id']
+		indexes = [
+			models.Index(fields=['status', 'run_at', 'id'], name='job_queue_idx'), # workers look for due pending jobs
+		]
@@ -0,0 +1,32 @@
+from django.conf import settings 
+from rest_framework.pagination import CursorPagination
+
+from fileshare.executor import run_sync 
+
+
+# keyset pagination, each page is a range scan on the ordering index that starts after the cursor of the previous page 
+class KeysetPagination(CursorPagination):
+	page_size = settings.PAGE_SIZE
+	page_size_query_param = 'page_size'
+	max_page_size = 200
+
+	# paginate the queryset on the sync executor, only the page itself is fetched from the database 
+	async def apaginate_queryset(self, queryset, request, view=None):
+		return await run_sync(self.paginate_queryset, queryset, request, view)
+
+	# links to the neighbouring pages, added to the response next to the page data 
+	def get_page_links(self):
+		return {
+			"next": self.get_next_link(),
+			"previous": self.get_previous_link()
+		}
+
+
+# file pagination, matches the (date_uploaded, id) index on File
+class FilePagination(KeysetPagination):
+	ordering = ('-date_uploaded', '-id')
+
+
+# file operation pagination, matches the (date, id) index on FileOperation
+class FileOperationPagination(KeysetPagination):
+	ordering = ('-date', '-id')
@@ -0,0 +1,50 @@
+import os
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+# storage name of the preview of a file at the given size
+def preview_name(name, size) -> str:
+	# the whole stored name is kept, extension included, since storage names are unique and previews are only ever reused
+	# by the Files of one blob. 'report.png' and 'report.jpg' in the same directory get previews of their own
+	directory, filename = os.path.split(name)
+	return os.path.join(directory, 'previews', f"{filename}_{size}.jpg")
+
+
+# generate the previews of a stored file
+def generate_previews(name):
+	"""
+		writes a jpeg thumbnail for each of PREVIEW_SIZES next to the stored file `name` and returns their storage names.
+		for multi-page images (gif, tiff) the first page is used. files pillow can't open get no previews,
+		and previews that already exist (e.g. for deduplicated content) are not generated again.
+	"""
+	missing = [size for size in settings.PREVIEW_SIZES if not default_storage.exists(preview_name(name, size))]
+	if not missing:
+		return []
+
+	try:
+		with Image.open(default_storage.path(name)) as image:
+			image.seek(0)
+			image = ImageOps.exif_transpose(image).convert('RGB')
+
+			created = []
+			# largest first, so each smaller preview is scaled down from the previous one instead of the original 
+			for size in sorted(missing, reverse=True):
+				image.thumbnail((size, size))
+				path = default_storage.path(preview_name(name, size))
+				os.makedirs(os.path.dirname(path), exist_ok=True)
+				image.save(path, 'JPEG', quality=settings.PREVIEW_QUALITY, optimize=True)
+				created.append(preview_name(name, size))
+
+			return created
+
+	# not an image, there is nothing to preview
+	except (UnidentifiedImageError, Image.DecompressionBombError):
+		return []
+
+
+# remove the previews of a stored file 
+def delete_previews(name):
+	for size in settings.PREVIEW_SIZES:
+		default_storage.delete(preview_name(name, size))
@@ -1,6 +1,11 @@
+import os 
+import re 
+from django.conf import settings 
 from django.contrib.auth import get_user_model
+from django.db.models import Q 
+from django.db.models.functions import Lower
 from rest_framework import serializers 
-from.models import Profile, File, FileOperation 
+from.models import Profile, File, FileOperation, UploadSession 
 
 
 User = get_user_model()
@@ -25,7 +30,7 @@ class UserSerializer(serializers.ModelSerializer):
 		if len(value) < 4 or len(value) > 20:
 			errors["username_length"] = "Username must be between 4 to 20 characters"
 
-		check_username = User.objects.filter(username__iexact=value)
+		check_username = User.objects.filter_username(value)
 
 		if value != user.username and check_username.exists():
 			errors["username_exists"] = f"Username {value} is not available"
@@ -54,7 +59,7 @@ class UserSerializer(serializers.ModelSerializer):
 		if len(value) < 6 or len(value) > 40:
 			errors["email_length"] = "Email must be between 6 to 40 characters"
 
-		check_email = User.objects.filter(email__iexact=value)
+		check_email = User.objects.filter_email(value)
 
 		if value != user.email and check_email.exists():
 			errors["email_exists"] = f"Email {value} is not available"
@@ -68,8 +73,9 @@ class UserSerializer(serializers.ModelSerializer):
 	# save data 
 	def save(self):
 		user = self.context['request'].user 
-		user.username = self.validated_data["username"]
-		user.email = self.validated_data["email"]
+		# a partial update leaves the fields it doesn't send as they are 
+		user.username = self.validated_data.get("username", user.username)
+		user.email = self.validated_data.get("email", user.email)
 		user.save()
 		
 		return user 
@@ -88,10 +94,50 @@ class ProfileSerializer(serializers.ModelSerializer):
 class FileSerializer(serializers.ModelSerializer):
 	user = serializers.CharField(required=False) # this returns string value of user object
 	file = serializers.FileField(required=True)
+	sha256 = serializers.CharField(source='blob.digest', read_only=True, default=None) # only set for content-addressed files
 
 	class Meta:
 		model = File 
-		fields = ['id', 'file', 'user', 'date_uploaded']
+		fields = ['id', 'file', 'filename', 'sha256', 'user', 'date_uploaded']
+		read_only_fields = ['filename']
+
+
+# file link serializer 
+class FileLinkSerializer(serializers.Serializer):
+	expires_in = serializers.IntegerField(min_value=1, max_value=settings.FILE_LINK_MAX_LIFETIME, default=settings.FILE_LINK_LIFETIME)
+
+
+# file probe serializer, describes content the client wants to upload by its digest 
+class FileProbeSerializer(serializers.Serializer):
+	filename = serializers.CharField(max_length=255, required=True)
+	size = serializers.IntegerField(min_value=0, required=True)
+	sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=True)
+	challenge = serializers.CharField(required=False) # challenge returned by the first probe 
+	proof = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False) # answer to the challenge 
+
+	# validate filename 
+	def validate_filename(self, value):
+		filename = os.path.basename(value.strip())
+
+		if not filename:
+			raise serializers.ValidationError("Filename cannot be empty")
+
+		return filename
+
+	# digests are stored in lower case 
+	def validate_sha256(self, value):
+		return value.lower()
+
+	# compared with a lower case hex digest 
+	def validate_proof(self, value):
+		return value.lower()
+
+	# a challenge is only sent back with its answer 
+	def validate(self, data):
+		if ('challenge' in data) != ('proof' in data):
+			raise serializers.ValidationError({"proof": "Challenge and proof must be sent together"})
+
+		return data
 
 
 # file operation serializer
@@ -101,50 +147,135 @@ class FileOperationSerializer(serializers.ModelSerializer):
 	receiver = serializers.CharField(required=False) # this returns string value of user object
 
 	class Meta:
-		model = File
+		model = FileOperation
 		fields = ['id', 'file', 'sender', 'receiver', 'date']
 
 
-	# validate data 
+	# validate data, the receiver and file are looked up once and kept in the validated data for create()
 	def validate(self, data):
 		errors = {}
+		user = self.context['request'].user 
 		# this gets the file 'id' which is sent with the data  
-		file = self.data.get('file')
-		receiver = self.data.get('receiver')
+		file = data.get('file')
+		receiver = data.get('receiver')
+
+		files = File.objects.filter(id=file) if file and file.isdigit() else File.objects.none()
+		# only staff can share files they don't own 
+		if not (user.is_staff or user.is_superuser):
+			files = files.filter(user_id=user.pk)
 
-		check_receiver = User.objects.get(Q(username__iexact=receiver) | Q(email__iexact=receiver))
-		check_file = File.objects.get(id=file)
+		check_receiver = User.objects.filter_login_id(receiver).first() if receiver else None
+		check_file = files.first()
 
-		if not check_receiver.exists():
+		if check_receiver is None:
 			errors["receiver_id"] = f"The receiver id {receiver} does not match any account."
 
-		if not check_file.exists():
-			errors["file_id"] = "The file you request does not exist". 
+		if check_file is None:
+			errors["file_id"] = "The file you request does not exist."
 
 		if errors:
 			raise serializers.ValidationError(errors)
 
+		data['receiver_object'] = check_receiver
+		data['file_object'] = check_file
 		return data 
 
 
 	# create file operation object 
 	def create(self, validated_data):
 		user = self.context['request'].user 
-		file = self.validated_data['file']
-		receiver = self.validated_data['receiver']
 
-		check_receiver = User.objects.get(Q(username__iexact=receiver) | Q(email__iexact=receiver))
-		check_file = File.objects.get(id=file)
+		return FileOperation.objects.create(
+			file = validated_data['file_object'],
+			sender_id = user.pk,
+			receiver = validated_data['receiver_object']
+		)
+
+
+# bulk file operation serializer, shares several files with several receivers at once 
+class BulkFileOperationSerializer(serializers.Serializer):
+	files = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=settings.BULK_SHARE_MAX_FILES)
+	receivers = serializers.ListField(child=serializers.CharField(max_length=40), allow_empty=False, max_length=settings.BULK_SHARE_MAX_RECEIVERS) # usernames or emails
+
 
-		file_operation = FileOperation.objects.create(
-			file = check_file,
-			sender = user,
-			receiver = check_receiver 
+	# validate data, all receivers and all files are each resolved with a single query 
+	def validate(self, data):
+		errors = {}
+		user = self.context['request'].user 
+		login_ids = {receiver.strip().lower() for receiver in data['receivers']}
+		file_ids = set(data['files'])
+
+		receivers = list(
+			User.objects.annotate(username_lower=Lower('username'), email_lower=Lower('email'))
+			.filter(Q(username_lower__in=login_ids) | Q(email_lower__in=login_ids))
 		)
-		file_operation.save()
+		found = {receiver.username_lower for receiver in receivers} | {receiver.email_lower for receiver in receivers}
+		missing = sorted(login_ids - found)
+
+		if missing:
+			errors["receivers"] = f"The receiver ids {', '.join(missing)} do not match any account."
 
-		return file_operation
+		files = File.objects.filter(id__in=file_ids)
+		# only staff can share files they don't own 
+		if not (user.is_staff or user.is_superuser):
+			files = files.filter(user_id=user.pk)
 
+		files = list(files)
+		missing = sorted(file_ids - {file.id for file in files})
 
+		if missing:
+			errors["files"] = f"The files {', '.join(map(str, missing))} do not exist."
 
+		if errors:
+			raise serializers.ValidationError(errors)
+
+		data['receiver_objects'] = receivers
+		data['file_objects'] = files
+		return data 
+
+
+	# create one file operation per file and receiver with a single bulk insert 
+	def create(self, validated_data):
+		user = self.context['request'].user 
+
+		return FileOperation.objects.bulk_create([
+			FileOperation(file=file, sender_id=user.pk, receiver=receiver)
+			for file in validated_data['file_objects']
+			for receiver in validated_data['receiver_objects']
+		], batch_size=1000)
 
+
+# upload session serializer 
+class UploadSessionSerializer(serializers.ModelSerializer):
+	chunk_size = serializers.SerializerMethodField()
+
+	class Meta:
+		model = UploadSession
+		fields = ['id', 'filename', 'size', 'offset', 'chunk_size', 'date_created']
+		read_only_fields = ['id', 'offset', 'chunk_size', 'date_created']
+
+
+	def get_chunk_size(self, obj):
+		return settings.UPLOAD_CHUNK_SIZE
+
+
+	# validate filename 
+	def validate_filename(self, value):
+		# strip any directory part so the upload can't escape the documents directory
+		filename = os.path.basename(value.strip())
+
+		if not filename:
+			raise serializers.ValidationError("Filename cannot be empty")
+
+		return filename
+
+
+	# validate size 
+	def validate_size(self, value):
+		if value <= 0:
+			raise serializers.ValidationError("File size must be greater than 0")
+
+		if value > settings.UPLOAD_MAX_SIZE:
+			raise serializers.ValidationError(f"File size cannot be more than {settings.UPLOAD_MAX_SIZE} bytes")
+
+		return value
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import FILES, INBOX, OUTBOX, invalidate_listings, invalidate_file_operations
+from .events import publish, file_shared_event
+from .models import File, FileOperation
+from .previews import delete_previews
+
+# rows inserted with bulk_create don't send these signals, the views that write them invalidate the cached listings
+# and publish the events themselves. listings are invalidated once the write commits, a listing read in between would
+# otherwise cache the page from before the write under the new version
+
+
+# a share was added, changed or removed, including removals cascading from a deleted file or user 
+@receiver(post_save, sender=FileOperation)
+@receiver(post_delete, sender=FileOperation)
+def file_operation_changed(sender, instance, **kwargs):
+	transaction.on_commit(lambda: invalidate_file_operations([instance]))
+
+
+# a file was added, renamed or removed, its owner's library shows it 
+@receiver(post_save, sender=File)
+@receiver(post_delete, sender=File)
+def file_listed(sender, instance, **kwargs):
+	transaction.on_commit(lambda: invalidate_listings(FILES, [instance.user_id]))
+
+
+# a shared file changed, the listings show its name 
+@receiver(post_save, sender=File)
+def file_changed(sender, instance, created, **kwargs):
+	if not created:
+		transaction.on_commit(lambda: invalidate_file_operations(FileOperation.objects.filter(file=instance).only('sender_id', 'receiver_id')))
+
+
+# a renamed user is shown as the owner in their library and as sender or receiver in shares 
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+	# saves of other fields, such as last_login on sign in, leave the listings as they are 
+	if not created and (update_fields is None or 'username' in update_fields):
+		transaction.on_commit(lambda: user_renamed(instance.pk))
+
+
+# drop the listings that show a user's name, the shares are read as distinct (sender, receiver) pairs 
+def user_renamed(user_id):
+	pairs = list(
+		FileOperation.objects.filter(Q(sender_id=user_id) | Q(receiver_id=user_id)).order_by().values_list('sender_id', 'receiver_id').distinct()
+	)
+	invalidate_listings(FILES, [user_id])
+	invalidate_listings(INBOX, [receiver_id for _, receiver_id in pairs])
+	invalidate_listings(OUTBOX, [sender_id for sender_id, _ in pairs])
+
+
+# a file with content of its own takes its previews with it, the previews of a blob go with its last reference 
+@receiver(post_delete, sender=File)
+def file_deleted(sender, instance, **kwargs):
+	if instance.blob_id is None:
+		transaction.on_commit(lambda: delete_previews(instance.file.name))
+
+
+# tell the receiver's connected clients about a new share once it is committed 
+@receiver(post_save, sender=FileOperation)
+def file_operation_created(sender, instance, created, **kwargs):
+	if created:
+		transaction.on_commit(lambda: publish(instance.receiver_id, file_shared_event(instance)))
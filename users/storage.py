@@ -0,0 +1,248 @@
+import os
+import uuid
+import shutil
+import hmac
+import hashlib
+import secrets
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db import transaction, IntegrityError
+from django.db.models import F
+
+from .models import Blob, File, UploadSession
+from .previews import delete_previews
+from .tasks import enqueue
+
+# namespace of probe challenge signatures, so no other signed value can be used as a challenge 
+PROBE_SALT = 'users.probe'
+
+
+# storage name of the blob holding the content with the given digest
+def blob_name(digest) -> str:
+	# fan out into sub directories so no single directory ends up with millions of entries
+	return os.path.join(settings.BLOB_DIR, digest[:2], digest[2:4], digest)
+
+
+# hash a file on disk
+def hash_file(path, block_size=None):
+	"""
+		returns the (sha256 hex digest, size) of the file at `path`, read in fixed-size blocks.
+	"""
+	block_size = block_size or settings.FILE_BLOCK_SIZE
+	sha256 = hashlib.sha256()
+	size = 0
+
+	with open(path, 'rb') as source:
+		for block in iter(lambda: source.read(block_size), b''):
+			sha256.update(block)
+			size += len(block)
+
+	return sha256.hexdigest(), size
+
+
+# store a file on disk as a blob
+def store_blob(path, digest, size) -> Blob:
+	"""
+		moves the file at `path` into the blob store, or removes it when a blob with the same digest
+		already exists, and adds one reference to the blob. the caller must point a File at the returned blob.
+	"""
+	while True:
+		try:
+			with transaction.atomic():
+				blob = Blob.objects.select_for_update().filter(digest=digest).first()
+
+				if blob is None:
+					name = blob_name(digest)
+					os.makedirs(os.path.dirname(default_storage.path(name)), exist_ok=True)
+					os.replace(path, default_storage.path(name))
+					return Blob.objects.create(digest=digest, file=name, size=size, references=1)
+
+				Blob.objects.filter(pk=blob.pk).update(references=F('references') + 1)
+
+			# inside a caller's transaction the file is only removed once it commits, so a rollback can still restore it.
+			# the path is already gone when a retry follows a race in which this request moved it into place
+			transaction.on_commit(lambda: os.path.exists(path) and os.remove(path))
+			return blob
+
+		# another request stored the same content at the same time, use its blob
+		except IntegrityError:
+			continue
+
+
+# reference an existing blob by its digest
+def reference_blob(digest, size):
+	"""
+		adds one reference to the blob with the given digest and size and returns it,
+		or returns None when the server doesn't hold that content yet.
+	"""
+	with transaction.atomic():
+		blob = Blob.objects.select_for_update().filter(digest=digest, size=size).first()
+
+		if blob is not None:
+			Blob.objects.filter(pk=blob.pk).update(references=F('references') + 1)
+
+	return blob
+
+
+# challenge a client to prove it holds the content it probes for
+def probe_challenge(user_id, digest, size) -> dict:
+	"""
+		the client answers with the sha256 of `nonce` followed by the `length` bytes of its file at `offset`.
+		a challenge is made whether or not the server holds the content, so probing doesn't tell which digests exist.
+		it is signed rather than stored, and only good for the user, digest and size it was made for.
+	"""
+	length = min(settings.PROBE_CHALLENGE_SIZE, size)
+	offset = secrets.randbelow(size - length + 1)
+	nonce = secrets.token_hex(16)
+	challenge = signing.dumps({'u': user_id, 'd': digest, 's': size, 'o': offset, 'l': length, 'n': nonce}, salt=PROBE_SALT)
+	return {'challenge': challenge, 'nonce': nonce, 'offset': offset, 'length': length}
+
+
+# sha256 of a nonce followed by a range of a file, the answer to a probe challenge
+def hash_range(path, nonce, offset, length) -> str:
+	sha256 = hashlib.sha256(nonce.encode())
+
+	with open(path, 'rb') as source:
+		source.seek(offset)
+		sha256.update(source.read(length))
+
+	return sha256.hexdigest()
+
+
+# reference a blob for a client that answered a probe challenge
+def claim_blob(user_id, digest, size, challenge, proof):
+	"""
+		checks the proof against the blob's content and references the blob like reference_blob,
+		returns None when the challenge is invalid, expired or for other content, the proof is wrong or there is no such blob.
+		knowing a digest isn't enough to get a File for someone else's content, the bytes are needed too.
+	"""
+	try:
+		data = signing.loads(challenge, salt=PROBE_SALT, max_age=settings.PROBE_CHALLENGE_LIFETIME)
+	except signing.BadSignature:
+		return None
+
+	if (data['u'], data['d'], data['s']) != (user_id, digest, size):
+		return None
+
+	blob = Blob.objects.filter(digest=digest, size=size).first()
+
+	if blob is None or not hmac.compare_digest(hash_range(default_storage.path(blob.file.name), data['n'], data['o'], data['l']), proof):
+		return None
+
+	return reference_blob(digest, size)
+
+
+# store an uploaded file as a blob
+def save_upload(uploaded_file) -> Blob:
+	"""
+		copies an uploaded file into the blob store, hashing it while it is written so the content is only read once.
+	"""
+	path = default_storage.path(os.path.join(settings.UPLOAD_PARTIAL_DIR, f"{uuid.uuid4()}.blob"))
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	sha256 = hashlib.sha256()
+	size = 0
+
+	try:
+		with open(path, 'wb') as destination:
+			for chunk in uploaded_file.chunks(settings.FILE_BLOCK_SIZE):
+				sha256.update(chunk)
+				destination.write(chunk)
+				size += len(chunk)
+
+		return store_blob(path, sha256.hexdigest(), size)
+
+	except Exception:
+		if os.path.exists(path):
+			os.remove(path)
+		raise
+
+
+# claim a free storage name by creating it empty, so a concurrent writer can't be given the same name
+def reserve_name(name) -> str:
+	while True:
+		name = default_storage.get_available_name(name)
+		path = default_storage.path(name)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+
+		try:
+			os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+			return name
+
+		# taken between the availability check and the create, pick again
+		except FileExistsError:
+			continue
+
+
+# turn a complete upload session into a File of its user
+def complete_upload(upload_id, user):
+	"""
+		the session row is locked and deleted first, so a second finalize of the same upload waits for this one and then finds nothing.
+		the partial file is moved once the rows are written and put back when the transaction fails,
+		so a failed finalize leaves the session and its partial file as they were and can be retried.
+		without deduplication it is moved over a name reserved on disk beforehand, so two uploads of the same filename,
+		finalized at the same time, never get the same name.
+		returns the File, or None when there is no complete session to finalize.
+	"""
+	blob = None
+	moved_to = None
+	reserved = None
+
+	try:
+		with transaction.atomic():
+			upload = UploadSession.objects.select_for_update().filter(pk=upload_id, user=user).first()
+
+			if upload is None or not upload.is_complete:
+				return None
+
+			path = default_storage.path(upload.partial_name)
+			upload.delete()
+
+			if settings.FILE_DEDUPLICATION:
+				# a new blob takes the partial file, a blob that exists already gets a reference that is rolled back with the rest
+				blob = store_blob(path, *hash_file(path))
+				moved_to = default_storage.path(blob.file.name)
+				file = File.objects.create(file=blob.file.name, blob=blob, filename=upload.filename, user=user)
+				enqueue('generate_file_previews', name=file.file.name)
+
+			else:
+				name = reserve_name(os.path.join('documents', upload.filename))
+				reserved = default_storage.path(name)
+				file = File.objects.create(file=name, filename=upload.filename, user=user)
+				enqueue('generate_file_previews', name=file.file.name)
+				os.replace(path, reserved)
+				moved_to = reserved
+
+			return file
+
+	except Exception:
+		if moved_to is not None and os.path.exists(moved_to) and not os.path.exists(path):
+			# a concurrent upload of the same content may have committed the blob meanwhile, its file stays where it is
+			if blob is not None and Blob.objects.filter(digest=blob.digest).exists():
+				shutil.copyfile(moved_to, path)
+			else:
+				os.replace(moved_to, path)
+
+		# the partial file wasn't moved yet, the empty reserved name is given back
+		elif reserved is not None and os.path.exists(reserved):
+			os.remove(reserved)
+		raise
+
+
+# drop one reference to a blob
+def release_blob(blob_id):
+	"""
+		removes one reference from the blob, and deletes the blob and its content once the last File using it is gone.
+	"""
+	with transaction.atomic():
+		blob = Blob.objects.select_for_update().get(pk=blob_id)
+
+		if blob.references > 1:
+			Blob.objects.filter(pk=blob.pk).update(references=F('references') - 1)
+			return
+
+		# the content is removed while the row is still locked, so a concurrent upload of the same
+		# content waits and then stores a fresh copy instead of losing it to this delete
+		blob.delete()
+		default_storage.delete(blob.file.name)
+		delete_previews(blob.file.name)
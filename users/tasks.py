@@ -0,0 +1,96 @@
+import json
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+from .previews import generate_previews
+
+# initialize logger
+logger = logging.getLogger('users')
+
+# registered tasks by name
+registry = {}
+
+
+# register a function as a task, it is called with the keyword arguments given to enqueue
+def task(func):
+	registry[func.__name__] = func
+	return func
+
+
+# build an unsaved job for a registered task
+def build_job(name, /, **kwargs) -> Job:
+	if name not in registry:
+		raise KeyError(f"Unknown task {name}")
+	return Job(name=name, payload=json.dumps(kwargs), max_attempts=settings.TASK_MAX_ATTEMPTS)
+
+
+# queue a task on the ORM connection
+def enqueue(name, /, **kwargs) -> Job:
+	job = build_job(name, **kwargs)
+	job.save()
+	return job
+
+
+# claim the next due job
+def claim_job(visibility_timeout=None):
+	"""
+		returns the next due job after hiding it from other workers for `visibility_timeout` seconds,
+		or None when there is nothing to do. a job whose worker died becomes visible again once its lock expires.
+		the claim is a conditional update, so two workers can never claim the same job.
+	"""
+	visibility_timeout = visibility_timeout or settings.TASK_VISIBILITY_TIMEOUT
+	now = timezone.now()
+	unlocked = Q(locked_until__isnull=True) | Q(locked_until__lte=now)
+
+	# jobs that used up their attempts while their worker died are given up on
+	Job.objects.filter(unlocked, status=Job.PENDING, attempts__gte=F('max_attempts')).update(status=Job.FAILED)
+
+	candidates = Job.objects.filter(unlocked, status=Job.PENDING, run_at__lte=now).values_list('pk', flat=True)[:10]
+
+	for pk in candidates:
+		claimed = Job.objects.filter(unlocked, pk=pk, status=Job.PENDING).update(
+			locked_until=now + timedelta(seconds=visibility_timeout), attempts=F('attempts') + 1
+		)
+
+		# another worker got there first, try the next one
+		if claimed:
+			return Job.objects.get(pk=pk)
+
+	return None
+
+
+# run a claimed job
+def run_job(job):
+	"""
+		runs the task of a claimed job and deletes the job when it succeeds.
+		a failed job is retried with exponential backoff until it has used up its attempts.
+		returns True when the task succeeded.
+	"""
+	try:
+		registry[job.name](**json.loads(job.payload))
+
+	except Exception as e:
+		logger.error(f"An error occurred when trying to run task {job.name} (job {job.pk}): {e}", exc_info=True)
+
+		if job.attempts >= job.max_attempts:
+			Job.objects.filter(pk=job.pk).update(status=Job.FAILED, locked_until=None, last_error=str(e))
+		else:
+			delay = settings.TASK_RETRY_DELAY * 2 ** (job.attempts - 1)
+			Job.objects.filter(pk=job.pk).update(
+				run_at=timezone.now() + timedelta(seconds=delay), locked_until=None, last_error=str(e)
+			)
+		return False
+
+	Job.objects.filter(pk=job.pk).delete()
+	return True
+
+
+# generate the previews of a stored file
+@task
+def generate_file_previews(name):
+	generate_previews(name)
+
@@ -1,16 +1,83 @@
+import io 
+import asyncio
+import contextlib
+import hashlib
+import os 
+import tempfile 
+import threading
+import time
+from types import SimpleNamespace 
+from datetime import timedelta
+from asgiref.sync import async_to_sync
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from PIL import Image
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, SimpleTestCase, RequestFactory, override_settings 
 from django.urls import reverse 
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.request import Request
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import Profile
+from fileshare.database import database
+from fileshare.executor import run_sync, close_sync_connections, persist_sync_connection, start_process_executor
+from fileshare.metrics import pool_metrics
+from fileshare.middlewares import DatabaseMiddleware
+from .models import Profile, Blob, File, FileOperation, Job, UploadSession
+from .pagination import FilePagination
+from .previews import generate_previews, delete_previews, preview_name
+from .serializers import BulkFileOperationSerializer
+from .storage import save_upload, release_blob, reference_blob, probe_challenge, claim_blob, hash_range, complete_upload, reserve_name
+from .tasks import registry, enqueue, claim_job, run_job
+from .cache import FILES, INBOX, get_cached_listing, set_cached_listing
+from .events import Broker, PostgresBackend, broker, file_shared_event, sign_event_ticket
+from .utils import (
+	write_chunk, parse_range_header, if_range_matches, file_response, sign_file_link, unsign_file_link,
+	listing_etag, not_modified_response
+)
+from .views import FileLinkDownloadRequest, FileEventRequest
 
 User = get_user_model()
 
 
+# runs in the process pool, which only has the settings when django was set up there
+def read_setting(name):
+	return getattr(settings, name)
 
-class UserViewTest(APITestCase):
+
+# database setup of the view tests 
+class DatabaseTestMixin:
+
+	# connects the async database for the test, in production the lifespan middleware connects it
+	@contextlib.asynccontextmanager
+	async def async_database(self):
+		# the async connection isn't switched to the test database, DATABASE_URL has to name it
+		if database.url.database != connection.settings_dict['NAME']:
+			self.skipTest("DATABASE_URL doesn't point at the test database")
+
+		await database.connect()
+		try:
+			yield database
+		finally:
+			await database.disconnect()
+
+	# views run their queries on the sync executor, whose threads would keep the test database from being dropped
+	@classmethod
+	def tearDownClass(cls):
+		close_sync_connections()
+		super().tearDownClass()
+
+
+class UserViewTest(DatabaseTestMixin, APITransactionTestCase):
 	"""
 	Test get, put, patch and delete method for user view
 
@@ -63,9 +130,8 @@ class UserViewTest(APITestCase):
 
 		"""
 		response = self.client.put(self.user_url, self.user_update_data, format='json')
-		response_status = response.data['status']
-		self.assertEqual(response_status, status.HTTP_201_CREATED)
-		self.assertIn('success', response.data)
+		self.assertEqual(response.data['status_code'], status.HTTP_201_CREATED)
+		self.assertEqual(response.data['status'], 'success')
 
 
 	def test_patch_user(self):
@@ -74,9 +140,8 @@ class UserViewTest(APITestCase):
 
 		"""
 		response = self.client.patch(self.user_url, self.user_update_data_2, format='json')
-		response_status = response.data['status']
-		self.assertEqual(response_status, status.HTTP_201_CREATED)
-		self.assertIn('success', response.data)
+		self.assertEqual(response.data['status_code'], status.HTTP_201_CREATED)
+		self.assertEqual(response.data['status'], 'success')
 
 
 	def test_delete_user(self):
@@ -85,12 +150,11 @@ class UserViewTest(APITestCase):
 
 		"""
 		response = self.client.delete(self.user_url)
-		response_status = response.data['status']
-		self.assertEqual(response_status, status.HTTP_401_UNAUTHORIZED) # only admin or staff can delete user
-		self.assertIn('error', response.data)
+		self.assertEqual(response.data['status_code'], status.HTTP_401_UNAUTHORIZED) # only admin or staff can delete user
+		self.assertEqual(response.data['status'], 'error')
 
 
-class ProfileViewTest(APITestCase):
+class ProfileViewTest(DatabaseTestMixin, APITransactionTestCase):
 	"""
 	test for profile crud operation
 
@@ -126,7 +190,7 @@ class ProfileViewTest(APITestCase):
 		"""
 		response = self.client.get(self.profile_url)
 		self.assertEqual(response.status_code, status.HTTP_200_OK)
-		self.assertIn("success", response.data)
+		self.assertEqual(response.data['status'], 'success')
 
 
 	def test_delete_profile(self):
@@ -136,7 +200,1471 @@ class ProfileViewTest(APITestCase):
 		"""
 
 		response = self.client.delete(self.profile_url)
-		response_status = response.data['status']
-		self.assertEqual(response_status, status.HTTP_204_NO_CONTENT)
-		self.assertIn('success', response.data)
+		self.assertEqual(response.data['status_code'], status.HTTP_204_NO_CONTENT)
+		self.assertEqual(response.data['status'], 'success')
+
+
+class WriteChunkTest(SimpleTestCase):
+	"""
+	test writing upload chunks into a partial file
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tmp_dir.name, 'partial', 'upload.part')
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+
+	def test_append_chunks(self):
+		"""
+		test chunks are written at their offsets
+
+		"""
+		self.assertEqual(write_chunk(self.path, io.BytesIO(b'hello '), 0, 6, block_size=4), 6)
+		self.assertEqual(write_chunk(self.path, io.BytesIO(b'world'), 6, 5, block_size=4), 5)
+
+		with open(self.path, 'rb') as f:
+			self.assertEqual(f.read(), b'hello world')
+
+
+	def test_chunk_length_limit(self):
+		"""
+		test extra bytes past the chunk length are not written
+
+		"""
+		self.assertEqual(write_chunk(self.path, io.BytesIO(b'abcdef'), 0, 4), 4)
+		self.assertEqual(os.path.getsize(self.path), 4)
+
+
+	def test_retry_truncates_partial_chunk(self):
+		"""
+		test a retried chunk replaces a short chunk left by a dropped request
+
+		"""
+		write_chunk(self.path, io.BytesIO(b'abcd'), 0, 4)
+		write_chunk(self.path, io.BytesIO(b'ef'), 4, 4) # short chunk
+		write_chunk(self.path, io.BytesIO(b'EFGH'), 4, 4)
+
+		with open(self.path, 'rb') as f:
+			self.assertEqual(f.read(), b'abcdEFGH')
+
+
+class RangeHeaderTest(SimpleTestCase):
+	"""
+	test parsing of the Range and If-Range download headers
+
+	"""
+
+	def test_parse_range(self):
+		"""
+		test single ranges are parsed into inclusive byte positions
+
+		"""
+		self.assertEqual(parse_range_header('bytes=0-499', 1000), (0, 499))
+		self.assertEqual(parse_range_header('bytes=500-', 1000), (500, 999))
+		self.assertEqual(parse_range_header('bytes=-100', 1000), (900, 999))
+		self.assertEqual(parse_range_header('bytes=900-2000', 1000), (900, 999))
+
+
+	def test_ignored_range(self):
+		"""
+		test missing, malformed and multi ranges are ignored so the whole file is sent
+
+		"""
+		self.assertIsNone(parse_range_header(None, 1000))
+		self.assertIsNone(parse_range_header('items=0-10', 1000))
+		self.assertIsNone(parse_range_header('bytes=0-10,20-30', 1000))
+		self.assertIsNone(parse_range_header('bytes=10-5', 1000))
+
+
+	def test_unsatisfiable_range(self):
+		"""
+		test ranges past the end of the file can't be satisfied
+
+		"""
+		with self.assertRaises(ValueError):
+			parse_range_header('bytes=1000-', 1000)
+
+		with self.assertRaises(ValueError):
+			parse_range_header('bytes=-0', 1000)
+
+
+	def test_if_range(self):
+		"""
+		test If-Range only matches the current validators
+
+		"""
+		self.assertTrue(if_range_matches(None, '"abc"', 0))
+		self.assertTrue(if_range_matches('"abc"', '"abc"', 0))
+		self.assertFalse(if_range_matches('"old"', '"abc"', 0))
+		self.assertFalse(if_range_matches('W/"abc"', '"abc"', 0))
+		self.assertTrue(if_range_matches('Thu, 01 Jan 1970 00:00:10 GMT', '"abc"', 10.5))
+
+
+class FileDeliveryTest(SimpleTestCase):
+	"""
+	test the download response for each file delivery mode
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.request = RequestFactory().get('/')
+
+
+	@override_settings(FILE_DELIVERY_MODE='x-accel-redirect', FILE_ACCEL_REDIRECT_PREFIX='/protected/', MEDIA_ROOT='/srv/media')
+	async def test_accel_redirect(self):
+		"""
+		test nginx mode points X-Accel-Redirect at the internal location
+
+		"""
+		response = await file_response(self.request, '/srv/media/documents/my report.pdf', 'my report.pdf')
+		self.assertEqual(response['X-Accel-Redirect'], '/protected/documents/my%20report.pdf')
+		self.assertEqual(response['Content-Type'], 'application/pdf')
+		self.assertEqual(response.content, b'')
+
+
+	@override_settings(FILE_DELIVERY_MODE='x-sendfile')
+	async def test_sendfile(self):
+		"""
+		test sendfile mode passes the escaped absolute path to the proxy
+
+		"""
+		response = await file_response(self.request, '/srv/media/documents/report.pdf', 'report.pdf')
+		self.assertEqual(response['X-Sendfile'], '/srv/media/documents/report.pdf')
+
+		response = await file_response(self.request, '/srv/media/documents/résumé 1.pdf', 'résumé 1.pdf')
+		self.assertEqual(response['X-Sendfile'], '/srv/media/documents/r%C3%A9sum%C3%A9%201.pdf')
+
+
+	@override_settings(FILE_DELIVERY_MODE='stream')
+	async def test_stream_range(self):
+		"""
+		test stream mode sends the requested range from disk
+
+		"""
+		with tempfile.NamedTemporaryFile() as f:
+			f.write(b'hello world')
+			f.flush()
+
+			request = RequestFactory().get('/', HTTP_RANGE='bytes=6-')
+			response = await file_response(request, f.name, 'hello.txt')
+			content = b''.join([part async for part in response])
+
+		self.assertEqual(response.status_code, 206)
+		self.assertEqual(response['Content-Range'], 'bytes 6-10/11')
+		self.assertEqual(content, b'world')
+
+
+class BlobStorageTest(TestCase):
+	"""
+	test content-addressed storage of uploads
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.media_root = override_settings(MEDIA_ROOT=self.tmp_dir.name)
+		self.media_root.enable()
+
+	def tearDown(self):
+		self.media_root.disable()
+		self.tmp_dir.cleanup()
+
+
+	def test_duplicate_upload_stored_once(self):
+		"""
+		test the same content uploaded twice shares one blob
+
+		"""
+		blob_1 = save_upload(SimpleUploadedFile('a.txt', b'same content'))
+		blob_2 = save_upload(SimpleUploadedFile('b.txt', b'same content'))
+
+		self.assertEqual(blob_1.pk, blob_2.pk)
+		self.assertEqual(Blob.objects.get().references, 2)
+		self.assertEqual(Blob.objects.get().size, 12)
+		self.assertTrue(default_storage.exists(blob_1.file.name))
+
+
+	def test_release_last_reference(self):
+		"""
+		test the blob content is only deleted with its last reference
+
+		"""
+		blob = save_upload(SimpleUploadedFile('a.txt', b'content'))
+		save_upload(SimpleUploadedFile('b.txt', b'content'))
+
+		release_blob(blob.pk)
+		self.assertTrue(default_storage.exists(blob.file.name))
+
+		release_blob(blob.pk)
+		self.assertFalse(Blob.objects.exists())
+		self.assertFalse(default_storage.exists(blob.file.name))
+
+
+	def test_reference_by_digest(self):
+		"""
+		test content can be referenced by digest and size without uploading it again
+
+		"""
+		blob = save_upload(SimpleUploadedFile('a.txt', b'content'))
+
+		self.assertIsNone(reference_blob(blob.digest, blob.size + 1))
+		self.assertIsNone(reference_blob('0' * 64, blob.size))
+		self.assertEqual(reference_blob(blob.digest, blob.size).pk, blob.pk)
+		self.assertEqual(Blob.objects.get().references, 2)
+
+
+	def test_claim_needs_content(self):
+		"""
+		test a blob is only referenced for a client that hashed the challenged range of its content
+
+		"""
+		content = b'secret content of another user'
+		blob = save_upload(SimpleUploadedFile('a.txt', content))
+		challenge = probe_challenge(2, blob.digest, blob.size)
+		offset, length = challenge['offset'], challenge['length']
+
+		# the digest and size are known, the content isn't
+		self.assertIsNone(claim_blob(2, blob.digest, blob.size, challenge['challenge'], blob.digest))
+		# a challenge is bound to the user it was made for
+		proof = hashlib.sha256(challenge['nonce'].encode() + content[offset:offset + length]).hexdigest()
+		self.assertIsNone(claim_blob(3, blob.digest, blob.size, challenge['challenge'], proof))
+		self.assertEqual(Blob.objects.get().references, 1)
+
+		self.assertEqual(claim_blob(2, blob.digest, blob.size, challenge['challenge'], proof).pk, blob.pk)
+		self.assertEqual(proof, hash_range(default_storage.path(blob.file.name), challenge['nonce'], offset, length))
+		self.assertEqual(Blob.objects.get().references, 2)
+
+
+	@override_settings(PREVIEW_SIZES=[16])
+	def test_deleted_file_previews(self):
+		"""
+		test a deleted file's previews are removed unless they belong to a blob other files still use
+
+		"""
+		image = io.BytesIO()
+		Image.new('RGB', (20, 20), 'red').save(image, 'PNG')
+		user = User.objects.create_user(username="owner", email="owner@email.com", password="newUSER12##")
+		own = File.objects.create(file=default_storage.save('documents/photo.png', image), user=user)
+		image.seek(0)
+		blob = save_upload(SimpleUploadedFile('photo.png', image.read()))
+		shared = File.objects.create(file=blob.file.name, blob=blob, user=user)
+
+		for file in (own, shared):
+			generate_previews(file.file.name)
+			with self.captureOnCommitCallbacks(execute=True):
+				file.delete()
+
+		self.assertFalse(default_storage.exists(preview_name(own.file.name, 16)))
+		self.assertTrue(default_storage.exists(preview_name(blob.file.name, 16)))
+
+
+	@override_settings(PROBE_CHALLENGE_SIZE=4)
+	def test_challenge_range(self):
+		"""
+		test the challenged range lies within the content and a challenge is made for content the server doesn't hold
+
+		"""
+		for _ in range(20):
+			challenge = probe_challenge(1, '0' * 64, 10)
+			self.assertEqual(challenge['length'], 4)
+			self.assertLessEqual(challenge['offset'] + challenge['length'], 10)
+
+
+class KeysetPaginationTest(TestCase):
+	"""
+	test keyset pagination of file listings
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		for i in range(5):
+			user = User.objects.create_user(username=f"user{i}", email=f"user{i}@email.com", password="newUSER12##")
+			File.objects.create(file=f"documents/file{i}.txt", user=user)
+
+
+	def test_pages_cover_listing(self):
+		"""
+		test following the next links returns every file once, newest first
+
+		"""
+		names = []
+		url = '/api/users/file/'
+
+		while url:
+			paginator = FilePagination()
+			paginator.page_size = 2
+			page = paginator.paginate_queryset(File.objects.all(), Request(RequestFactory().get(url)))
+			self.assertLessEqual(len(page), 2)
+			names += [file.file.name for file in page]
+			url = paginator.get_next_link()
+
+		self.assertEqual(names, [f"documents/file{i}.txt" for i in reversed(range(5))])
+
+
+	def test_user_library(self):
+		"""
+		test a user can own many files and their library only lists their own files
+
+		"""
+		user = User.objects.get(username="user0")
+		for i in range(3):
+			File.objects.create(file=f"documents/library{i}.txt", user=user)
+
+		paginator = FilePagination()
+		paginator.page_size = 10
+		page = paginator.paginate_queryset(user.files.all(), Request(RequestFactory().get('/api/users/file/')))
+
+		self.assertEqual([file.file.name for file in page], ["documents/library2.txt", "documents/library1.txt", "documents/library0.txt", "documents/file0.txt"])
+		self.assertIsNone(paginator.get_next_link())
+
+
+class SyncExecutorTest(SimpleTestCase):
+	"""
+	test running sync work on the bounded executor
+
+	"""
+
+	async def test_run_sync(self):
+		"""
+		test the result is returned and the work is counted in the pool metrics
+
+		"""
+		completed = pool_metrics.snapshot()["executor_completed"]
+
+		self.assertEqual(await run_sync(pow, 2, exp=10), 1024)
+
+		metrics = pool_metrics.snapshot()
+		self.assertEqual(metrics["executor_completed"], completed + 1)
+		self.assertEqual(metrics["executor_busy"], 0)
+		self.assertEqual(metrics["executor_waiting"], 0)
+
+
+	@override_settings(SYNC_CONN_MAX_AGE=600)
+	async def test_persist_sync_connection(self):
+		"""
+		test only connections opened on executor threads are kept open past CONN_MAX_AGE
+
+		"""
+		opened = SimpleNamespace(close_at=0)
+		await run_sync(persist_sync_connection, None, connection=opened)
+		self.assertGreater(opened.close_at, time.monotonic() + 500)
+
+		opened = SimpleNamespace(close_at=0)
+		await asyncio.to_thread(persist_sync_connection, None, connection=opened)
+		self.assertEqual(opened.close_at, 0)
+
+
+	@override_settings(SYNC_EXECUTOR_WORKERS=2)
+	def test_close_busy_thread(self):
+		"""
+		test closing the executor connections doesn't wait for a thread that stays busy
+
+		"""
+		release = threading.Event()
+		with mock.patch('fileshare.executor.executor', ThreadPoolExecutor(max_workers=2)) as busy_executor:
+			busy = busy_executor.submit(release.wait)
+			try:
+				with self.assertLogs('fileshare', 'WARNING'):
+					close_sync_connections(timeout=0.1)
+			finally:
+				release.set()
+				busy.result(timeout=5)
+				busy_executor.shutdown()
+
+
+	def test_process_executor(self):
+		"""
+		test the process pool starts its workers from the forkserver with the django settings loaded
+
+		"""
+		executor = start_process_executor(1)
+		try:
+			self.assertEqual(executor.submit(pow, 2, 10).result(timeout=30), 1024)
+			self.assertEqual(executor.submit(read_setting, 'SYNC_CONN_MAX_AGE').result(timeout=30), settings.SYNC_CONN_MAX_AGE)
+		finally:
+			executor.shutdown()
+
+
+class BulkFileOperationTest(TestCase):
+	"""
+	test sharing files with several receivers at once
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.sender = User.objects.create_user(username="sender", email="sender@email.com", password="newUSER12##")
+		self.file = File.objects.create(file="documents/report.pdf", user=self.sender)
+		self.receivers = [
+			User.objects.create_user(username=f"Receiver{i}", email=f"receiver{i}@email.com", password="newUSER12##")
+			for i in range(3)
+		]
+		self.context = {'request': SimpleNamespace(user=self.sender)}
+
+
+	def test_receivers_resolved_in_one_query(self):
+		"""
+		test receivers given by username or email in any case are looked up together
+
+		"""
+		serializer = BulkFileOperationSerializer(data={
+			"files": [self.file.id],
+			"receivers": ["receiver0", "RECEIVER1@email.com", "Receiver2"]
+		}, context=self.context)
+
+		with self.assertNumQueries(2):
+			self.assertTrue(serializer.is_valid())
+
+		self.assertEqual({user.pk for user in serializer.validated_data['receiver_objects']}, {user.pk for user in self.receivers})
+
+
+	def test_unknown_receivers_and_files(self):
+		"""
+		test unknown receivers and files that aren't the sender's are reported
+
+		"""
+		other_file = File.objects.create(file="documents/other.pdf", user=self.receivers[0])
+		serializer = BulkFileOperationSerializer(data={
+			"files": [self.file.id, other_file.id],
+			"receivers": ["receiver0", "nobody"]
+		}, context=self.context)
+
+		self.assertFalse(serializer.is_valid())
+		self.assertIn("nobody", str(serializer.errors["receivers"]))
+		self.assertIn(str(other_file.id), str(serializer.errors["files"]))
+
+
+	def test_bulk_create(self):
+		"""
+		test the file operations are inserted together
+
+		"""
+		serializer = BulkFileOperationSerializer(data={"files": [self.file.id], "receivers": ["receiver0"]}, context=self.context)
+		self.assertTrue(serializer.is_valid())
+
+		with self.assertNumQueries(1):
+			file_operations = serializer.save()
+
+		self.assertEqual(len(file_operations), 1)
+		self.assertEqual(file_operations[0].receiver, self.receivers[0])
+
+
+	def test_share_file_with_many_receivers(self):
+		"""
+		test one file can be shared with every receiver and shows up in each inbox
+
+		"""
+		serializer = BulkFileOperationSerializer(data={
+			"files": [self.file.id],
+			"receivers": [user.username for user in self.receivers]
+		}, context=self.context)
+		self.assertTrue(serializer.is_valid())
+		serializer.save()
+
+		self.assertEqual(FileOperation.objects.filter(sender=self.sender).count(), 3)
+		self.assertEqual(set(self.file.recipients.all()), set(self.receivers))
+		self.assertEqual(list(self.receivers[0].shared_files.all()), [self.file])
+
+
+
+@override_settings(PREVIEW_SIZES=[64, 16])
+class PreviewTest(SimpleTestCase):
+	"""
+	test background preview generation
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.media_root = override_settings(MEDIA_ROOT=self.tmp_dir.name)
+		self.media_root.enable()
+
+	def tearDown(self):
+		self.media_root.disable()
+		self.tmp_dir.cleanup()
+
+
+	def test_image_previews(self):
+		"""
+		test a preview is written for each size, fitting inside it
+
+		"""
+		image = io.BytesIO()
+		Image.new('RGB', (200, 100), 'red').save(image, 'PNG')
+		name = default_storage.save('documents/photo.png', image)
+
+		created = generate_previews(name)
+
+		self.assertEqual(created, [preview_name(name, 64), preview_name(name, 16)])
+		with Image.open(default_storage.path(preview_name(name, 64))) as preview:
+			self.assertEqual(preview.size, (64, 32))
+		with Image.open(default_storage.path(preview_name(name, 16))) as preview:
+			self.assertEqual(preview.size, (16, 8))
+
+		# already generated, nothing to do
+		self.assertEqual(generate_previews(name), [])
+
+		delete_previews(name)
+		self.assertFalse(default_storage.exists(preview_name(name, 64)))
+
+
+	def test_previews_per_stored_name(self):
+		"""
+		test files with the same name but another extension don't share previews
+
+		"""
+		self.assertNotEqual(preview_name('documents/report.png', 16), preview_name('documents/report.jpg', 16))
+
+		for color, extension in [('red', 'PNG'), ('blue', 'JPEG')]:
+			image = io.BytesIO()
+			Image.new('RGB', (20, 20), color).save(image, extension)
+			generate_previews(default_storage.save(f'documents/report.{extension.lower()}', image))
 
+		with Image.open(default_storage.path(preview_name('documents/report.png', 16))) as preview:
+			self.assertGreater(preview.getpixel((8, 8))[0], 245)
+		with Image.open(default_storage.path(preview_name('documents/report.jpeg', 16))) as preview:
+			self.assertLess(preview.getpixel((8, 8))[0], 10)
+
+
+	def test_non_image(self):
+		"""
+		test files that aren't images get no previews
+
+		"""
+		name = default_storage.save('documents/notes.txt', io.BytesIO(b'not an image'))
+
+		self.assertEqual(generate_previews(name), [])
+		self.assertFalse(default_storage.exists(preview_name(name, 16)))
+
+
+
+@override_settings(TASK_MAX_ATTEMPTS=2, TASK_RETRY_DELAY=10)
+class JobQueueTest(TransactionTestCase):
+	"""
+	test the database backed task queue, the worker closes its connections between jobs which a TestCase transaction doesn't survive
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.calls = []
+		self.registry = mock.patch.dict(registry, {'record': lambda **kwargs: self.calls.append(kwargs), 'fail': self.fail_task})
+		self.registry.start()
+
+	def tearDown(self):
+		self.registry.stop()
+
+	def fail_task(self):
+		raise RuntimeError("task failed")
+
+
+	def test_claim_and_run(self):
+		"""
+		test a claimed job is hidden from other workers and deleted once it succeeded
+
+		"""
+		enqueue('record', name='a.txt')
+
+		job = claim_job(visibility_timeout=60)
+		self.assertEqual(job.attempts, 1)
+		self.assertIsNone(claim_job(visibility_timeout=60))
+
+		self.assertTrue(run_job(job))
+		self.assertEqual(self.calls, [{'name': 'a.txt'}])
+		self.assertFalse(Job.objects.exists())
+
+
+	def test_expired_lock_is_claimed_again(self):
+		"""
+		test a job whose worker died is picked up once its visibility timeout passed
+
+		"""
+		enqueue('record')
+		job = claim_job(visibility_timeout=60)
+		Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+		self.assertEqual(claim_job(visibility_timeout=60).pk, job.pk)
+
+
+	def test_retry_then_fail(self):
+		"""
+		test a failing job is retried later and marked as failed after its last attempt
+
+		"""
+		enqueue('fail')
+
+		self.assertFalse(run_job(claim_job()))
+		job = Job.objects.get()
+		self.assertEqual(job.status, Job.PENDING)
+		self.assertGreater(job.run_at, timezone.now())
+		self.assertIsNone(claim_job())
+
+		Job.objects.update(run_at=timezone.now())
+		self.assertFalse(run_job(claim_job()))
+		job = Job.objects.get()
+		self.assertEqual(job.status, Job.FAILED)
+		self.assertEqual(job.last_error, "task failed")
+		self.assertIsNone(claim_job())
+
+
+	def test_unknown_task(self):
+		"""
+		test only registered tasks can be queued
+
+		"""
+		with self.assertRaises(KeyError):
+			enqueue('missing')
+
+
+	def test_run_tasks_command(self):
+		"""
+		test the worker command drains the queue
+
+		"""
+		enqueue('record', n=1)
+		enqueue('record', n=2)
+
+		call_command('run_tasks', workers=1, once=True)
+
+		self.assertEqual(self.calls, [{'n': 1}, {'n': 2}])
+		self.assertFalse(Job.objects.exists())
+
+
+
+@override_settings(FILE_DELIVERY_MODE='stream')
+class FileLinkTest(SimpleTestCase):
+	"""
+	test signed public download links, SimpleTestCase fails on any database query
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.media_root = override_settings(MEDIA_ROOT=self.tmp_dir.name)
+		self.media_root.enable()
+		self.name = default_storage.save('documents/report.txt', io.BytesIO(b'public content'))
+
+	def tearDown(self):
+		self.media_root.disable()
+		self.tmp_dir.cleanup()
+
+
+	def test_sign_and_unsign(self):
+		"""
+		test a link holds the file it was signed for
+
+		"""
+		token, expires = sign_file_link(self.name, 'report.txt', 60)
+		self.assertEqual(unsign_file_link(token), (self.name, 'report.txt', expires))
+
+
+	def test_tampered_and_expired(self):
+		"""
+		test changed or expired links are rejected
+
+		"""
+		token, _ = sign_file_link(self.name, 'report.txt', 60)
+		with self.assertRaises(signing.BadSignature):
+			unsign_file_link(token[:-1] + ('A' if token[-1] != 'A' else 'B'))
+
+		token, _ = sign_file_link(self.name, 'report.txt', -1)
+		with self.assertRaises(signing.SignatureExpired):
+			unsign_file_link(token)
+
+
+	async def test_download(self):
+		"""
+		test a link is served without authentication or database queries
+
+		"""
+		token, _ = sign_file_link(self.name, 'report.txt', 60)
+		view = FileLinkDownloadRequest.as_view()
+
+		response = await view(RequestFactory().get(reverse('file_link_download', args=[token])), token=token)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'public content')
+		self.assertTrue(response['Cache-Control'].startswith('public, max-age='))
+
+		response = await view(RequestFactory().get('/'), token='invalid')
+		self.assertEqual(response.status_code, 404)
+
+
+
+class ConditionalResponseTest(TestCase):
+	"""
+	test etag validation of listings and downloads
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.user = User.objects.create_user(username="user1", email="user1@email.com", password="newUSER12##")
+		File.objects.create(file="documents/a.txt", user=self.user)
+		self.request = RequestFactory().get('/api/users/file/')
+		self.request.user = self.user
+
+
+	def test_listing_etag(self):
+		"""
+		test the listing etag changes when a file is added, renamed or removed, or its owner is renamed
+
+		"""
+		etag = lambda: async_to_sync(listing_etag)(self.request, FILES)
+		first = etag()
+		self.assertEqual(first, etag())
+
+		with self.captureOnCommitCallbacks(execute=True):
+			file = File.objects.create(file="documents/b.txt", user=self.user)
+		added = etag()
+		self.assertNotEqual(first, added)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			file.filename = "c.txt"
+			file.save()
+		renamed = etag()
+		self.assertNotEqual(added, renamed)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.user.username = "user2"
+			self.user.save()
+		self.assertNotEqual(renamed, etag())
+
+		renamed = etag()
+		with self.captureOnCommitCallbacks(execute=True):
+			file.delete()
+		self.assertNotEqual(renamed, etag())
+
+
+	def test_staff_listing_etag(self):
+		"""
+		test the staff listing etag changes when any user's files change, without a query
+
+		"""
+		staff = User.objects.create_user(username="staff", email="staff@email.com", password="newUSER12##", is_staff=True)
+		self.request.user = staff
+
+		with self.assertNumQueries(0):
+			etag = async_to_sync(listing_etag)(self.request, FILES)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			File.objects.create(file="documents/b.txt", user=self.user)
+		self.assertNotEqual(etag, async_to_sync(listing_etag)(self.request, FILES))
+
+
+	def test_not_modified(self):
+		"""
+		test a matching If-None-Match is answered with 304
+
+		"""
+		etag = '"abc"'
+		response = not_modified_response(RequestFactory().get('/', HTTP_IF_NONE_MATCH=etag), etag)
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(response['ETag'], etag)
+
+		self.assertIsNone(not_modified_response(RequestFactory().get('/', HTTP_IF_NONE_MATCH='"other"'), etag))
+		self.assertIsNone(not_modified_response(RequestFactory().get('/'), etag))
+
+
+	@override_settings(FILE_DELIVERY_MODE='stream')
+	def test_download_not_modified(self):
+		"""
+		test a download is answered with 304 when the client holds the same content
+
+		"""
+		with tempfile.NamedTemporaryFile() as f:
+			f.write(b'hello world')
+			f.flush()
+
+			request = RequestFactory().get('/', HTTP_IF_NONE_MATCH='"digest"')
+			response = async_to_sync(file_response)(request, f.name, 'hello.txt', etag='"digest"')
+			self.assertEqual(response.status_code, 304)
+
+			request = RequestFactory().get('/')
+			response = async_to_sync(file_response)(request, f.name, 'hello.txt', etag='"digest"')
+			self.assertEqual(response.status_code, 200)
+			self.assertEqual(response['ETag'], '"digest"')
+
+
+
+class ListingCacheTest(TestCase):
+	"""
+	test the cached inbox and outbox listings
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		cache.clear()
+		self.sender = User.objects.create_user(username="sender", email="sender@email.com", password="newUSER12##")
+		self.receiver = User.objects.create_user(username="receiver", email="receiver@email.com", password="newUSER12##")
+		self.file = File.objects.create(file="documents/a.txt", user=self.sender)
+
+	def get(self, user):
+		request = RequestFactory().get('/api/users/received_files/')
+		request.user = user
+		return async_to_sync(get_cached_listing)(INBOX, request)
+
+
+	def test_cached_until_shared(self):
+		"""
+		test a cached inbox page is served until a file is shared with the user
+
+		"""
+		key, cached = self.get(self.receiver)
+		self.assertIsNone(cached)
+
+		async_to_sync(set_cached_listing)(key, '"etag"', {"data": []})
+		self.assertEqual(self.get(self.receiver), (key, ('"etag"', {"data": []})))
+
+		with self.captureOnCommitCallbacks(execute=True):
+			operation = FileOperation.objects.create(file=self.file, sender=self.sender, receiver=self.receiver)
+			# a listing read before the share commits keeps its version, so it can't cache the old page under a new one
+			self.assertEqual(self.get(self.receiver)[0], key)
+
+		new_key, cached = self.get(self.receiver)
+		self.assertNotEqual(new_key, key)
+		self.assertIsNone(cached)
+
+		async_to_sync(set_cached_listing)(new_key, '"etag"', {"data": [operation.pk]})
+		with self.captureOnCommitCallbacks(execute=True):
+			self.file.delete()
+		self.assertIsNone(self.get(self.receiver)[1])
+
+
+	def test_renamed_sender(self):
+		"""
+		test renaming a user drops the inbox of the users they shared with once, and not on other saves
+
+		"""
+		for _ in range(3):
+			FileOperation.objects.create(file=self.file, sender=self.sender, receiver=self.receiver)
+		key, _ = self.get(self.receiver)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.sender.save(update_fields=['last_login'])
+		self.assertEqual(self.get(self.receiver)[0], key)
+
+		# the update and one read of the distinct pairs, however many shares there are 
+		with self.assertNumQueries(2):
+			with self.captureOnCommitCallbacks(execute=True):
+				self.sender.username = "renamed"
+				self.sender.save(update_fields=['username'])
+		self.assertNotEqual(self.get(self.receiver)[0], key)
+
+
+	def test_other_users_unaffected(self):
+		"""
+		test sharing only drops the listings of the sender and receiver
+
+		"""
+		other = User.objects.create_user(username="other", email="other@email.com", password="newUSER12##")
+		key, _ = self.get(other)
+		async_to_sync(set_cached_listing)(key, '"etag"', {"data": []})
+
+		FileOperation.objects.create(file=self.file, sender=self.sender, receiver=self.receiver)
+		self.assertIsNotNone(self.get(other)[1])
+
+
+	def test_staff_not_cached(self):
+		"""
+		test staff listings, which show every user's rows, are not cached
+
+		"""
+		staff = User.objects.create_user(username="staff", email="staff@email.com", password="newUSER12##", is_staff=True)
+		self.assertEqual(self.get(staff), (None, None))
+
+
+
+class FileEventTest(TestCase):
+	"""
+	test server-sent events for new shares
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.sender = User.objects.create_user(username="sender", email="sender@email.com", password="newUSER12##")
+		self.receiver = User.objects.create_user(username="receiver", email="receiver@email.com", password="newUSER12##")
+		self.file = File.objects.create(file="documents/a.txt", user=self.sender)
+
+
+	@override_settings(EVENT_QUEUE_SIZE=2)
+	def test_broker(self):
+		"""
+		test events published from another thread reach the subscriber, dropping the oldest when its queue is full
+
+		"""
+		async def receive():
+			events = Broker()
+			queue = events.subscribe(1)
+			for i in range(3):
+				await asyncio.to_thread(events.publish, 1, i)
+			await asyncio.to_thread(events.publish, 2, 'other user')
+			await asyncio.sleep(0)
+
+			received = [queue.get_nowait() for _ in range(queue.qsize())]
+			events.unsubscribe(1, queue)
+			return received, events.subscribers
+
+		self.assertEqual(async_to_sync(receive)(), ([1, 2], {}))
+
+
+	def test_published_on_commit(self):
+		"""
+		test a share made with the ORM is published once it commits
+
+		"""
+		with mock.patch('users.signals.publish') as publish:
+			with self.captureOnCommitCallbacks(execute=True):
+				operation = FileOperation.objects.create(file=self.file, sender=self.sender, receiver=self.receiver)
+				publish.assert_not_called()
+
+		publish.assert_called_once_with(self.receiver.pk, file_shared_event(operation))
+
+
+	def test_stream(self):
+		"""
+		test the stream replays missed shares and then sends live ones
+
+		"""
+		with mock.patch('users.signals.publish'):
+			seen = FileOperation.objects.create(file=self.file, sender=self.sender, receiver=self.receiver)
+			missed = FileOperation.objects.create(file=self.file, sender=self.sender, receiver=self.receiver)
+
+		async def read():
+			stream = FileEventRequest().stream(self.receiver, seen.pk)
+			chunks = [await anext(stream), await anext(stream)]
+			broker.publish(self.receiver.pk, {'id': 99, 'event': 'file_shared', 'data': {}})
+			chunks.append(await anext(stream))
+			await stream.aclose()
+			return chunks
+
+		retry, replayed, live = async_to_sync(read)()
+		self.assertTrue(retry.startswith('retry: '))
+		self.assertTrue(replayed.startswith(f"id: {missed.pk}\nevent: file_shared\n"))
+		self.assertEqual(live, 'id: 99\nevent: file_shared\ndata: {}\n\n')
+		self.assertNotIn(self.receiver.pk, broker.subscribers)
+
+
+	def test_stream_ticket(self):
+		"""
+		test the stream opens with a ticket but not with an access token or another signed value in the url
+
+		"""
+		authenticate = lambda **params: async_to_sync(FileEventRequest().authenticate)(RequestFactory().get('/', params))
+
+		self.assertEqual(authenticate(ticket=sign_event_ticket(self.receiver.pk)), self.receiver)
+		self.assertIsNone(authenticate(token=str(RefreshToken.for_user(self.receiver).access_token)))
+		self.assertIsNone(authenticate(ticket=signing.dumps(self.receiver.pk)))
+
+		with override_settings(EVENT_TICKET_LIFETIME=-1):
+			self.assertIsNone(authenticate(ticket=sign_event_ticket(self.receiver.pk)))
+
+
+
+class PostgresListenerTest(DatabaseTestMixin, TransactionTestCase):
+	"""
+	test the postgres event backend keeps listening when its connection drops
+
+	"""
+
+	@override_settings(EVENT_RECONNECT_DELAY=0.1)
+	async def test_reconnect(self):
+		"""
+		test a terminated listener is reopened for the clients still subscribed
+
+		"""
+		if connection.vendor != 'postgresql':
+			self.skipTest("LISTEN/NOTIFY needs postgres")
+
+		async with self.async_database():
+			backend = PostgresBackend()
+			await backend.start()
+			queue = broker.subscribe(1)
+			dropped = backend.listener
+
+			try:
+				await database.execute(query="SELECT pg_terminate_backend(:pid)", values={'pid': dropped.get_server_pid()})
+				for _ in range(50):
+					if backend.listener is not dropped:
+						break
+					await asyncio.sleep(0.1)
+
+				self.assertIsNot(backend.listener, dropped)
+				await backend.apublish(1, 'after reconnect')
+				self.assertEqual(await asyncio.wait_for(queue.get(), 5), 'after reconnect')
+
+			finally:
+				broker.unsubscribe(1, queue)
+				await backend.listener.close()
+
+
+	async def test_publish_many(self):
+		"""
+		test a list of events is sent in one query and each reaches its user
+
+		"""
+		if connection.vendor != 'postgresql':
+			self.skipTest("LISTEN/NOTIFY needs postgres")
+
+		async with self.async_database():
+			backend = PostgresBackend()
+			await backend.start()
+			first, second = broker.subscribe(1), broker.subscribe(2)
+
+			try:
+				await backend.apublish_many([(1, 'first'), (2, 'second'), (1, 'third')])
+				self.assertEqual([await asyncio.wait_for(first.get(), 5) for _ in range(2)], ['first', 'third'])
+				self.assertEqual(await asyncio.wait_for(second.get(), 5), 'second')
+
+			finally:
+				broker.unsubscribe(1, first)
+				broker.unsubscribe(2, second)
+				await backend.listener.close()
+
+
+
+@override_settings(DATABASE_WARM_CONNECTIONS=0, LIFESPAN_DRAIN_TIMEOUT=5)
+class LifespanTest(SimpleTestCase):
+	"""
+	test the asgi lifespan handling of the database middleware
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.database = mock.patch('fileshare.middlewares.database', connect=mock.AsyncMock(), fetch_val=mock.AsyncMock(), disconnect=mock.AsyncMock())
+		self.db = self.database.start()
+
+	def tearDown(self):
+		self.database.stop()
+
+	async def run_lifespan(self, middleware, messages):
+		sent = []
+		queue = asyncio.Queue()
+		for message in messages:
+			queue.put_nowait({'type': message})
+
+		async def send(message):
+			sent.append(message['type'])
+
+		await middleware({'type': 'lifespan'}, queue.get, send)
+		return sent
+
+
+	async def test_startup_and_shutdown(self):
+		"""
+		test the pool is connected once and unknown messages don't end the lifespan
+
+		"""
+		middleware = DatabaseMiddleware(None)
+		sent = await self.run_lifespan(middleware, ['lifespan.startup', 'lifespan.unknown', 'lifespan.shutdown'])
+
+		self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+		self.db.connect.assert_awaited_once()
+		self.db.disconnect.assert_awaited_once()
+
+
+	async def test_startup_failed(self):
+		"""
+		test a startup error is reported to the server
+
+		"""
+		self.db.connect.side_effect = OSError("connection refused")
+		sent = await self.run_lifespan(DatabaseMiddleware(None), ['lifespan.startup'])
+
+		self.assertEqual(sent, ['lifespan.startup.failed'])
+
+
+	async def test_shutdown_waits_for_requests(self):
+		"""
+		test shutdown closes the pool only after the requests in flight finished
+
+		"""
+		release = asyncio.Event()
+
+		async def app(scope, receive, send):
+			await release.wait()
+
+		middleware = DatabaseMiddleware(app)
+		await middleware.startup()
+		request = asyncio.create_task(middleware({'type': 'http'}, None, None))
+		await asyncio.sleep(0)
+
+		shutdown = asyncio.create_task(self.run_lifespan(middleware, ['lifespan.shutdown']))
+		await asyncio.sleep(0.05)
+		self.db.disconnect.assert_not_awaited()
+
+		release.set()
+		self.assertEqual(await shutdown, ['lifespan.shutdown.complete'])
+		await request
+		self.db.disconnect.assert_awaited_once()
+
+
+@override_settings(UPLOAD_CHUNK_SIZE=4)
+class UploadEndpointTest(DatabaseTestMixin, APITransactionTestCase):
+	"""
+	test resumable uploads through the upload endpoints
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.media_root = override_settings(MEDIA_ROOT=self.tmp_dir.name)
+		self.media_root.enable()
+
+		self.user = User.objects.create_user(username="uploader", email="uploader@email.com", password="newUSER12##")
+		self.token = str(RefreshToken.for_user(self.user).access_token)
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.token)
+		self.headers = {'Authorization': 'Bearer ' + self.token}
+
+	def tearDown(self):
+		self.media_root.disable()
+		self.tmp_dir.cleanup()
+
+
+	def test_upload_file(self):
+		"""
+		test a file sent in one request is stored with its preview job, with and without deduplication
+
+		"""
+		for dedup in (False, True):
+			with self.subTest(dedup=dedup), override_settings(FILE_DEDUPLICATION=dedup):
+				upload = SimpleUploadedFile(f"notes{dedup}.txt", b"file content")
+				response = self.client.post(reverse('file'), {"file": upload}, format='multipart')
+				self.assertEqual(response.data['status_code'], status.HTTP_201_CREATED)
+
+				file = File.objects.get(filename=f"notes{dedup}.txt", user=self.user)
+				self.assertEqual(file.blob_id is not None, dedup)
+				self.assertTrue(Job.objects.filter(name='generate_file_previews', payload__contains=file.file.name).exists())
+
+
+	def test_upload_chunks(self):
+		"""
+		test chunks are appended in order and the offset tells the client where to resume
+
+		"""
+		response = self.client.post(reverse('upload'), {'filename': 'notes.txt', 'size': 10}, format='json')
+		self.assertEqual(response.data['status_code'], status.HTTP_201_CREATED)
+		self.assertEqual(response.data['data']['chunk_size'], 4)
+		pk = response.data['data']['id']
+
+		response = self.client.put(reverse('upload_chunk', args=[pk, 0]), b'hell', content_type='application/octet-stream')
+		self.assertEqual(response.data['offset'], 4)
+
+		response = self.client.put(reverse('upload_chunk', args=[pk, 2]), b'ld', content_type='application/octet-stream')
+		self.assertEqual(response.data['status_code'], status.HTTP_409_CONFLICT)
+
+		response = self.client.get(reverse('upload_details', args=[pk]))
+		self.assertEqual(response.data['data']['offset'], 4)
+
+		# the chunk and finalize urls only take the methods that write 
+		self.assertEqual(self.client.get(reverse('upload_chunk', args=[pk, 0])).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+		self.assertEqual(self.client.delete(reverse('upload_chunk', args=[pk, 0])).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+		self.assertEqual(self.client.delete(reverse('upload_finalize', args=[pk])).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+		response = self.client.delete(reverse('upload_details', args=[pk]))
+		self.assertEqual(response.data['status_code'], status.HTTP_204_NO_CONTENT)
+		self.assertFalse(os.listdir(os.path.join(self.tmp_dir.name, 'documents', 'partial')))
+
+
+	def upload(self, content):
+		response = self.client.post(reverse('upload'), {'filename': 'notes.txt', 'size': len(content)}, format='json')
+		pk = response.data['data']['id']
+
+		for chunk in range(0, len(content), 4):
+			self.client.put(reverse('upload_chunk', args=[pk, chunk // 4]), content[chunk:chunk + 4], content_type='application/octet-stream')
+
+		return pk
+
+
+	def test_finalize(self):
+		"""
+		test a complete upload becomes a file of the uploader, once
+
+		"""
+		for deduplication in (False, True):
+			with self.subTest(deduplication=deduplication), override_settings(FILE_DEDUPLICATION=deduplication):
+				pk = self.upload(b'hello!')
+				response = self.client.post(reverse('upload_finalize', args=[pk]))
+				self.assertEqual(response.data['status_code'], status.HTTP_201_CREATED)
+
+				file = File.objects.get(pk=response.data['data']['id'])
+				self.assertEqual(file.filename, 'notes.txt')
+				self.assertEqual(file.user, self.user)
+				self.assertFalse(UploadSession.objects.exists())
+
+				with default_storage.open(file.file.name) as f:
+					self.assertEqual(f.read(), b'hello!')
+
+				# a finalize that raced this one and passed the completeness check finds nothing left to do
+				self.assertIsNone(complete_upload(pk, self.user))
+				self.assertEqual(self.client.post(reverse('upload_finalize', args=[pk])).status_code, status.HTTP_404_NOT_FOUND)
+
+
+	def test_finalize_same_filename(self):
+		"""
+		test uploads of the same filename by different users keep their own content
+
+		"""
+		other = User.objects.create_user(username="other", email="other@email.com", password="newUSER12##")
+		sessions = [(self.user, self.upload(b'mine')), (other, self.upload(b'theirs'))]
+		UploadSession.objects.filter(pk=sessions[1][1]).update(user=other)
+
+		# both names are picked before either file is moved, as with two finalizes running at once
+		self.assertNotEqual(reserve_name('documents/notes.txt'), reserve_name('documents/notes.txt'))
+
+		files = [complete_upload(pk, user) for user, pk in sessions]
+		self.assertNotEqual(files[0].file.name, files[1].file.name)
+
+		for file, content in zip(files, [b'mine', b'theirs']):
+			with default_storage.open(file.file.name) as f:
+				self.assertEqual(f.read(), content)
+
+
+	def test_finalize_failure(self):
+		"""
+		test a finalize that fails leaves the upload and its partial file as they were, so it can be retried
+
+		"""
+		for deduplication in (False, True):
+			with self.subTest(deduplication=deduplication), override_settings(FILE_DEDUPLICATION=deduplication):
+				pk = self.upload(b'hi')
+
+				with mock.patch('users.storage.enqueue', side_effect=OSError("connection lost")):
+					response = self.client.post(reverse('upload_finalize', args=[pk]))
+
+				self.assertEqual(response.data['status_code'], status.HTTP_500_INTERNAL_SERVER_ERROR)
+				self.assertTrue(UploadSession.objects.filter(pk=pk).exists())
+				self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, 'documents', 'partial', f'{pk}.part')))
+				self.assertFalse(Blob.objects.exists())
+				self.assertFalse(File.objects.exists())
+
+				response = self.client.post(reverse('upload_finalize', args=[pk]))
+				self.assertEqual(response.data['status_code'], status.HTTP_201_CREATED)
+				File.objects.all().delete()
+				Blob.objects.all().delete()
+
+
+class FileProbeEndpointTest(DatabaseTestMixin, APITransactionTestCase):
+	"""
+	test creating files from content the server already holds
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.media_root = override_settings(MEDIA_ROOT=self.tmp_dir.name)
+		self.media_root.enable()
+
+		self.content = b'quarterly report of the owner'
+		owner = User.objects.create_user(username="owner", email="owner@email.com", password="newUSER12##")
+		self.blob = save_upload(SimpleUploadedFile('report.txt', self.content))
+		File.objects.create(file=self.blob.file.name, blob=self.blob, filename='report.txt', user=owner)
+
+		self.user = User.objects.create_user(username="prober", email="prober@email.com", password="newUSER12##")
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(self.user).access_token))
+		self.probe = {'filename': 'mine.txt', 'size': self.blob.size, 'sha256': self.blob.digest}
+
+	def tearDown(self):
+		self.media_root.disable()
+		self.tmp_dir.cleanup()
+
+
+	def test_probe_digest_not_uploaded(self):
+		"""
+		test a user who only knows the digest and size of another user's file can't get it
+
+		"""
+		response = self.client.post(reverse('file'), self.probe, format='json')
+		self.assertEqual(response.data['status_code'], status.HTTP_200_OK)
+		challenge = response.data['data']
+
+		for proof in [self.blob.digest, hashlib.sha256(challenge['nonce'].encode()).hexdigest()]:
+			response = self.client.post(reverse('file'), {**self.probe, 'challenge': challenge['challenge'], 'proof': proof}, format='json')
+			self.assertEqual(response.data['status_code'], status.HTTP_404_NOT_FOUND)
+
+		self.assertFalse(File.objects.filter(user=self.user).exists())
+		self.assertEqual(Blob.objects.get().references, 1)
+
+
+	def test_probe_with_content(self):
+		"""
+		test a user holding the content gets a file without uploading it
+
+		"""
+		response = self.client.post(reverse('file'), self.probe, format='json')
+		challenge = response.data['data']
+		offset, length = challenge['offset'], challenge['length']
+		proof = hashlib.sha256(challenge['nonce'].encode() + self.content[offset:offset + length]).hexdigest()
+
+		response = self.client.post(reverse('file'), {**self.probe, 'challenge': challenge['challenge'], 'proof': proof}, format='json')
+
+		self.assertEqual(response.data['status_code'], status.HTTP_201_CREATED)
+		self.assertEqual(File.objects.get(user=self.user).blob_id, self.blob.pk)
+		self.assertEqual(Blob.objects.get().references, 2)
+		self.assertTrue(Job.objects.filter(name='generate_file_previews').exists())
+
+
+class SharingEndpointTest(DatabaseTestMixin, APITransactionTestCase):
+	"""
+	test sharing files through the bulk share and listing endpoints
+
+	"""
+
+	def setUp(self):
+		"""
+		setup test
+
+		"""
+		cache.clear()
+		self.sender = User.objects.create_user(username="sender", email="sender@email.com", password="newUSER12##")
+		self.receiver = User.objects.create_user(username="receiver", email="receiver@email.com", password="newUSER12##")
+		self.files = [File.objects.create(file=f"documents/report{i}.pdf", user=self.sender) for i in range(2)]
+
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(self.sender).access_token))
+
+
+	def test_bulk_share(self):
+		"""
+		test every file is shared with every receiver and shows up in the sent listing
+
+		"""
+		response = self.client.post(reverse('send_file_bulk'), {
+			"files": [file.pk for file in self.files],
+			"receivers": ["RECEIVER"]
+		}, format='json')
+
+		self.assertEqual(response.data['status_code'], status.HTTP_200_OK)
+		self.assertEqual(response.data['count'], 2)
+		self.assertEqual(FileOperation.objects.filter(receiver=self.receiver).count(), 2)
+
+		response = self.client.get(reverse('sent_files'))
+		self.assertEqual(len(response.data['data']), 2)
+
+
+	def test_share(self):
+		"""
+		test a single share drops the cached sent listing
+
+		"""
+		response = self.client.get(reverse('sent_files'))
+		self.assertEqual(len(response.data['data']), 0)
+
+		response = self.client.post(reverse('send_file'), {"file": self.files[0].pk, "receiver": "receiver"})
+		self.assertEqual(response.data['status_code'], status.HTTP_200_OK)
+		self.assertTrue(FileOperation.objects.filter(receiver=self.receiver).exists())
+
+		response = self.client.get(reverse('sent_files'))
+		self.assertEqual(len(response.data['data']), 1)
+
+
+	def test_share_not_owned(self):
+		"""
+		test a user can't share someone else's file with themselves to download it
+
+		"""
+		file = File.objects.create(file="documents/private.pdf", user=self.receiver)
+
+		response = self.client.post(reverse('send_file'), {"file": file.pk, "receiver": "sender"})
+		self.assertEqual(response.data['status_code'], status.HTTP_400_BAD_REQUEST)
+		self.assertFalse(FileOperation.objects.exists())
+
+		# a share made by someone other than the owner doesn't grant access either 
+		FileOperation.objects.create(file=file, sender=self.sender, receiver=self.sender)
+		response = self.client.get(reverse('file_download', args=[file.pk]))
+		self.assertEqual(response.data['status_code'], status.HTTP_403_FORBIDDEN)
+
+
+	def test_bulk_share_unknown_receiver(self):
+		"""
+		test nothing is shared when a receiver doesn't exist
+
+		"""
+		response = self.client.post(reverse('send_file_bulk'), {
+			"files": [self.files[0].pk],
+			"receivers": ["receiver", "nobody"]
+		}, format='json')
+
+		self.assertEqual(response.data['status_code'], status.HTTP_400_BAD_REQUEST)
+		self.assertFalse(FileOperation.objects.exists())
+
+
+	def test_pool_metrics_staff_only(self):
+		"""
+		test only staff can read the pool metrics
+
+		"""
+		response = self.client.get(reverse('pool_metrics'))
+		self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+		self.sender.is_staff = True
+		self.sender.save()
+		self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(self.sender).access_token))
+
+		response = self.client.get(reverse('pool_metrics'))
+		self.assertIn('executor_completed', response.data['data'])
+
+
+	def test_event_ticket(self):
+		"""
+		test a signed in user gets a ticket for their own event stream
+
+		"""
+		response = self.client.post(reverse('file_events_ticket'))
+		self.assertEqual(response.data['status_code'], status.HTTP_201_CREATED)
+		self.assertEqual(signing.loads(response.data['data']['ticket'], salt='users.event_ticket'), self.sender.pk)
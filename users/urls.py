@@ -0,0 +1,34 @@
+from django.urls import path 
+
+from .views import (
+    ProfileRequest, ProfileDetailRequest, UserRequest,
+    UserDetailRequest, FileRequest, FileDetailRequest, FileDownloadRequest,
+    FilePreviewRequest, FileLinkRequest, FileLinkDownloadRequest, UploadSessionRequest,
+    UploadSessionDetailRequest, UploadChunkRequest, UploadFinalizeRequest, FileOperationRequest,
+    BulkFileOperationRequest, SentFileRequest, ReceivedFileRequest, FileEventRequest, FileEventTicketRequest,
+    PoolMetricsRequest
+)
+
+urlpatterns = [
+    path('profile/', ProfileRequest.as_view(), name='profile'),
+    path('profile/<int:pk>/', ProfileDetailRequest.as_view(), name='profile_details'),
+    path('user/', UserRequest.as_view(), name='user'),
+    path('user/<int:pk>/', UserDetailRequest.as_view(), name='user_details'),
+    path('file/', FileRequest.as_view(), name='file'),
+    path('file/<int:pk>/', FileDetailRequest.as_view(), name='file_details'),
+    path('file/<int:pk>/download/', FileDownloadRequest.as_view(), name='file_download'),
+    path('file/<int:pk>/preview/<int:size>/', FilePreviewRequest.as_view(), name='file_preview'),
+    path('file/<int:pk>/link/', FileLinkRequest.as_view(), name='file_link'),
+    path('link/<str:token>/', FileLinkDownloadRequest.as_view(), name='file_link_download'),
+    path('upload/', UploadSessionRequest.as_view(), name='upload'),
+    path('upload/<uuid:pk>/', UploadSessionDetailRequest.as_view(), name='upload_details'),
+    path('upload/<uuid:pk>/chunk/<int:chunk>/', UploadChunkRequest.as_view(), name='upload_chunk'),
+    path('upload/<uuid:pk>/finalize/', UploadFinalizeRequest.as_view(), name='upload_finalize'),
+    path('send_file/', FileOperationRequest.as_view(), name='send_file'),
+    path('send_file/bulk/', BulkFileOperationRequest.as_view(), name='send_file_bulk'),
+    path('sent_files/', SentFileRequest.as_view(), name='sent_files'),
+    path('received_files/', ReceivedFileRequest.as_view(), name='received_files'),
+    path('events/', FileEventRequest.as_view(), name='file_events'),
+    path('events/ticket/', FileEventTicketRequest.as_view(), name='file_events_ticket'),
+    path('metrics/pool/', PoolMetricsRequest.as_view(), name='pool_metrics'),
+]
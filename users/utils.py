@@ -0,0 +1,272 @@
+import os
+import re
+import asyncio
+import time
+import hashlib
+import mimetypes
+from urllib.parse import quote
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe, http_date, content_disposition_header
+
+from .cache import listing_version
+
+# matches a single byte range such as 'bytes=0-499', 'bytes=500-' or 'bytes=-500'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# namespace of public link signatures, so no other signed value can be used as a link 
+FILE_LINK_SALT = 'users.file_link'
+
+
+# write one upload chunk from a stream into the partial file at the given offset
+def write_chunk(path, stream, offset, length, block_size=None) -> int:
+	"""
+		copies at most `length` bytes from `stream` into the file at `path` starting at `offset`,
+		reading in fixed-size blocks so a chunk is never held in memory as a whole.
+		the bytes are flushed and fsynced before returning so the new offset is durable.
+		returns the number of bytes written.
+	"""
+	block_size = block_size or settings.FILE_BLOCK_SIZE
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	written = 0
+
+	with open(path, 'r+b' if os.path.exists(path) else 'wb') as destination:
+		destination.seek(offset)
+		# drop anything past the offset left behind by an interrupted chunk
+		destination.truncate()
+
+		while written < length:
+			block = stream.read(min(block_size, length - written))
+			if not block:
+				break
+			destination.write(block)
+			written += len(block)
+
+		destination.flush()
+		os.fsync(destination.fileno())
+
+	return written
+
+
+# parse the Range header of a download request 
+def parse_range_header(header, size):
+	"""
+		returns the (start, end) byte positions (inclusive) requested by a single-range Range header.
+		returns None when the header is missing, malformed or asks for several ranges, in which case the whole file is sent.
+		raises ValueError when the range can't be satisfied for a file of the given size.
+	"""
+	if not header:
+		return None
+
+	match = RANGE_RE.match(header.strip())
+	if not match:
+		return None
+
+	start, end = match.groups()
+
+	if not start and not end:
+		return None
+
+	# suffix range, the last n bytes of the file
+	if not start:
+		length = int(end)
+		if length == 0 or size == 0:
+			raise ValueError("Range not satisfiable")
+		return max(size - length, 0), size - 1
+
+	start = int(start)
+
+	if start >= size:
+		raise ValueError("Range not satisfiable")
+
+	end = int(end) if end else size - 1
+
+	if start > end:
+		return None
+
+	return start, min(end, size - 1)
+
+
+# check the If-Range header of a download request 
+def if_range_matches(if_range, etag, last_modified):
+	"""
+		returns True when the range request can be served, i.e. there is no If-Range header
+		or it still matches the current ETag (strong comparison) or Last-Modified timestamp.
+	"""
+	if not if_range:
+		return True
+
+	if_range = if_range.strip()
+
+	if if_range.startswith('W/'):
+		return False
+
+	if if_range.startswith('"'):
+		return if_range == etag
+
+	return parse_http_date_safe(if_range) == int(last_modified)
+
+
+# read a byte range of a file in fixed-size blocks
+async def file_iterator(path, start=0, length=None, block_size=None):
+	"""
+		async generator that yields `length` bytes of the file at `path` starting at `start`.
+		blocking reads run in a thread so the event loop stays free, and only one block is held in memory at a time.
+		this has to be an async iterator, Django buffers sync iterators completely before sending them over ASGI.
+	"""
+	block_size = block_size or settings.FILE_BLOCK_SIZE
+	source = await asyncio.to_thread(open, path, 'rb')
+
+	try:
+		await asyncio.to_thread(source.seek, start)
+		remaining = length
+
+		while remaining is None or remaining > 0:
+			block = await asyncio.to_thread(source.read, block_size if remaining is None else min(block_size, remaining))
+			if not block:
+				break
+			if remaining is not None:
+				remaining -= len(block)
+			yield block
+
+	finally:
+		await asyncio.to_thread(source.close)
+
+
+# build a streaming download response for a file on disk 
+async def file_response(request, path, filename, as_attachment=True, etag=None):
+	"""
+		streams the file at `path`, as an attachment unless `as_attachment` is False, honouring single-range Range and If-Range headers.
+		a matching If-None-Match or If-Modified-Since header gets a 304 without the file being opened.
+		`etag` defaults to one built from the modification time and size, callers that know the content digest should pass it.
+		raises FileNotFoundError when the file is missing on disk.
+		when FILE_DELIVERY_MODE hands downloads to the front proxy, only the redirect header is returned.
+	"""
+	if settings.FILE_DELIVERY_MODE in ('x-accel-redirect', 'x-sendfile'):
+		return offload_response(path, filename, as_attachment)
+
+	stat = await asyncio.to_thread(os.stat, path)
+	size = stat.st_size
+	etag = etag or f'"{stat.st_mtime_ns:x}-{size:x}"'
+
+	not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+	if not_modified is not None:
+		not_modified['ETag'] = etag
+		not_modified['Last-Modified'] = http_date(stat.st_mtime)
+		return not_modified
+
+	try:
+		byte_range = parse_range_header(request.headers.get('Range'), size)
+
+	except ValueError:
+		response = HttpResponse(status=416)
+		response['Content-Range'] = f"bytes */{size}"
+		return response
+
+	# the file changed since the client fetched the first part, so send all of it again 
+	if byte_range and not if_range_matches(request.headers.get('If-Range'), etag, stat.st_mtime):
+		byte_range = None
+
+	content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+	if byte_range:
+		start, end = byte_range
+		length = end - start + 1
+		response = StreamingHttpResponse(file_iterator(path, start, length), status=206, content_type=content_type)
+		response['Content-Range'] = f"bytes {start}-{end}/{size}"
+
+	else:
+		length = size
+		response = StreamingHttpResponse(file_iterator(path), content_type=content_type)
+
+	response['Content-Length'] = length
+	response['Accept-Ranges'] = 'bytes'
+	response['ETag'] = etag
+	response['Last-Modified'] = http_date(stat.st_mtime)
+	response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+	return response
+
+
+# build a strong etag from the values a response is rendered from 
+def make_etag(*values) -> str:
+	return '"%s"' % hashlib.sha256(repr(values).encode()).hexdigest()[:32]
+
+
+# build the etag of a listing 
+async def listing_etag(request, box) -> str:
+	"""
+		returns an etag made from the version of the user's `box` listing, which every write to a row the listing shows
+		replaces, so checking it costs one cache lookup and no query. 
+		the url is part of the etag because every page of the listing is a different response.
+	"""
+	version = await listing_version(box, request.user)
+	return make_etag(request.user.pk, request.get_full_path(), version)
+
+
+# answer a conditional request before the response body is built 
+def not_modified_response(request, etag, last_modified=None):
+	"""
+		returns a 304 (or 412 for a failed If-Match) when the request's conditional headers match,
+		otherwise None and the caller builds the full response and passes it to set_validators.
+	"""
+	response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+	if response is not None:
+		set_validators(response, etag)
+	return response
+
+
+# add the validators of a response, clients have to revalidate before reusing it 
+def set_validators(response, etag):
+	response['ETag'] = etag
+	response['Cache-Control'] = 'private, no-cache'
+	return response
+
+
+# build a download response that the front proxy serves from disk 
+def offload_response(path, filename, as_attachment=True):
+	"""
+		returns an empty response with an X-Accel-Redirect or X-Sendfile header pointing at the file,
+		the proxy then sends the bytes itself and also handles Range and conditional requests.
+		the file is not touched here, so a missing file shows up as a 404 from the proxy.
+	"""
+	response = HttpResponse(content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+
+	if settings.FILE_DELIVERY_MODE == 'x-accel-redirect':
+		name = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+		response['X-Accel-Redirect'] = settings.FILE_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(name)
+
+	else:
+		# header values must be ascii, mod_xsendfile decodes the escaped path 
+		response['X-Sendfile'] = quote(path)
+
+	response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+	return response
+
+
+# sign a public download link for a stored file 
+def sign_file_link(name, filename, expires_in) -> tuple:
+	"""
+		returns a url-safe token holding the storage name, download filename and expiry of a file, signed with SECRET_KEY,
+		and the unix time at which it expires. the token is all that is needed to serve the download.
+	"""
+	expires = int(time.time()) + expires_in
+	token = signing.dumps({'n': name, 'f': filename, 'e': expires}, salt=FILE_LINK_SALT, compress=True)
+	return token, expires
+
+
+# check a public download link 
+def unsign_file_link(token) -> tuple:
+	"""
+		returns the (storage name, download filename, expiry) held by a token made by sign_file_link.
+		raises signing.BadSignature when the token was tampered with or has expired.
+	"""
+	# max_age also rejects links signed before FILE_LINK_MAX_LIFETIME was lowered 
+	data = signing.loads(token, salt=FILE_LINK_SALT, max_age=settings.FILE_LINK_MAX_LIFETIME)
+
+	if data['e'] < time.time():
+		raise signing.SignatureExpired("Link has expired")
+
+	return data['n'], data['f'], data['e']
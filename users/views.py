@@ -1,19 +1,46 @@
-import asyncio 
+import os 
+import time
+import asyncio
 import logging 
-from django.db.models import Q 
-from django.http import Http404
+from datetime import datetime, timezone
+from django.conf import settings 
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q, QuerySet 
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views import View
 from django.contrib.auth import get_user_model
 from rest_framework import status, permissions
-from rest_framework.views import APIView 
+from fileshare.views import APIView
 from rest_framework.response import Response 
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from authentication.authentication import StatelessJWTAuthentication, aget_full_user
+from rest_framework_simplejwt.exceptions import InvalidToken
 
 from .serializers import (
 	ProfileSerializer, FileSerializer,
-	FileOperationSerializer, UserSerializer
+	FileOperationSerializer, UserSerializer,
+	UploadSessionSerializer, FileProbeSerializer,
+	BulkFileOperationSerializer, FileLinkSerializer
 )
-from fileshare.database import database 
-from .models import Profile, File, FileOperation
+from fileshare.database import database, DATABASE_POOL_MIN_SIZE, DATABASE_POOL_MAX_SIZE 
+from fileshare.executor import run_sync 
+from fileshare.metrics import pool_metrics 
+from .models import Profile, File, FileOperation, UploadSession
+from .utils import (
+	write_chunk, file_response, sign_file_link, unsign_file_link,
+	make_etag, listing_etag, not_modified_response, set_validators
+)
+from .pagination import FilePagination, FileOperationPagination
+from .previews import preview_name
+from .storage import save_upload, release_blob, probe_challenge, claim_blob, complete_upload
+from .tasks import enqueue
+from .cache import FILES, INBOX, OUTBOX, get_cached_listing, set_cached_listing, ainvalidate_file_operations
+from .events import subscribe, unsubscribe, apublish_many, file_shared_event, format_event, sign_event_ticket, unsign_event_ticket
 
 User = get_user_model()
 
@@ -31,9 +58,9 @@ class ProfileRequest(APIView):
 		user = self.request.user 
 		try:
 			if user.is_staff or user.is_superuser:
-				return await asyncio.to_thread(Profile.objects.all)
+				return Profile.objects.select_related('user')
 
-			profile = await asyncio.to_thread(Profile.objects.get, user=user)
+			profile = await Profile.objects.select_related('user').aget(user_id=user.pk)
 			return profile
 
 		except Profile.DoesNotExist:
@@ -51,13 +78,25 @@ class ProfileRequest(APIView):
 	async def get(self, request):
 		try:
 			profile = await self.get_queryset()
+
+			if isinstance(profile, QuerySet):
+				profile = [p async for p in profile]
+
+			# the etag is built from the fetched values, so an unchanged profile is never serialized again 
+			etag = make_etag(request.user.pk, [
+				(p.id, p.fullname, p.user.username) for p in (profile if isinstance(profile, list) else [profile])
+			])
+			not_modified = not_modified_response(request, etag)
+			if not_modified is not None:
+				return not_modified
+
 			serializer = self.serializer_class(profile, many=True if isinstance(profile, list) else False)
-			return Response({
+			return set_validators(Response({
 				"status": "success",
 				"status_code": status.HTTP_200_OK,
 				"details": "Profie fetched.",
 				"data": serializer.data 
-			})
+			}), etag)
 
 		except Exception as e:
 			logger.error(f"An error occured when trying to get user profile: {e}", exc_info=True)
@@ -76,7 +115,7 @@ class ProfileDetailRequest(APIView):
 	# get profile object
 	async def get_object(self, pk):
 		try:
-			return await asyncio.to_thread(Profile.objects.get, pk=pk)
+			return await Profile.objects.select_related('user').aget(pk=pk)
 
 		except Profile.DoesNotExist:
 			raise Http404("Profile does not exist")
@@ -97,12 +136,12 @@ class ProfileDetailRequest(APIView):
 			return Response({
 				"status": "success",
 				"status_code": status.HTTP_200_OK,
-				"details": "Profie details fetched."
+				"details": "Profie details fetched.",
 				"data": serializer.data
 			})
 
 		except Exception as e:
-			logger.error(f"An error occurred when trying to get user profile details: {e}". exc_info=True)
+			logger.error(f"An error occurred when trying to get user profile details: {e}", exc_info=True)
 			return Response({
 				"status": "error",
 				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -117,8 +156,7 @@ class ProfileDetailRequest(APIView):
 			serializer = self.serializer_class(profile, data=request.data)
 
 			if serializer.is_valid(raise_exception=True):
-				async with database.transaction():
-					await asyncio.to_thread(serializer.save(user=self.request.user))
+				await run_sync(serializer.save, user_id=self.request.user.pk)
 
 				return Response({
 					"status": "success",
@@ -146,11 +184,10 @@ class ProfileDetailRequest(APIView):
 	async def patch(self, request, pk):
 		try:
 			profile = await self.get_object(pk)
-			serializer = self.serializer_class(profile, data=request.data)
+			serializer = self.serializer_class(profile, data=request.data, partial=True)
 
 			if serializer.is_valid(raise_exception=True):
-				async with database.transaction():
-					await asyncio.to_thread(serializer.save(user=self.request.user))
+				await run_sync(serializer.save, user_id=self.request.user.pk)
 
 				return Response({
 					"status": "success",
@@ -178,7 +215,7 @@ class ProfileDetailRequest(APIView):
 	async def delete(self, request, pk):
 		try:
 			profile = await self.get_object(pk)
-			profile.delete()
+			await profile.adelete()
 			return Response({
 				"status": "success",
 				"status_code": status.HTTP_204_NO_CONTENT,
@@ -189,7 +226,7 @@ class ProfileDetailRequest(APIView):
 			logger.error(f"An error occurred when trying to delete user profile: {e}", exc_info=True)
 			return Response({
 				"status": "error",
-				"status_code": HTTP_500_INTERNAL_SERVER_ERROR,
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
 				"details": "An error occurred. Please try again later"
 			})
 
@@ -205,9 +242,9 @@ class UserRequest(APIView):
 		user = self.request.user 
 		try:
 			if user.is_staff or user.is_superuser:
-				return await asyncio.to_thread(User.objects.all)
+				return User.objects.all()
 
-			user_object = await asyncio.to_thread(User.objects.get, username__iexact=user.username)
+			user_object = await User.objects.aget(pk=user.pk)
 			return user_object
 
 		except User.DoesNotExist:
@@ -225,6 +262,10 @@ class UserRequest(APIView):
 	async def get(self, request):
 		try:
 			user = await self.get_queryset()
+
+			if isinstance(user, QuerySet):
+				user = [u async for u in user]
+
 			serializer = self.serializer_class(user, many=True if isinstance(user, list) else False)
 			return Response({
 				"status": "success",
@@ -250,7 +291,7 @@ class UserDetailRequest(APIView):
 	# get user object
 	async def get_object(self, pk):
 		try:
-			return await asyncio.to_thread(User.objects.get, pk=pk)
+			return await User.objects.aget(pk=pk)
 
 		except User.DoesNotExist:
 			raise Http404("User does not exist")
@@ -271,12 +312,12 @@ class UserDetailRequest(APIView):
 			return Response({
 				"status": "success",
 				"status_code": status.HTTP_200_OK,
-				"details": "User details fetched."
+				"details": "User details fetched.",
 				"data": serializer.data
 			})
 
 		except Exception as e:
-			logger.error(f"An error occurred when trying to get user details: {e}". exc_info=True)
+			logger.error(f"An error occurred when trying to get user details: {e}", exc_info=True)
 			return Response({
 				"status": "error",
 				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -288,11 +329,13 @@ class UserDetailRequest(APIView):
 	async def put(self, request, pk):
 		try:
 			user = await self.get_object(pk)
-			serializer = self.serializer_class(user, data=request.data, context={'request':request}, partail=True)
+			# the serializer compares against and saves the full user model 
+			request.user = await aget_full_user(request.user)
+			serializer = self.serializer_class(user, data=request.data, context={'request':request})
 
-			if serializer.is_valid(raise_exception=True):
-				async with database.transaction():
-					await asyncio.to_thread(serializer.save)
+			# validation checks username and email availability, so it runs on the sync executor 
+			if await run_sync(serializer.is_valid, raise_exception=True):
+				await run_sync(serializer.save)
 
 				return Response({
 					"status": "success",
@@ -320,11 +363,13 @@ class UserDetailRequest(APIView):
 	async def patch(self, request, pk):
 		try:
 			user = await self.get_object(pk)
-			serializer = self.serializer_class(user, data=request.data, context={'request':request})
+			# the serializer compares against and saves the full user model 
+			request.user = await aget_full_user(request.user)
+			serializer = self.serializer_class(user, data=request.data, context={'request':request}, partial=True)
 
-			if serializer.is_valid(raise_exception=True):
-				async with database.transaction():
-					await asyncio.to_thread(serializer.save)
+			# validation checks username and email availability, so it runs on the sync executor 
+			if await run_sync(serializer.is_valid, raise_exception=True):
+				await run_sync(serializer.save)
 
 				return Response({
 					"status": "success",
@@ -355,7 +400,7 @@ class UserDetailRequest(APIView):
 
 			if user.is_staff or user.is_superuser:
 				user = await self.get_object(pk)
-				user.delete()
+				await user.adelete()
 				return Response({
 					"status": "success",
 					"status_code": status.HTTP_204_NO_CONTENT,
@@ -372,7 +417,7 @@ class UserDetailRequest(APIView):
 			logger.error(f"An error occurred when trying to delete user account: {e}", exc_info=True)
 			return Response({
 				"status": "error",
-				"status_code": HTTP_500_INTERNAL_SERVER_ERROR,
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
 				"details": "An error occurred. Please try again later"
 			})
 
@@ -381,8 +426,10 @@ class UserDetailRequest(APIView):
 # file view 
 class FileRequest(APIView):
 	permissions_classes = [permissions.IsAuthenticated, ]
-	parser_classes = [MultiPartParser, FormParser, ]
+	parser_classes = [MultiPartParser, FormParser, JSONParser, ]
 	serializer_class = FileSerializer
+	probe_serializer_class = FileProbeSerializer
+	pagination_class = FilePagination
 
 
 	# file queryset to get file based on the permissions of the user 
@@ -390,13 +437,10 @@ class FileRequest(APIView):
 		user = self.request.user 
 		try:
 			if user.is_staff or user.is_superuser:
-				return await asyncio.to_thread(File.objects.all)
+				return File.objects.select_related('user', 'blob')
 
-			file = await asyncio.to_thread(File.objects.get, user=user)
-			return file
-
-		except File.DoesNotExist:
-			raise Http404("File does not exist")
+			# a user's own library, served page by page from the (user, date_uploaded, id) index 
+			return File.objects.select_related('user', 'blob').filter(user_id=user.pk)
 
 		except Exception as e:
 			logger.error(f"An error occurred on file queryset: {e}", exc_info=True)
@@ -409,14 +453,25 @@ class FileRequest(APIView):
 	# get file 
 	async def get(self, request):
 		try:
-			file = await self.get_queryset()
-			serializer = self.serializer_class(file, many=True if isinstance(file, list) else False)
-			return Response({
+			files = await self.get_queryset()
+
+			# an unchanged library is answered with a 304 before the page is fetched 
+			etag = await listing_etag(request, FILES)
+			not_modified = not_modified_response(request, etag)
+			if not_modified is not None:
+				return not_modified
+
+			# listings are returned a page at a time 
+			paginator = self.pagination_class()
+			page = await paginator.apaginate_queryset(files, request, self)
+			serializer = self.serializer_class(page, many=True)
+			return set_validators(Response({
 				"status": "success",
 				"status_code": status.HTTP_200_OK,
 				"details": "File fetched.",
+				**paginator.get_page_links(),
 				"data": serializer.data 
-			})
+			}), etag)
 
 		except Exception as e:
 			logger.error(f"An error occured when trying to get file object: {e}", exc_info=True)
@@ -427,13 +482,100 @@ class FileRequest(APIView):
 			})
 
 
-	# create file 
+	# create a file row and queue its previews in one transaction, runs on the sync executor 
+	def create_file(self, **fields):
+		with transaction.atomic():
+			file = File.objects.create(**fields)
+			# thumbnails are generated by the task worker, the upload doesn't wait for them 
+			enqueue('generate_file_previews', name=file.file.name)
+
+		return file
+
+
+	# create file from content the server already holds, without transferring any bytes 
+	async def probe(self, request):
+		"""
+			a probe is made twice: the first request gets a challenge, the second sends it back with its answer,
+			the hash of a range of the content picked by the server, and gets the File when the answer is right.
+		"""
+		serializer = self.probe_serializer_class(data=request.data)
+
+		if serializer.is_valid(raise_exception=True):
+			data = serializer.validated_data
+
+			if 'challenge' not in data:
+				return Response({
+					"status": "success",
+					"status_code": status.HTTP_200_OK,
+					"details": "Send the challenge back with the sha256 of the nonce followed by the requested range of the file.",
+					"data": probe_challenge(self.request.user.pk, data['sha256'], data['size'])
+				})
+
+			blob = await run_sync(claim_blob, self.request.user.pk, data['sha256'], data['size'], data['challenge'], data['proof'])
+
+			if blob is None:
+				return Response({
+					"status": "error",
+					"status_code": status.HTTP_404_NOT_FOUND,
+					"details": "Content not found. Please upload the file."
+				})
+
+			try:
+				# the response names the owner, so the file is given the full user rather than just its id 
+				file = await run_sync(
+					self.create_file, file=blob.file.name, blob=blob, filename=data['filename'], user=await aget_full_user(self.request.user)
+				)
+
+			except Exception:
+				await run_sync(release_blob, blob.pk)
+				raise
+
+			return Response({
+				"status": "success",
+				"status_code": status.HTTP_201_CREATED,
+				"details": "File Uploaded.",
+				"data": self.serializer_class(file).data
+			})
+
+		return Response({
+			"status": "error",
+			"status_code": status.HTTP_400_BAD_REQUEST,
+			"details": serializer.errors,
+			"error_message": "Unable to upload file"
+		})
+
+
+	# create file, a request with a sha256 and size instead of a file is treated as a probe
 	async def post(self, request):
 		try:
+			if 'file' not in request.data and 'sha256' in request.data:
+				return await self.probe(request)
+
 			serializer = self.serializer_class(data=request.data)
 			if serializer.is_valid(raise_exception=True):
-				async with database.transaction():
-					await asyncio.to_thread(serializer.save(user=self.request.user))
+				# with deduplication the content is stored once per digest and the File points at the shared blob
+				if settings.FILE_DEDUPLICATION:
+					uploaded_file = serializer.validated_data['file']
+					blob = await run_sync(save_upload, uploaded_file)
+
+					try:
+						await run_sync(
+							self.create_file, file=blob.file.name, blob=blob,
+							filename=os.path.basename(uploaded_file.name), user_id=self.request.user.pk
+						)
+
+					# give back the reference taken by save_upload so the blob can still be cleaned up 
+					except Exception:
+						await run_sync(release_blob, blob.pk)
+						raise
+
+				else:
+					uploaded_file = serializer.validated_data['file']
+					name = File._meta.get_field('file').generate_filename(None, uploaded_file.name)
+					name = await run_sync(default_storage.save, name, uploaded_file)
+
+					await run_sync(self.create_file, file=name, filename=os.path.basename(uploaded_file.name), user_id=self.request.user.pk)
+
 				return Response({
 					"status": "success",
 					"status_code": status.HTTP_201_CREATED,
@@ -451,7 +593,7 @@ class FileRequest(APIView):
 			logger.error(f"An error occurred when trying to upload file: {e}", exc_info=True)
 			return Response({
 				"status": "error",
-				"status_code": HTTP_500_INTERNAL_SERVER_ERROR,
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
 				"details": "An error occurred. Please try again later"
 			})
 
@@ -462,7 +604,7 @@ class FileDetailRequest(APIView):
 	# get file object
 	async def get_object(self, pk):
 		try:
-			return await asyncio.to_thread(File.objects.get, pk=pk)
+			return await File.objects.aget(pk=pk)
 
 		except File.DoesNotExist:
 			raise Http404("File does not exist")
@@ -479,7 +621,12 @@ class FileDetailRequest(APIView):
 	async def delete(self, request, pk):
 		try:
 			file = await self.get_object(pk)
-			file.delete()
+			await file.adelete()
+
+			# the shared content is only removed once no other File references it 
+			if file.blob_id:
+				await run_sync(release_blob, file.blob_id)
+
 			return Response({
 				"status": "success",
 				"status_code": status.HTTP_204_NO_CONTENT,
@@ -490,11 +637,400 @@ class FileDetailRequest(APIView):
 			logger.error(f"An error occurred when trying to delete file: {e}", exc_info=True)
 			return Response({
 				"status": "error",
-				"status_code": HTTP_500_INTERNAL_SERVER_ERROR,
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
 				"details": "An error occurred. Please try again later"
 			})
 
 
+# file download view, streams a file to its owner, its receivers or staff 
+class FileDownloadRequest(APIView):
+	permission_classes = [permissions.IsAuthenticated, ]
+
+	# get file object
+	async def get_object(self, pk):
+		try:
+			return await File.objects.select_related('blob').aget(pk=pk)
+
+		except File.DoesNotExist:
+			raise Http404("File does not exist")
+
+	# check if the user owns the file, has received it or is staff 
+	async def has_file_access(self, file):
+		user = self.request.user 
+
+		if user.is_staff or user.is_superuser or file.user_id == user.id:
+			return True
+
+		# only a share made by the owner or staff grants access 
+		shared_by = Q(sender_id=file.user_id) | Q(sender__is_staff=True) | Q(sender__is_superuser=True)
+		return await FileOperation.objects.filter(shared_by, file=file, receiver_id=user.pk).aexists()
+
+	# download file, a Range header returns only the requested part of the file
+	async def get(self, request, pk):
+		try:
+			file = await self.get_object(pk)
+
+			if not await self.has_file_access(file):
+				return Response({
+					"status": "error",
+					"status_code": status.HTTP_403_FORBIDDEN,
+					"details": "You are not allowed to download this file."
+				})
+
+			# content-addressed files use their digest as etag, so it survives the blob being rewritten on disk 
+			etag = f'"{file.blob.digest}"' if file.blob else None
+			return await file_response(request, file.file.path, file.download_name, etag=etag)
+
+		except (Http404, FileNotFoundError):
+			raise Http404("File does not exist")
+
+		except Exception as e:
+			logger.error(f"An error occurred when trying to download file: {e}", exc_info=True)
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+				"details": "An error occurred. Please try again later."
+			})
+
+
+# file preview view, serves a cached thumbnail of an image file 
+class FilePreviewRequest(FileDownloadRequest):
+
+	async def get(self, request, pk, size):
+		try:
+			file = await self.get_object(pk)
+
+			if not await self.has_file_access(file):
+				return Response({
+					"status": "error",
+					"status_code": status.HTTP_403_FORBIDDEN,
+					"details": "You are not allowed to view this file."
+				})
+
+			name = preview_name(file.file.name, size)
+
+			if size not in settings.PREVIEW_SIZES or not await run_sync(default_storage.exists, name):
+				raise Http404("Preview is not available")
+
+			response = await file_response(request, default_storage.path(name), os.path.basename(name), as_attachment=False)
+			response['Cache-Control'] = 'private, max-age=86400'
+			return response
+
+		except (Http404, FileNotFoundError):
+			raise Http404("Preview is not available")
+
+		except Exception as e:
+			logger.error(f"An error occurred when trying to get file preview: {e}", exc_info=True)
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+				"details": "An error occurred. Please try again later."
+			})
+
+
+# file link view, creates a signed public download link for a file 
+class FileLinkRequest(FileDownloadRequest):
+	serializer_class = FileLinkSerializer
+
+	async def post(self, request, pk):
+		try:
+			file = await self.get_object(pk)
+			user = self.request.user
+
+			# only the owner can make a file public, receivers can't pass it on 
+			if not (user.is_staff or user.is_superuser or file.user_id == user.id):
+				return Response({
+					"status": "error",
+					"status_code": status.HTTP_403_FORBIDDEN,
+					"details": "You are not allowed to share this file."
+				})
+
+			serializer = self.serializer_class(data=request.data)
+			if serializer.is_valid():
+				token, expires = sign_file_link(file.file.name, file.download_name, serializer.validated_data['expires_in'])
+
+				return Response({
+					"status": "success",
+					"status_code": status.HTTP_201_CREATED,
+					"details": "Link created.",
+					"data": {
+						"url": request.build_absolute_uri(reverse('file_link_download', args=[token])),
+						"expires": datetime.fromtimestamp(expires, tz=timezone.utc).isoformat()
+					}
+				})
+
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_400_BAD_REQUEST,
+				"details": serializer.errors,
+				"error_message": "Unable to create link"
+			})
+
+		except Http404:
+			raise
+
+		except Exception as e:
+			logger.error(f"An error occurred when trying to create file link: {e}", exc_info=True)
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+				"details": "An error occurred. Please try again later."
+			})
+
+
+# public file link view, serves a signed link to anyone holding it 
+class FileLinkDownloadRequest(View):
+	"""
+		a plain django view, the link is checked from its signature alone so there is no authentication,
+		no session and no database query, and the response can be cached by a CDN until the link expires.
+		links can't be revoked before they expire, deleting the file only stops them once its content is removed from disk.
+	"""
+
+	async def get(self, request, token):
+		try:
+			name, filename, expires = unsign_file_link(token)
+			response = await file_response(request, default_storage.path(name), filename)
+
+			if response.status_code in (200, 206, 304):
+				response['Cache-Control'] = f"public, max-age={max(int(expires - time.time()), 0)}"
+
+			return response
+
+		except (signing.BadSignature, FileNotFoundError):
+			return JsonResponse({
+				"status": "error",
+				"status_code": 404,
+				"details": "Link is invalid or has expired."
+			}, status=404)
+
+		except Exception as e:
+			logger.error(f"An error occurred when trying to download file link: {e}", exc_info=True)
+			return JsonResponse({
+				"status": "error",
+				"status_code": 500,
+				"details": "An error occurred. Please try again later."
+			}, status=500)
+
+
+# upload session view, starts a resumable chunked upload 
+class UploadSessionRequest(APIView):
+	permission_classes = [permissions.IsAuthenticated, ]
+	serializer_class = UploadSessionSerializer
+
+	async def post(self, request):
+		try:
+			serializer = self.serializer_class(data=request.data)
+
+			if serializer.is_valid(raise_exception=True):
+				upload = await run_sync(serializer.save, user_id=self.request.user.pk)
+
+				return Response({
+					"status": "success",
+					"status_code": status.HTTP_201_CREATED,
+					"details": "Upload started.",
+					"data": self.serializer_class(upload).data
+				})
+
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_400_BAD_REQUEST,
+				"details": serializer.errors,
+				"error_message": "Unable to start upload."
+			})
+
+		except Exception as e:
+			logger.error(f"An error occurred when trying to start upload: {e}", exc_info=True)
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+				"details": "An error occurred. Please try again later."
+			})
+
+
+# upload session lookup shared by the upload views, each view only answers its own methods 
+class UploadSessionMixin:
+	permission_classes = [permissions.IsAuthenticated, ]
+
+	# get upload session object, a user can only see their own uploads
+	async def get_object(self, pk):
+		try:
+			return await UploadSession.objects.aget(pk=pk, user_id=self.request.user.pk)
+
+		except UploadSession.DoesNotExist:
+			raise Http404("Upload does not exist")
+
+
+# upload session detail view, lets a client resume or abort an upload 
+class UploadSessionDetailRequest(UploadSessionMixin, APIView):
+	serializer_class = UploadSessionSerializer
+
+	# get upload progress, the offset tells the client where to resume from
+	async def get(self, request, pk):
+		try:
+			upload = await self.get_object(pk)
+			serializer = self.serializer_class(upload)
+			return Response({
+				"status": "success",
+				"status_code": status.HTTP_200_OK,
+				"details": "Upload fetched.",
+				"data": serializer.data
+			})
+
+		except Http404:
+			raise
+
+		except Exception as e:
+			logger.error(f"An error occurred when trying to get upload: {e}", exc_info=True)
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+				"details": "An error occurred. Please try again later."
+			})
+
+	# abort upload and remove the partial file 
+	async def delete(self, request, pk):
+		try:
+			upload = await self.get_object(pk)
+			await run_sync(default_storage.delete, upload.partial_name)
+			await upload.adelete()
+			return Response({
+				"status": "success",
+				"status_code": status.HTTP_204_NO_CONTENT,
+				"details": "Upload cancelled."
+			})
+
+		except Http404:
+			raise
+
+		except Exception as e:
+			logger.error(f"An error occurred when trying to cancel upload: {e}", exc_info=True)
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+				"details": "An error occurred. Please try again later."
+			})
+
+
+# upload chunk view, appends one numbered chunk to the partial file
+class UploadChunkRequest(UploadSessionMixin, APIView):
+
+	# the chunk is read straight from the request body, so no parser is used here
+	async def put(self, request, pk, chunk):
+		try:
+			upload = await self.get_object(pk)
+			offset = chunk * settings.UPLOAD_CHUNK_SIZE
+
+			if offset >= upload.size:
+				return Response({
+					"status": "error",
+					"status_code": status.HTTP_400_BAD_REQUEST,
+					"details": f"Chunk {chunk} is out of range for this upload."
+				})
+
+			# chunk was already received, e.g. the client is retrying after a dropped response 
+			if offset < upload.offset:
+				return Response({
+					"status": "success",
+					"status_code": status.HTTP_200_OK,
+					"details": "Chunk already received.",
+					"offset": upload.offset
+				})
+
+			# chunks must be sent in order, the client resumes from the current offset 
+			if offset > upload.offset:
+				return Response({
+					"status": "error",
+					"status_code": status.HTTP_409_CONFLICT,
+					"details": f"Expected chunk {upload.offset // settings.UPLOAD_CHUNK_SIZE}.",
+					"offset": upload.offset
+				})
+
+			length = min(settings.UPLOAD_CHUNK_SIZE, upload.size - offset)
+			written = 0
+
+			if request.stream is not None:
+				path = default_storage.path(upload.partial_name)
+				written = await run_sync(write_chunk, path, request.stream, offset, length)
+
+			# a short chunk is discarded, the next attempt truncates it away 
+			if written != length:
+				return Response({
+					"status": "error",
+					"status_code": status.HTTP_400_BAD_REQUEST,
+					"details": f"Incomplete chunk. Expected {length} bytes, received {written}.",
+					"offset": upload.offset
+				})
+
+			# only move the offset if no other request has moved it in the meantime 
+			updated = await UploadSession.objects.filter(pk=upload.pk, offset=offset).aupdate(offset=offset + written)
+
+			if not updated:
+				return Response({
+					"status": "error",
+					"status_code": status.HTTP_409_CONFLICT,
+					"details": "Chunk was uploaded concurrently. Please fetch the upload offset and resume."
+				})
+
+			return Response({
+				"status": "success",
+				"status_code": status.HTTP_200_OK,
+				"details": "Chunk received.",
+				"offset": offset + written
+			})
+
+		except Http404:
+			raise
+
+		except Exception as e:
+			logger.error(f"An error occurred when trying to upload chunk: {e}", exc_info=True)
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+				"details": "An error occurred. Please try again later."
+			})
+
+
+# upload finalize view, turns a completed upload into a File 
+class UploadFinalizeRequest(UploadSessionMixin, APIView):
+
+	async def post(self, request, pk):
+		try:
+			upload = await self.get_object(pk)
+
+			if not upload.is_complete:
+				return Response({
+					"status": "error",
+					"status_code": status.HTTP_400_BAD_REQUEST,
+					"details": f"Upload is not complete. {upload.offset} of {upload.size} bytes received.",
+					"offset": upload.offset
+				})
+
+			# the response names the owner, so the file is given the full user rather than just its id 
+			file = await run_sync(complete_upload, upload.pk, await aget_full_user(self.request.user))
+
+			# a concurrent finalize of the same upload got there first 
+			if file is None:
+				raise Http404("Upload does not exist")
+
+			return Response({
+				"status": "success",
+				"status_code": status.HTTP_201_CREATED,
+				"details": "File Uploaded.",
+				"data": FileSerializer(file).data
+			})
+
+		except Http404:
+			raise
+
+		except Exception as e:
+			logger.error(f"An error occurred when trying to finalize upload: {e}", exc_info=True)
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+				"details": "An error occurred. Please try again later."
+			})
+
+
 # file operation view 
 class FileOperationRequest(APIView):
 	permissions_classes = [permissions.IsAuthenticated, ]
@@ -506,12 +1042,13 @@ class FileOperationRequest(APIView):
 		try:
 			serializer = self.serializer_class(data=request.data, context={'request':request})
 
-			if serializer.is_valid(raise_exception=True):
-				file = serializer.validated_data['file']
+			# validation looks up the receiver and file, so it runs on the sync executor 
+			if await run_sync(serializer.is_valid):
 				receiver = serializer.validated_data['receiver']
-				
-				async with database.transaction():
-					await asyncio.to_thread(serializer.save)
+
+				# shares are written through the ORM like bulk shares, post_save drops the cached listings 
+				# and publishes the event once the transaction commits 
+				await run_sync(transaction.atomic()(serializer.save))
 
 				return Response({
 					"status": "success",
@@ -535,10 +1072,51 @@ class FileOperationRequest(APIView):
 			})
 
 
+# bulk file operation view, shares a list of files with a list of receivers in one request 
+class BulkFileOperationRequest(APIView):
+	permission_classes = [permissions.IsAuthenticated, ]
+	parser_classes = [JSONParser, ]
+	serializer_class = BulkFileOperationSerializer
+
+
+	async def post(self, request):
+		try:
+			serializer = self.serializer_class(data=request.data, context={'request':request})
+
+			# validation resolves every receiver and file, so it runs on the sync executor 
+			if await run_sync(serializer.is_valid):
+				file_operations = await run_sync(transaction.atomic()(serializer.save))
+				await ainvalidate_file_operations(file_operations)
+				await apublish_many([(operation.receiver_id, file_shared_event(operation)) for operation in file_operations])
+
+				return Response({
+					"status": "success",
+					"status_code": status.HTTP_200_OK,
+					"details": f"{len(serializer.validated_data['file_objects'])} file(s) sent to {len(serializer.validated_data['receiver_objects'])} receiver(s).",
+					"count": len(file_operations)
+				})
+
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_400_BAD_REQUEST,
+				"details": serializer.errors,
+				"error_message": "Error sending files."
+			})
+
+		except Exception as e:
+			logger.error(f"An error occurred when trying to send files in bulk: {e}", exc_info=True)
+			return Response({
+				"status": "error",
+				"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+				"details": "An error occurred. Please try again later."
+			})
+
+
 # get all sent file 
 class SentFileRequest(APIView):
 	permissions_classes = [permissions.IsAuthenticated, ]
 	serializer_class = FileOperationSerializer
+	pagination_class = FileOperationPagination
 
 	# get_queryset
 	async def get_queryset(self):
@@ -546,13 +1124,9 @@ class SentFileRequest(APIView):
 
 		try:
 			if user.is_staff or user.is_superuser:
-				return await asyncio.to_thread(FileOperation.objects.all)
-
-			files = await asyncio.to_thread(FileOperation.objects.get, sender=user)
-			return files 
+				return FileOperation.objects.select_related('file', 'sender', 'receiver')
 
-		except FileOperation.DoesNotExist:
-			return Http404("The requested info does not exist")
+			return FileOperation.objects.select_related('file', 'sender', 'receiver').filter(sender_id=user.pk)
 
 		except Exception as e:
 			logger.error(f"An error occurred when trying to get file operation object: {e}", exc_info=True)
@@ -565,9 +1139,36 @@ class SentFileRequest(APIView):
 	# get file operation data
 	async def get(self, request):
 		try:
-			files = self.get_queryset()
-			serializer = self.serializer_class(files, many=True if isinstance(files, list) else False)
-
+			files = await self.get_queryset()
+
+			# listings are returned a page at a time 
+			if isinstance(files, QuerySet):
+				# clients poll their outbox, a cached page is served without touching the database 
+				cache_key, cached = await get_cached_listing(OUTBOX, request)
+
+				# an unchanged listing is answered with a 304 before the page is fetched 
+				etag = cached[0] if cached else await listing_etag(request, OUTBOX)
+				not_modified = not_modified_response(request, etag)
+				if not_modified is not None:
+					return not_modified
+
+				if cached:
+					return set_validators(Response(cached[1]), etag)
+
+				paginator = self.pagination_class()
+				page = await paginator.apaginate_queryset(files, request, self)
+				serializer = self.serializer_class(page, many=True)
+				body = {
+					"status": "success",
+					"status_code": status.HTTP_200_OK,
+					"details": "Info fetched.",
+					**paginator.get_page_links(),
+					"data": serializer.data
+				}
+				await set_cached_listing(cache_key, etag, body)
+				return set_validators(Response(body), etag)
+
+			serializer = self.serializer_class(files)
 			return Response({
 				"status": "success",
 				"status_code": status.HTTP_200_OK,
@@ -590,6 +1191,7 @@ class SentFileRequest(APIView):
 class ReceivedFileRequest(APIView):
 	permissions_classes = [permissions.IsAuthenticated, ]
 	serializer_class = FileOperationSerializer
+	pagination_class = FileOperationPagination
 
 	# get_queryset
 	async def get_queryset(self):
@@ -597,13 +1199,9 @@ class ReceivedFileRequest(APIView):
 
 		try:
 			if user.is_staff or user.is_superuser:
-				return await asyncio.to_thread(FileOperation.objects.all)
+				return FileOperation.objects.select_related('file', 'sender', 'receiver')
 
-			files = await asyncio.to_thread(FileOperation.objects.get, receiver=user)
-			return files 
-
-		except FileOperation.DoesNotExist:
-			return Http404("The requested info does not exist")
+			return FileOperation.objects.select_related('file', 'sender', 'receiver').filter(receiver_id=user.pk)
 
 		except Exception as e:
 			logger.error(f"An error occurred when trying to get file operation object: {e}", exc_info=True)
@@ -616,9 +1214,36 @@ class ReceivedFileRequest(APIView):
 	# get file operation data
 	async def get(self, request):
 		try:
-			files = self.get_queryset()
-			serializer = self.serializer_class(files, many=True if isinstance(files, list) else False)
-
+			files = await self.get_queryset()
+
+			# listings are returned a page at a time 
+			if isinstance(files, QuerySet):
+				# clients poll their inbox, a cached page is served without touching the database 
+				cache_key, cached = await get_cached_listing(INBOX, request)
+
+				# an unchanged listing is answered with a 304 before the page is fetched 
+				etag = cached[0] if cached else await listing_etag(request, INBOX)
+				not_modified = not_modified_response(request, etag)
+				if not_modified is not None:
+					return not_modified
+
+				if cached:
+					return set_validators(Response(cached[1]), etag)
+
+				paginator = self.pagination_class()
+				page = await paginator.apaginate_queryset(files, request, self)
+				serializer = self.serializer_class(page, many=True)
+				body = {
+					"status": "success",
+					"status_code": status.HTTP_200_OK,
+					"details": "Info fetched.",
+					**paginator.get_page_links(),
+					"data": serializer.data
+				}
+				await set_cached_listing(cache_key, etag, body)
+				return set_validators(Response(body), etag)
+
+			serializer = self.serializer_class(files)
 			return Response({
 				"status": "success",
 				"status_code": status.HTTP_200_OK,
@@ -634,3 +1259,112 @@ class ReceivedFileRequest(APIView):
 				"details": "An error occurred. Please trying again later."
 			})
 
+
+
+# event ticket view, gives out the short-lived ticket that opens the event stream 
+class FileEventTicketRequest(APIView):
+	permission_classes = [permissions.IsAuthenticated, ]
+
+	async def post(self, request):
+		return Response({
+			"status": "success",
+			"status_code": status.HTTP_201_CREATED,
+			"details": "Ticket created.",
+			"data": {
+				"ticket": sign_event_ticket(request.user.pk),
+				"expires_in": settings.EVENT_TICKET_LIFETIME
+			}
+		})
+
+
+# file event view, pushes new shares to the receiver as server-sent events 
+class FileEventRequest(View):
+	"""
+		a plain django view, DRF renders whole responses and can't hold a stream open.
+		browsers' EventSource can't send headers, so it passes a `ticket` query parameter from FileEventTicketRequest instead.
+		the ticket only opens streams and expires after EVENT_TICKET_LIFETIME, so an url that ends up in a log is of no use.
+		a client reconnecting with Last-Event-ID first gets the shares it missed, once its ticket expired it asks for a new one.
+	"""
+
+	# get the user of the access token or stream ticket 
+	async def authenticate(self, request):
+		auth = StatelessJWTAuthentication() if settings.JWT_STATELESS_AUTH else JWTAuthentication()
+		header = auth.get_header(request)
+
+		if not header:
+			user_id = unsign_event_ticket(request.GET.get('ticket', ''))
+			return await User.objects.filter(pk=user_id, is_active=True).afirst() if user_id is not None else None
+
+		token = auth.get_raw_token(header)
+		if not token:
+			return None
+
+		try:
+			validated_token = auth.get_validated_token(token)
+			return await run_sync(auth.get_user, validated_token)
+
+		except (InvalidToken, AuthenticationFailed):
+			return None
+
+	async def get(self, request):
+		user = await self.authenticate(request)
+
+		if user is None:
+			return JsonResponse({
+				"status": "error",
+				"status_code": 401,
+				"details": "Authentication credentials were not provided or are invalid."
+			}, status=401)
+
+		last_event_id = request.headers.get('Last-Event-ID', '')
+		response = StreamingHttpResponse(
+			self.stream(user, int(last_event_id) if last_event_id.isdigit() else None), content_type='text/event-stream'
+		)
+		response['Cache-Control'] = 'no-cache'
+		response['X-Accel-Buffering'] = 'no' # nginx must pass events on as they are written
+		return response
+
+	async def stream(self, user, last_event_id):
+		# subscribe before replaying, so a share made in between is sent (possibly twice) rather than lost 
+		queue = await subscribe(user.pk)
+
+		try:
+			yield f"retry: {int(settings.EVENT_KEEPALIVE * 1000)}\n\n"
+
+			if last_event_id is not None:
+				missed = FileOperation.objects.filter(receiver_id=user.pk, pk__gt=last_event_id).order_by('pk')
+				async for operation in missed[:settings.EVENT_REPLAY_LIMIT]:
+					yield format_event(file_shared_event(operation))
+
+			while True:
+				try:
+					message = await asyncio.wait_for(queue.get(), settings.EVENT_KEEPALIVE)
+					yield format_event(message)
+
+				# a comment keeps proxies from closing an idle connection 
+				except asyncio.TimeoutError:
+					yield ": keepalive\n\n"
+
+		# django cancels the stream when the client disconnects 
+		finally:
+			unsubscribe(user.pk, queue)
+
+
+# pool metrics view, shows how busy the sync executor and the database connection pools are 
+class PoolMetricsRequest(APIView):
+	permission_classes = [permissions.IsAdminUser, ]
+
+	async def get(self, request):
+		data = pool_metrics.snapshot()
+
+		# `databases` doesn't expose its pool, the configured bounds are reported instead 
+		data["async_pool_connected"] = database.is_connected
+		data["async_pool_min_size"] = DATABASE_POOL_MIN_SIZE
+		data["async_pool_max_size"] = DATABASE_POOL_MAX_SIZE
+
+		return Response({
+			"status": "success",
+			"status_code": status.HTTP_200_OK,
+			"details": "Pool metrics fetched.",
+			"data": data
+		})